@@ -1,6 +1,21 @@
+import heapq
 import math
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Literal, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
 from .base_turtle import Vec2D
+from .optimise import order_paths
+
+# Maximum number of moves evaluated when ordering the cells of a BoustrophedonFill. A move count is used instead of a
+# time budget, so the fill doesn't depend on the speed of the computer
+BOUSTROPHEDON_ORDER_MAX_EVALUATIONS = 200_000
 
 
 def rotate_point(x, y, angle):
@@ -14,6 +29,227 @@ def rotate_point(x, y, angle):
     else:
         return x, y
 
+
+def _scanline_ys(min_y, max_y, spacing=3):
+    """The y coordinates of the scanlines, ``spacing`` units apart from ``min_y`` to ``max_y``.
+
+    The default spacing of 3 units (0.3mm) is the minimum density we use.
+    """
+    ys = []
+    scanline_y = min_y
+    while scanline_y <= max_y:
+        ys.append(scanline_y)
+        scanline_y += spacing
+        # Subtract 0.3 to prevent infinite loop when scanline_y == max_y
+        if scanline_y > max_y and scanline_y - max_y < spacing - 0.3:
+            scanline_y = max_y
+    return ys
+
+
+def _scanline_intersections(edges, min_y, max_y, even_odd=False, spacing=3):
+    """Find where the edges of a polygon cross horizontal scanlines ``spacing`` units apart from ``min_y`` to ``max_y``.
+
+    The scanlines are swept from low to high y with an active edge table. The edges are sorted by their lowest y
+    coordinate, added to the table when the sweep reaches them and removed once the sweep has passed them, so each
+    scanline is only intersected with the edges that cross it. The x coordinates are computed from the start point of
+    each edge (not accumulated from the previous scanline) so they are the same as when testing every edge.
+
+    By default, edges shorter than one unit in y (or in x, if they are not vertical) are skipped and intersections that
+    are less than one unit apart are merged, which is what :py:class:`ScanlineFill` uses. With ``even_odd=True``, all
+    edges that are not horizontal are used, every edge includes its lowest but not its highest point and no
+    intersections are merged. Then each scanline crosses a closed polygon an even number of times, and the pairs of
+    intersections are exactly the intervals inside the polygon.
+
+    Returns
+    -------
+    list[list[tuple[float, float]]]
+        For each scanline, the intersections sorted by x coordinate.
+    """
+    # Sort the edges that can cross a scanline by their lowest y coordinate. Horizontal edges never cross a scanline,
+    # and vertical edges cross at the x coordinate of their start point.
+    sweep_edges = []
+    for (x0, y0), (x1, y1) in edges:
+        if even_odd:
+            if y1 == y0:
+                continue
+            gradient = (x1 - x0) / (y1 - y0)
+        elif abs(x1 - x0) > 1 and abs(y1 - y0) > 1:
+            gradient = (x1 - x0) / (y1 - y0)
+        elif abs(x1 - x0) < 1:
+            gradient = 0.0
+        else:
+            continue
+        sweep_edges.append((min(y0, y1), max(y0, y1), x0, y0, gradient))
+    sweep_edges.sort(key=lambda edge: edge[0])
+
+    scanned_lines = []
+    active_edges = []
+    next_edge = 0
+    for scanline_y in _scanline_ys(min_y, max_y, spacing):
+        while next_edge < len(sweep_edges) and sweep_edges[next_edge][0] <= scanline_y:
+            active_edges.append(sweep_edges[next_edge])
+            next_edge += 1
+        if even_odd:
+            active_edges = [edge for edge in active_edges if edge[1] > scanline_y]
+        else:
+            active_edges = [edge for edge in active_edges if edge[1] >= scanline_y]
+
+        xs = sorted([x0 + (scanline_y - y0) * gradient for _, _, x0, y0, gradient in active_edges])
+        if even_odd:
+            scanned_lines.append([(x, scanline_y) for x in xs])
+            continue
+        # Remove duplicates, i.e. intersections that are less than one unit before the next intersection
+        intersections = [(x, scanline_y) for x, next_x in zip(xs, xs[1:]) if not abs(next_x - x) < 1]
+        if xs:
+            intersections.append((xs[-1], scanline_y))
+        scanned_lines.append(intersections)
+    return scanned_lines
+
+
+def _scan_polygon(points, angle, backend="python", even_odd=False, spacing=3):
+    """Rotate a polygon by ``angle`` and find its intersections with the scanlines (in rotated coordinates).
+
+    See :py:func:`_scanline_intersections` for the meaning of ``even_odd`` and ``spacing``.
+    """
+    if backend == "numpy" and np is not None:
+        return _scan_polygon_numpy(points, angle, even_odd, spacing)
+
+    # Rotate the coordinates
+    rot_points = []
+    for x, y in points:
+        x_rot, y_rot = rotate_point(x, y, angle)
+        rot_points.append((x_rot, y_rot))
+
+    # Find bounding box of polygon
+    edges = []
+    min_x = rot_points[0][0]
+    max_x = rot_points[0][0]
+    min_y = rot_points[0][1]
+    max_y = rot_points[0][1]
+
+    # Find all edges/segments that make up outline
+    # After this, edges should be a list of ((x1, y1), (x2, y2)) tuples
+    for i in range(len(rot_points) - 1):
+        # If points is (None, None) ignore that edge! This separates different parts of the polygon.
+        if rot_points[i][0] is None or rot_points[i + 1][0] is None:
+            continue 
+        edges.append((rot_points[i], rot_points[i + 1]))
+        min_x = min(min_x, rot_points[i + 1][0])
+        max_x = max(max_x, rot_points[i + 1][0])
+        min_y = min(min_y, rot_points[i + 1][1])
+        max_y = max(max_y, rot_points[i + 1][1])
+
+    # Remove edges where p1 == p2
+    if not even_odd:
+        edges_cleaned = []
+        for edge in edges:
+            if not (abs(edge[1][0] - edge[0][0]) < 1 and abs(edge[1][1] - edge[0][1]) < 1): 
+                edges_cleaned.append(edge)
+        edges = edges_cleaned
+
+
+    # Sweep from -y to +y, populating a list of horizontal intersections at each y scanline
+    return _scanline_intersections(edges, min_y, max_y, even_odd, spacing)
+
+
+def _scan_polygon_numpy(points, angle, even_odd=False, spacing=3):
+    """Vectorised version of :py:func:`_scan_polygon`.
+
+    All points are rotated at once and the intersections of all edges with all scanlines they cross are computed as
+    one array, which is sorted by scanline and x coordinate with ``np.lexsort``. The same expressions as in the pure
+    Python implementation are used, so the intersections are identical.
+    """
+    cos_theta = math.cos(angle)
+    sin_theta = math.sin(angle)
+    # Jump indicators, i.e. (None, None), become NaN
+    xy = np.array(points, dtype=float)
+    x = xy[:, 0] * cos_theta - xy[:, 1] * sin_theta
+    y = xy[:, 0] * sin_theta + xy[:, 1] * cos_theta
+
+    # Edges between subsequent points, except the edges to and from jump indicators
+    valid = ~(np.isnan(x[:-1]) | np.isnan(x[1:]))
+    min_y = min(y[0], y[1:][valid].min(initial=np.inf))
+    max_y = max(y[0], y[1:][valid].max(initial=-np.inf))
+    x0, y0, x1, y1 = x[:-1][valid], y[:-1][valid], x[1:][valid], y[1:][valid]
+    dx = np.abs(x1 - x0)
+    dy = np.abs(y1 - y0)
+
+    # Horizontal edges and edges shorter than one unit never cross a scanline. Vertical edges cross at x0.
+    if even_odd:
+        slanted = keep = y1 != y0
+    else:
+        slanted = (dx > 1) & (dy > 1)
+        vertical = (dx < 1) & ~(dy < 1)
+        keep = slanted | vertical
+    gradient = np.zeros(len(x0))
+    gradient[slanted] = (x1[slanted] - x0[slanted]) / (y1[slanted] - y0[slanted])
+    edge_order = np.argsort(np.minimum(y0, y1)[keep], kind="stable")
+    x0, y0, y1, gradient = x0[keep][edge_order], y0[keep][edge_order], y1[keep][edge_order], gradient[keep][edge_order]
+
+    # Each edge crosses a contiguous range of scanlines
+    ys = _scanline_ys(float(min_y), float(max_y), spacing)
+    scanline_y = np.array(ys)
+    first_line = np.searchsorted(scanline_y, np.minimum(y0, y1), side="left")
+    stop_line = np.searchsorted(scanline_y, np.maximum(y0, y1), side="left" if even_odd else "right")
+    num_crossings = np.maximum(stop_line - first_line, 0)
+    edge_idx = np.repeat(np.arange(len(x0)), num_crossings)
+    crossing_offsets = np.cumsum(num_crossings) - num_crossings
+    line_idx = first_line[edge_idx] + np.arange(len(edge_idx)) - crossing_offsets[edge_idx]
+    intersection_x = x0[edge_idx] + (scanline_y[line_idx] - y0[edge_idx]) * gradient[edge_idx]
+
+    order = np.lexsort((intersection_x, line_idx))
+    line_idx = line_idx[order]
+    intersection_x = intersection_x[order]
+    # Remove duplicates, i.e. intersections that are less than one unit before the next intersection on the same line
+    duplicate = np.zeros(len(intersection_x), dtype=bool)
+    if not even_odd:
+        duplicate[:-1] = (line_idx[:-1] == line_idx[1:]) & (np.abs(intersection_x[1:] - intersection_x[:-1]) < 1)
+    line_idx = line_idx[~duplicate]
+    intersection_x = intersection_x[~duplicate]
+
+    intersections = list(zip(intersection_x.tolist(), scanline_y[line_idx].tolist()))
+    line_bounds = np.searchsorted(line_idx, np.arange(len(ys) + 1), side="left").tolist()
+    return [intersections[start:stop] for start, stop in zip(line_bounds[:-1], line_bounds[1:])]
+
+
+def _first_line_idx(scanned_lines):
+    start_idx = 0
+    while len(scanned_lines[start_idx]) < 1:
+        start_idx += 1
+    return start_idx
+
+
+def _count_line_jumps(scanned_lines, start_idx, jump_at_edges):
+    """Count the jumps between the scanlines of a fill from the intervals on each line, without drawing the fill.
+
+    The fill stitches the lines in passes, where each pass stitches the next interval (pair of intersections) of every
+    line that has intervals left. Line ``i`` is stitched in the first ``num_intervals[i]`` passes, and it needs a jump
+    in pass ``p`` if line ``i - 1`` has no interval left in that pass or, with ``jump_at_edges``, if the two intervals
+    don't overlap. This gives the same number of jumps as :py:meth:`ScanlineFill._fill_at_angle`, but only takes one
+    step per interval.
+    """
+    # The last line is never stitched
+    num_intervals = [len(line) // 2 for line in scanned_lines[:-1]]
+    jumps = 0
+    for i in range(start_idx + 1, len(num_intervals)):
+        previous_line, line = scanned_lines[i - 1], scanned_lines[i]
+        jumps += max(0, num_intervals[i] - num_intervals[i - 1])
+        if jump_at_edges:
+            for k in range(0, 2 * min(num_intervals[i], num_intervals[i - 1]), 2):
+                if previous_line[k + 1][0] < line[k][0] or previous_line[k][0] > line[k + 1][0]:
+                    jumps += 1
+    return jumps
+
+
+def _count_fill_jumps(points, angle, jump_at_edges, position, backend="python"):
+    """Count the jumps of a scanline fill at ``angle`` that starts with the needle at ``position``."""
+    scanned_lines = _scan_polygon(points, angle, backend)
+    start_idx = _first_line_idx(scanned_lines)
+    start_pos_rot = rotate_point(scanned_lines[start_idx][0][0], scanned_lines[start_idx][0][1], -angle)
+    start_jump = abs(Vec2D(start_pos_rot[0], start_pos_rot[1]) - position) > 1
+    return int(start_jump) + _count_line_jumps(scanned_lines, start_idx, jump_at_edges)
+
+
 class Fill(ABC):
     """A class to represent a fill. This is a base class for other fill types.
     Given a list of points that make up a polygon, the fill() function should fill it in using the appropriate methods."""
@@ -29,103 +265,71 @@ class ScanlineFill(Fill):
     ----------
     angle: str | int | float (default="auto")
         Angle of the lines, in radians. May also be the string 'auto'.
-        If 'auto', the program will automatically try the angles of 0, 45, 90, and 135 degrees, to minimize the number of jump stitches.
+        If 'auto', the program will automatically try the angles in ``auto_angles``, to minimize the number of jumps.
+        The jumps are counted from the scanlines at each angle, without drawing the fill.
     jump_at_edges: bool (default=False)
         If True, the fill will do a jump stitch when it encounters an edge during fill, such as to cross from one area to another.
         This creates a cleaner fill with less stray stitches.
         Set to False by default as this may slow down embroidery significantly, due to the number of jump stitches involved.
+    auto_angles: int | Sequence[float] (default=4)
+        The angles to try if ``angle`` is 'auto'. Either the number of evenly spaced angles between 0 and 180 degrees
+        (the default tries 0, 45, 90 and 135 degrees), or a sequence of angles in radians. If several angles give the
+        fewest jumps, the first of them is used.
+    processes: int (optional)
+        If given, the candidate angles are tried in parallel by a pool of this many processes. Only worth it for large
+        fills with many candidate angles, since starting the processes takes time.
+    backend: "python" or "numpy" (default="python")
+        How the outline is intersected with the scanlines. The "numpy" backend computes all intersections at once with
+        NumPy, which is much faster for large fills and gives the same stitches. If NumPy is not installed, the pure
+        Python backend is used.
         """
     
-    def __init__(self, angle : str | int | float = "auto", jump_at_edges : bool = False):
+    def __init__(
+        self,
+        angle : str | int | float = "auto",
+        jump_at_edges : bool = False,
+        auto_angles : int | Sequence[float] = 4,
+        processes : Optional[int] = None,
+        backend : Literal["python", "numpy"] = "python",
+    ):
         if type(angle) == str and angle == "auto":
             self.auto = True
         else:
             self.auto = False
             self.angle = angle
         self.jump_at_edges = jump_at_edges
+        if isinstance(auto_angles, int):
+            if auto_angles < 1:
+                raise ValueError(f"``auto_angles`` must be at least 1, not {auto_angles}")
+            self.auto_angles = [math.pi * i / auto_angles for i in range(auto_angles)]
+        else:
+            self.auto_angles = list(auto_angles)
+            if not self.auto_angles:
+                raise ValueError("``auto_angles`` cannot be empty")
+        self.processes = processes
+        if backend not in ("python", "numpy"):
+            raise ValueError(f"``backend`` must be 'python' or 'numpy', not {backend!r}")
+        self.backend = backend
             
-    def _fill_at_angle(self, turtle, points, angle, simulate=False):
-        # Rotate the coordinates
-        rot_points = []
-        for x, y in points:
-            x_rot, y_rot = rotate_point(x, y, angle)
-            rot_points.append((x_rot, y_rot))
-
-        # Find bounding box of polygon
-        edges = []
-        min_x = rot_points[0][0]
-        max_x = rot_points[0][0]
-        min_y = rot_points[0][1]
-        max_y = rot_points[0][1]
-
-        # Find all edges/segments that make up outline
-        # After this, edges should be a list of ((x1, y1), (x2, y2)) tuples
-        for i in range(len(rot_points) - 1):
-            # If points is (None, None) ignore that edge! This separates different parts of the polygon.
-            if rot_points[i][0] is None or rot_points[i + 1][0] is None:
-                continue 
-            edges.append((rot_points[i], rot_points[i + 1]))
-            min_x = min(min_x, rot_points[i + 1][0])
-            max_x = max(max_x, rot_points[i + 1][0])
-            min_y = min(min_y, rot_points[i + 1][1])
-            max_y = max(max_y, rot_points[i + 1][1])
-
-        # Remove edges where p1 == p2
-        edges_cleaned = []
-        for edge in edges:
-            if not (abs(edge[1][0] - edge[0][0]) < 1 and abs(edge[1][1] - edge[0][1]) < 1): 
-                edges_cleaned.append(edge)
-        edges = edges_cleaned
-
-
-        # Sweep from +y to -y, populating a list of horizontal intersections at each y scanline
-        scanned_lines = []
-        scanline_y = min_y
-        
-        while scanline_y <= max_y:
-            intersections = []
-            for edge in edges:
-                if edge[0][1] <= scanline_y <= edge[1][1] or edge[1][1] <= scanline_y <= edge[0][1]: 
-                    if abs(edge[1][0] - edge[0][0]) > 1 and abs(edge[1][1] - edge[0][1]) > 1: # No horizontal and vertical edge
-                        gradient =  (edge[1][0] - edge[0][0]) / (edge[1][1] - edge[0][1])
-                        intersect_x = edge[0][0] + (scanline_y - edge[0][1]) * gradient
-                        intersections.append((intersect_x, scanline_y))
-                    elif abs(edge[1][0] - edge[0][0]) < 1: # x is equal, hence vertical edge
-                        intersections.append((edge[0][0], scanline_y))
-                    elif abs(edge[1][1] - edge[0][1]) < 1: # y is equal, hence horizontal edge
-                        # We don't actually need to care about horiontal edges...?
-                        continue
-                        # intersections.append((edge[0][0], scanline_y))
-                        # intersections.append((edge[1][0], scanline_y))
-                    
-
-            intersections.sort(key=lambda x: x[0])
-            # Remove duplicates
-            for i in range(len(intersections) - 1):
-                if abs(intersections[i+1][0] - intersections[i][0]) < 1 and abs(intersections[i+1][1] - intersections[i][1]) < 1:
-                    intersections[i] = None
-            intersections = [x for x in intersections if x is not None]
-            scanned_lines.append(intersections)
-            scanline_y += 3 # 3 units (0.3mm) is the minimum density we use
-            if scanline_y > max_y and scanline_y - max_y < 3 - 0.3: # Subtract 0.3 to prevent infinite loop when scanline_y == max_y
-                scanline_y = max_y
+    def _fill_at_angle(self, turtle, points, angle):
+        scanned_lines = _scan_polygon(points, angle, self.backend)
 
         # Coordinates are still unrotated!
 
         jump_stitches = 0
         # Jump to start coordinate if needed
-        start_idx = 0
-        while len(scanned_lines[start_idx]) < 1:
-            start_idx += 1
+        start_idx = _first_line_idx(scanned_lines)
 
         start_pos_rot = rotate_point(scanned_lines[start_idx][0][0], scanned_lines[start_idx][0][1], -angle)
 
         if abs(Vec2D(start_pos_rot[0], start_pos_rot[1]) - turtle.pos()) > 1:
             with turtle.jump_stitch():
                 jump_stitches += 1
-                if not simulate: turtle.goto(start_pos_rot)
+                turtle.goto(start_pos_rot)
 
-        # Continuously loop through scanned lines until there is nothing left to fill
+        # Continuously loop through scanned lines until there is nothing left to fill. The lines are consumed two
+        # intersections at a time, and row_starts[i] is the index of the first intersection left on line i.
+        row_starts = [0] * len(scanned_lines)
         no_fill_in_current_iteration_flag = False
         while not no_fill_in_current_iteration_flag:
             no_fill_in_current_iteration_flag = True
@@ -133,30 +337,31 @@ class ScanlineFill(Fill):
             jump = False
             for i in range(start_idx, len(scanned_lines) - 1): # For each scanned line
                 with turtle.fast_direct_stitch():
-                    if len(scanned_lines[i]) >= 2: # If there are at least 2 coordinates, there needs to be a stitch between them!
+                    line = scanned_lines[i]
+                    k = row_starts[i]
+                    if len(line) - k >= 2: # If there are at least 2 coordinates, there needs to be a stitch between them!
                         no_fill_in_current_iteration_flag = False # Something was filled this iteration! For while loop to continue
                         stitch_rot = (
-                            rotate_point(scanned_lines[i][0][0], scanned_lines[i][0][1], -angle), 
-                            rotate_point(scanned_lines[i][1][0], scanned_lines[i][1][1], -angle)
+                            rotate_point(line[k][0], line[k][1], -angle), 
+                            rotate_point(line[k + 1][0], line[k + 1][1], -angle)
                         )
 
                         if self.jump_at_edges:
                             # Check if the line will cross an edge, by seeing if previous stitch's left is 'lefter' than next stitch's right
                             # Check similarly for right hand side
                             if prev_line is not None and len(prev_line) >= 2:
-                                if prev_line[1][0] < scanned_lines[i][0][0] or prev_line[0][0] > scanned_lines[i][1][0]:
+                                if prev_line[1][0] < line[k][0] or prev_line[0][0] > line[k + 1][0]:
                                     jump = True
-                            prev_line = (scanned_lines[i][0], scanned_lines[i][1])
+                            prev_line = (line[k], line[k + 1])
 
                         if jump: # If there are gaps in the scanned lines, jump to the position of the first stitch
                             with turtle.jump_stitch():
-                                if not simulate: turtle.goto(stitch_rot[0])
+                                turtle.goto(stitch_rot[0])
                                 jump_stitches += 1
                                 jump = False
-                        if not simulate: turtle.goto(stitch_rot[0])
-                        if not simulate: turtle.goto(stitch_rot[1])
-                        scanned_lines[i].pop(0)
-                        scanned_lines[i].pop(0)
+                        turtle.goto(stitch_rot[0])
+                        turtle.goto(stitch_rot[1])
+                        row_starts[i] += 2
                     else:
                         jump = True
 
@@ -167,19 +372,439 @@ class ScanlineFill(Fill):
         if not self.auto:
             self._fill_at_angle(turtle, points, self.angle)
         else:
-            best_angle = 0
-            min_jumps = self._fill_at_angle(turtle, points, best_angle, simulate=True)
-            for angle in (math.pi/4, math.pi/2, 3*math.pi/4):
-                jumps = self._fill_at_angle(turtle, points, angle, simulate=True)
-                if jumps < min_jumps:
-                    min_jumps = jumps
-                    best_angle = angle
+            self._fill_at_angle(turtle, points, self._best_angle(points, turtle.pos()))
 
-            self._fill_at_angle(turtle, points, best_angle)
+    def _best_angle(self, points, position):
+        """Find the angle in ``auto_angles`` that gives the fewest jumps."""
+        args = (repeat(points), self.auto_angles, repeat(self.jump_at_edges), repeat(position), repeat(self.backend))
+        if self.processes is not None and len(self.auto_angles) > 1:
+            with ProcessPoolExecutor(self.processes) as executor:
+                jumps = list(executor.map(_count_fill_jumps, *args))
+        else:
+            jumps = list(map(_count_fill_jumps, *args))
+        return self.auto_angles[jumps.index(min(jumps))]
 
-        
 
- 
-                        
-                        
-            
+def _row_intervals(scanned_lines):
+    """Pair the intersections of each scanline into the ``(x_left, x_right)`` intervals that are inside the polygon.
+
+    Intervals that are less than one unit apart are merged, e.g. where the outline of a shape with a hole goes along
+    the same line to the hole and back. Then intervals that are shorter than one unit are removed, e.g. where the
+    outline goes into a hole and back.
+    """
+    intervals = []
+    for line in scanned_lines:
+        line_intervals = []
+        for k in range(0, len(line) - 1, 2):
+            left, right = line[k][0], line[k + 1][0]
+            if line_intervals and left - line_intervals[-1][1] < 1:
+                line_intervals[-1] = (line_intervals[-1][0], right)
+            else:
+                line_intervals.append((left, right))
+        intervals.append([(left, right) for left, right in line_intervals if right - left >= 1])
+    return intervals
+
+
+def _overlapping_intervals(intervals, next_intervals):
+    """Find the pairs ``(k, l)`` where ``intervals[k]`` overlaps ``next_intervals[l]``. Both lists must be sorted.
+
+    If a gap in the polygon is slanted, the interval left of the gap on one line can overlap the interval right of the
+    gap on the next line, even though the gap is between them. Such diagonal pairs are left out, i.e. ``(k, l)`` is
+    left out if ``(k, l - 1)`` and ``(k + 1, l)`` overlap (or ``(k - 1, l)`` and ``(k, l + 1)``).
+    """
+    overlaps = []
+    k = l = 0
+    while k < len(intervals) and l < len(next_intervals):
+        (left, right), (next_left, next_right) = intervals[k], next_intervals[l]
+        if not (right < next_left or left > next_right):
+            overlaps.append((k, l))
+        if right < next_right:
+            k += 1
+        else:
+            l += 1
+
+    overlap_set = set(overlaps)
+    return [
+        (k, l)
+        for k, l in overlaps
+        if not ((k, l - 1) in overlap_set and (k + 1, l) in overlap_set)
+        and not ((k - 1, l) in overlap_set and (k, l + 1) in overlap_set)
+    ]
+
+
+def _decompose_cells(intervals):
+    """Split the intervals of the scanlines into boustrophedon cells.
+
+    A cell is a stack of intervals on subsequent scanlines where each interval only overlaps the interval before and
+    after it in the stack. So the intervals of a cell can be filled back and forth as one serpentine run. A new cell
+    starts wherever the polygon splits into several parts or several parts merge (i.e. at the vertices where the
+    scanlines change from crossing one part of the polygon to crossing several parts).
+
+    Returns
+    -------
+    cells : list[list[tuple[int, int]]]
+        For each cell, the ``(line_idx, interval_idx)`` of its intervals, ordered by scanline.
+    neighbours : dict[tuple[int, int], list[tuple[int, int]]]
+        The intervals on the previous and next scanline that overlap each interval.
+    """
+    neighbours = {(i, k): [] for i, line_intervals in enumerate(intervals) for k in range(len(line_intervals))}
+    cell_of = {}
+    cells = []
+    for i, line_intervals in enumerate(intervals):
+        overlaps = _overlapping_intervals(intervals[i - 1], line_intervals) if i > 0 else []
+        for k, l in overlaps:
+            neighbours[(i - 1, k)].append((i, l))
+            neighbours[(i, l)].append((i - 1, k))
+        num_successors = [0] * (len(intervals[i - 1]) if i > 0 else 0)
+        num_predecessors = [0] * len(line_intervals)
+        for k, l in overlaps:
+            num_successors[k] += 1
+            num_predecessors[l] += 1
+        continued = {l: k for k, l in overlaps if num_successors[k] == 1 and num_predecessors[l] == 1}
+
+        for l in range(len(line_intervals)):
+            if l in continued:
+                cell_idx = cell_of[(i - 1, continued[l])]
+            else:
+                cell_idx = len(cells)
+                cells.append([])
+            cell_of[(i, l)] = cell_idx
+            cells[cell_idx].append((i, l))
+    return cells, neighbours
+
+
+def _route_inside(intervals, ys, neighbours, start, start_node, end, end_node):
+    """Find a path from ``start`` to ``end`` that stays inside the polygon, by moving between overlapping intervals.
+
+    The intervals are searched with Dijkstra's algorithm (using the distances between the interval midpoints), and
+    the path crosses from one scanline to the next inside the overlap of the two intervals.
+
+    Returns
+    -------
+    list[tuple[float, float]] or None
+        The points of the path after ``start``, or None if the intervals are not connected.
+    """
+    def midpoint(node):
+        left, right = intervals[node[0]][node[1]]
+        return (left + right) / 2, ys[node[0]]
+
+    distances = {start_node: 0}
+    previous = {}
+    queue = [(0, start_node)]
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if node == end_node:
+            break
+        if distance > distances[node]:
+            continue
+        for neighbour in neighbours[node]:
+            new_distance = distance + math.dist(midpoint(node), midpoint(neighbour))
+            if new_distance < distances.get(neighbour, math.inf):
+                distances[neighbour] = new_distance
+                previous[neighbour] = node
+                heapq.heappush(queue, (new_distance, neighbour))
+    if end_node not in distances:
+        return None
+
+    nodes = [end_node]
+    while nodes[-1] != start_node:
+        nodes.append(previous[nodes[-1]])
+    nodes.reverse()
+
+    path = []
+    x = start[0]
+    for node, next_node in zip(nodes[:-1], nodes[1:]):
+        (left, right), (next_left, next_right) = intervals[node[0]][node[1]], intervals[next_node[0]][next_node[1]]
+        x = min(max(x, left, next_left), right, next_right)
+        path.append((x, ys[node[0]]))
+        path.append((x, ys[next_node[0]]))
+    path.append(end)
+    return path
+
+
+class BoustrophedonFill(Fill):
+    """Fill that splits the polygon into cells and fills each cell as one serpentine (back and forth) run.
+
+    The polygon is split into boustrophedon cells, i.e. parts that every scanline crosses at most once, so each cell
+    can be filled with one continuous zigzag of lines without jumps. The cells are ordered to make the travel between
+    them short, and the needle travels from one cell to the next with running stitches that are routed inside the
+    polygon. Jumps are only needed between parts of the polygon that are not connected. This gives far fewer trims
+    than :py:class:`ScanlineFill` with ``jump_at_edges=True``, e.g. for letters and logos.
+
+    Parameters
+    ----------
+    angle: str | int | float (default="auto")
+        Angle of the lines, in radians. May also be the string 'auto', in which case the angle in ``auto_angles``
+        that gives the fewest cells is used.
+    travel_stitch_length: int | float (default=30)
+        The stitch length of the running stitches between cells.
+    auto_angles: int | Sequence[float] (default=4)
+        The angles to try if ``angle`` is 'auto', see :py:class:`ScanlineFill`.
+    backend: "python" or "numpy" (default="python")
+        How the outline is intersected with the scanlines, see :py:class:`ScanlineFill`.
+    row_spacing: int | float (default=3)
+        The distance between the lines, must be at least 1. The default of 3 units (0.3mm) is the same as for
+        :py:class:`ScanlineFill`.
+    """
+
+    def __init__(
+        self,
+        angle : str | int | float = "auto",
+        travel_stitch_length : int | float = 30,
+        auto_angles : int | Sequence[float] = 4,
+        backend : Literal["python", "numpy"] = "python",
+        row_spacing : int | float = 3,
+    ):
+        # The angle, auto angles and backend are handled like for scanline fills
+        scanline_fill = ScanlineFill(angle, auto_angles=auto_angles, backend=backend)
+        self.auto = scanline_fill.auto
+        if not self.auto:
+            self.angle = angle
+        self.auto_angles = scanline_fill.auto_angles
+        self.backend = scanline_fill.backend
+        self.travel_stitch_length = travel_stitch_length
+        if row_spacing < 1:
+            raise ValueError(f"``row_spacing`` must be at least 1, not {row_spacing}")
+        self.row_spacing = row_spacing
+
+    def _plan(self, points, angle):
+        """Scan the polygon at ``angle`` and split it into cells, see :py:func:`_decompose_cells`."""
+        scanned_lines = _scan_polygon(points, angle, self.backend, even_odd=True, spacing=self.row_spacing)
+        intervals = _row_intervals(scanned_lines)
+        ys = [line[0][1] if line else None for line in scanned_lines]
+        cells, neighbours = _decompose_cells(intervals)
+        return intervals, ys, cells, neighbours
+
+    def _cell_path(self, intervals, ys, cell):
+        """The corners of the serpentine run of a cell, which goes left to right on its first line."""
+        path = []
+        for j, (i, k) in enumerate(cell):
+            left, right = intervals[i][k]
+            if j % 2 == 0:
+                path.extend([(left, ys[i]), (right, ys[i])])
+            else:
+                path.extend([(right, ys[i]), (left, ys[i])])
+        return path
+
+    def _stitch_cell(self, turtle, intervals, ys, cell, reverse, angle):
+        """Stitch the serpentine run of a cell, backwards from its last line if ``reverse`` is True."""
+        path = self._cell_path(intervals, ys, cell)
+        if reverse:
+            path.reverse()
+        with turtle.fast_direct_stitch():
+            for point in path:
+                turtle.goto(rotate_point(*point, -angle))
+
+    def fill(self, turtle, points):
+        assert len(points)>0, "'points' cannot be an empty list! (in BoustrophedonFill)"
+        if self.auto:
+            num_cells = [len(self._plan(points, angle)[2]) for angle in self.auto_angles]
+            angle = self.auto_angles[num_cells.index(min(num_cells))]
+        else:
+            angle = self.angle
+        intervals, ys, cells, neighbours = self._plan(points, angle)
+        if not cells:
+            return
+
+        cell_paths = [self._cell_path(intervals, ys, cell) for cell in cells]
+        position = rotate_point(*turtle.pos(), angle)
+        order = order_paths(
+            position,
+            [path[0] for path in cell_paths],
+            [path[-1] for path in cell_paths],
+            reversible=[True] * len(cells),
+            time_budget=None,
+            max_evaluations=BOUSTROPHEDON_ORDER_MAX_EVALUATIONS,
+        )
+
+        # The needle travels to the first cell from the nearest interval, if it is within one line of the polygon
+        node = None
+        nearest = min(
+            (abs(ys[i] - position[1]) + max(left - position[0], 0, position[0] - right), (i, k))
+            for i, line_intervals in enumerate(intervals)
+            for k, (left, right) in enumerate(line_intervals)
+        )
+        if nearest[0] <= self.row_spacing:
+            node = nearest[1]
+
+        for cell_idx, reverse in order:
+            cell = cells[cell_idx]
+            path = cell_paths[cell_idx][::-1] if reverse else cell_paths[cell_idx]
+            start_node = cell[-1] if reverse else cell[0]
+            if math.dist(position, path[0]) > 1:
+                route = None
+                if node is not None:
+                    route = _route_inside(intervals, ys, neighbours, position, node, path[0], start_node)
+                if route is None:
+                    with turtle.jump_stitch():
+                        turtle.goto(rotate_point(*path[0], -angle))
+                else:
+                    with turtle.running_stitch(self.travel_stitch_length):
+                        for point in route:
+                            turtle.goto(rotate_point(*point, -angle))
+            self._stitch_cell(turtle, intervals, ys, cell, reverse, angle)
+            position = path[-1]
+            node = cell[0] if reverse else cell[-1]
+
+
+def _tatami_rows(lefts, rights, ys, line_idxs, forward, stitch_length, stagger):
+    """The needle penetrations of tatami rows, in the order they are stitched.
+
+    Row ``j`` goes from ``lefts[j]`` to ``rights[j]`` at ``ys[j]`` (backwards if ``forward[j]`` is False). Inside the
+    row, the penetrations are at ``offset + m * stitch_length`` for integers ``m``, where the offset depends on the
+    scanline index ``line_idxs[j]``, so the penetrations of subsequent lines are staggered. Rows that are longer than
+    ``stitch_length`` but have no penetrations inside get one in the middle. The turns from the end of a row to the
+    start of the next row are split into stitches that are at most ``stitch_length`` long along the rows.
+
+    Returns
+    -------
+    xs, ys : list[float], list[float]
+        The coordinates of the penetrations.
+    """
+    # Skip penetrations close to the ends of the row, to avoid tiny stitches
+    margin = stitch_length / 4
+    xs, row_ys = [], []
+    for left, right, y, line_idx, is_forward in zip(lefts, rights, ys, line_idxs, forward):
+        offset = line_idx % stagger / stagger * stitch_length
+        first = math.ceil((left + margin - offset) / stitch_length)
+        last = math.floor((right - margin - offset) / stitch_length)
+        inner = [offset + m * stitch_length for m in range(first, last + 1)]
+        if not inner and right - left > stitch_length:
+            inner = [(left + right) / 2]
+        if is_forward:
+            row_xs = [left] + inner + [right]
+        else:
+            row_xs = [right] + inner[::-1] + [left]
+
+        if xs:
+            previous_x, previous_y = xs[-1], row_ys[-1]
+            num_turn = max(math.ceil(abs(row_xs[0] - previous_x) / stitch_length) - 1, 0)
+            for t in range(1, num_turn + 1):
+                xs.append(previous_x + (row_xs[0] - previous_x) * t / (num_turn + 1))
+                row_ys.append(previous_y + (y - previous_y) * t / (num_turn + 1))
+        xs.extend(row_xs)
+        row_ys.extend([y] * len(row_xs))
+    return xs, row_ys
+
+
+def _tatami_rows_numpy(lefts, rights, ys, line_idxs, forward, stitch_length, stagger):
+    """Vectorised version of :py:func:`_tatami_rows`, which computes the penetrations of all rows as one array.
+
+    The same expressions as in the pure Python implementation are used, so the penetrations are identical.
+
+    Returns
+    -------
+    xs, ys : numpy.ndarray, numpy.ndarray
+        The coordinates of the penetrations.
+    """
+    lefts, rights, ys = np.asarray(lefts, dtype=float), np.asarray(rights, dtype=float), np.asarray(ys, dtype=float)
+    line_idxs, forward = np.asarray(line_idxs), np.asarray(forward, dtype=bool)
+    margin = stitch_length / 4
+    offset = line_idxs % stagger / stagger * stitch_length
+    first = np.ceil((lefts + margin - offset) / stitch_length)
+    last = np.floor((rights - margin - offset) / stitch_length)
+    num_inner = np.maximum(last - first + 1, 0).astype(int)
+    split_in_middle = (num_inner == 0) & (rights - lefts > stitch_length)
+    num_inner[split_in_middle] = 1
+    start_x = np.where(forward, lefts, rights)
+    end_x = np.where(forward, rights, lefts)
+    num_turn = np.zeros(len(lefts), dtype=int)
+    num_turn[1:] = np.maximum(np.ceil(np.abs(start_x[1:] - end_x[:-1]) / stitch_length) - 1, 0)
+
+    # Each row has the turn from the previous row, the start, the inner penetrations and the end
+    num_penetrations = num_turn + num_inner + 2
+    row = np.repeat(np.arange(len(lefts)), num_penetrations)
+    row_starts = np.cumsum(num_penetrations) - num_penetrations
+    idx = np.arange(len(row)) - row_starts[row] - num_turn[row]
+    m = np.where(forward[row], first[row] + idx - 1, last[row] - idx + 1)
+    xs = offset[row] + m * stitch_length
+    xs[(row_starts + num_turn + 1)[split_in_middle]] = (lefts[split_in_middle] + rights[split_in_middle]) / 2
+    xs[row_starts + num_turn] = start_x
+    xs[row_starts + num_penetrations - 1] = end_x
+    row_ys = ys[row]
+
+    turn = idx < 0
+    turn_row = row[turn]
+    t = idx[turn] + num_turn[turn_row] + 1
+    previous_x, previous_y = end_x[turn_row - 1], ys[turn_row - 1]
+    xs[turn] = previous_x + (start_x[turn_row] - previous_x) * t / (num_turn[turn_row] + 1)
+    row_ys[turn] = previous_y + (ys[turn_row] - previous_y) * t / (num_turn[turn_row] + 1)
+    return xs, row_ys
+
+
+class TatamiFill(BoustrophedonFill):
+    """Fill with rows of fixed-length stitches, where the needle penetrations of subsequent rows are staggered.
+
+    The polygon is split into cells and filled back and forth like :py:class:`BoustrophedonFill`, but instead of one
+    long stitch per row, each row is split into stitches of ``stitch_length``. The penetrations are on a grid that is
+    shifted by ``stitch_length / stagger`` on each row, so the penetrations of neighbouring rows don't line up and
+    the fill has no visible lines where the stitches end. The first and last stitch of a row end at the outline, and
+    penetrations that are closer than a quarter of the stitch length to the outline are left out, so there are no
+    tiny stitches. Use tatami fills for large areas, where the long rows of the other fills would be loose and many
+    machines would reject them.
+
+    Parameters
+    ----------
+    row_spacing: int | float (default=3)
+        The distance between the rows, must be at least 1.
+    stitch_length: int | float (default=30)
+        The length of the stitches in the rows.
+    stagger: int (default=3)
+        The number of rows after which the penetrations line up again.
+    angle: str | int | float (default="auto")
+        Angle of the rows, in radians. May also be the string 'auto', see :py:class:`BoustrophedonFill`.
+    travel_stitch_length: int | float (default=30)
+        The stitch length of the running stitches between cells.
+    auto_angles: int | Sequence[float] (default=4)
+        The angles to try if ``angle`` is 'auto', see :py:class:`ScanlineFill`.
+    backend: "python" or "numpy" (default="numpy")
+        How the outline is intersected with the scanlines and the penetrations are computed. The "numpy" backend
+        computes the penetrations of all rows of a cell at once, which is much faster since tatami fills have many
+        stitches, and gives the same stitches. If NumPy is not installed, the pure Python backend is used.
+    """
+
+    def __init__(
+        self,
+        row_spacing : int | float = 3,
+        stitch_length : int | float = 30,
+        stagger : int = 3,
+        angle : str | int | float = "auto",
+        travel_stitch_length : int | float = 30,
+        auto_angles : int | Sequence[float] = 4,
+        backend : Literal["python", "numpy"] = "numpy",
+    ):
+        super().__init__(angle, travel_stitch_length, auto_angles, backend, row_spacing)
+        if stitch_length <= 0:
+            raise ValueError(f"``stitch_length`` must be positive, not {stitch_length}")
+        if int(stagger) != stagger or stagger < 1:
+            raise ValueError(f"``stagger`` must be a positive integer, not {stagger}")
+        self.stitch_length = stitch_length
+        self.stagger = int(stagger)
+
+    def _stitch_cell(self, turtle, intervals, ys, cell, reverse, angle):
+        """Stitch the rows of a cell with staggered penetrations, from the last line if ``reverse`` is True."""
+        # The serpentine run goes left to right on the first line of the cell, and the other way when reversed
+        forward = [(j % 2 == 0) != reverse for j in range(len(cell))]
+        if reverse:
+            cell, forward = cell[::-1], forward[::-1]
+        args = (
+            [intervals[i][k][0] for i, k in cell],
+            [intervals[i][k][1] for i, k in cell],
+            [ys[i] for i, _ in cell],
+            [i for i, _ in cell],
+            forward,
+            self.stitch_length,
+            self.stagger,
+        )
+
+        if self.backend == "numpy" and np is not None:
+            xs, row_ys = _tatami_rows_numpy(*args)
+            # Rotate back to pattern coordinates, with the same expressions as rotate_point
+            cos_theta = math.cos(-angle)
+            sin_theta = math.sin(-angle)
+            xs, row_ys = xs * cos_theta - row_ys * sin_theta, xs * sin_theta + row_ys * cos_theta
+        else:
+            xs, row_ys = _tatami_rows(*args)
+            xs, row_ys = zip(*[rotate_point(x, y, -angle) for x, y in zip(xs, row_ys)])
+        with turtle.fast_direct_stitch():
+            turtle.goto_many(xs, row_ys)
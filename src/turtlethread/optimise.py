@@ -0,0 +1,440 @@
+"""Optimisation passes that reduce the machine time of embroidery patterns.
+
+The functions in this module work on plain coordinates, so they can be used without creating any stitch groups. The
+passes are applied to patterns with the methods of :py:class:`turtlethread.stitches.EmbroideryPattern`.
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Iterator, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
+Point = tuple[float, float]
+# Index of a path and whether it is travelled backwards
+OrientedPath = tuple[int, bool]
+# (x_min, y_min, x_max, y_max)
+BoundingBox = tuple[float, float, float, float]
+
+
+def _distance(point_1: Point, point_2: Point) -> float:
+    return math.hypot(point_1[0] - point_2[0], point_1[1] - point_2[1])
+
+
+def travel_distance(
+    start: Point, order: Sequence[OrientedPath], starts: Sequence[Point], ends: Sequence[Point]
+) -> float:
+    """Compute the total distance travelled between paths when they are stitched in the given order.
+
+    Parameters
+    ----------
+    start : tuple[float, float]
+        The needle position before the first path.
+    order : Sequence[tuple[int, bool]]
+        Sequence of ``(path_index, reversed)`` pairs.
+    starts : Sequence[tuple[float, float]]
+        The start position of each path.
+    ends : Sequence[tuple[float, float]]
+        The end position of each path.
+    """
+    distance = 0.0
+    position = start
+    for path_idx, reverse in order:
+        path_start, path_end = (ends[path_idx], starts[path_idx]) if reverse else (starts[path_idx], ends[path_idx])
+        distance += _distance(position, path_start)
+        position = path_end
+    return distance
+
+
+def _nearest_neighbour_order(
+    start: Point, starts: Sequence[Point], ends: Sequence[Point], reversible: Sequence[bool]
+) -> list[OrientedPath]:
+    """Greedily stitch the path whose start (or end, if it can be reversed) is closest to the current position."""
+    num_paths = len(starts)
+    if np is not None and num_paths > 1:
+        start_array = np.array(starts, dtype=float).reshape(num_paths, 2)
+        end_array = np.array(ends, dtype=float).reshape(num_paths, 2)
+        # Travelling backwards is never chosen for paths that cannot be reversed
+        reverse_penalty = np.where(np.array(reversible, dtype=bool), 0, np.inf)
+        remaining = np.ones(num_paths, dtype=bool)
+        order = []
+        position = np.array(start, dtype=float)
+        for _ in range(num_paths):
+            forward = np.hypot(*(start_array - position).T)
+            backward = np.hypot(*(end_array - position).T) + reverse_penalty
+            forward[~remaining] = np.inf
+            backward[~remaining] = np.inf
+            best_forward = int(np.argmin(forward))
+            best_backward = int(np.argmin(backward))
+            if backward[best_backward] < forward[best_forward]:
+                order.append((best_backward, True))
+                position = start_array[best_backward]
+                remaining[best_backward] = False
+            else:
+                order.append((best_forward, False))
+                position = end_array[best_forward]
+                remaining[best_forward] = False
+        return order
+
+    remaining = set(range(num_paths))
+    order = []
+    position = start
+    while remaining:
+        best = None
+        for path_idx in sorted(remaining):
+            candidates = [(_distance(position, starts[path_idx]), path_idx, False)]
+            if reversible[path_idx]:
+                candidates.append((_distance(position, ends[path_idx]), path_idx, True))
+            for candidate in candidates:
+                if best is None or candidate[0] < best[0]:
+                    best = candidate
+        _, path_idx, reverse = best
+        order.append((path_idx, reverse))
+        position = starts[path_idx] if reverse else ends[path_idx]
+        remaining.remove(path_idx)
+    return order
+
+
+class _Tour:
+    """Order of oriented paths with helpers to compute the change in travel distance of 2-opt and Or-opt moves.
+
+    The improvements stop when the ``deadline`` (a :py:func:`time.perf_counter` value) is reached or when
+    ``max_evaluations`` moves have been evaluated.
+    """
+
+    def __init__(
+        self,
+        start: Point,
+        order: list[OrientedPath],
+        starts: Sequence[Point],
+        ends: Sequence[Point],
+        reversible: Sequence[bool],
+        deadline: float = math.inf,
+        max_evaluations: float = math.inf,
+    ) -> None:
+        self.start = start
+        self.order = order
+        self.starts = starts
+        self.ends = ends
+        self.reversible = reversible
+        self.deadline = deadline
+        self.max_evaluations = max_evaluations
+        self.num_evaluations = 0
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def entry(self, position: int) -> Point:
+        """The point where the path at ``position`` is entered."""
+        path_idx, reverse = self.order[position]
+        return self.ends[path_idx] if reverse else self.starts[path_idx]
+
+    def exit(self, position: int) -> Point:
+        """The point where the path at ``position`` is left (the start point for ``position=-1``)."""
+        if position < 0:
+            return self.start
+        path_idx, reverse = self.order[position]
+        return self.starts[path_idx] if reverse else self.ends[path_idx]
+
+    def can_reverse(self, first: int, last: int) -> bool:
+        return all(self.reversible[path_idx] for path_idx, _ in self.order[first : last + 1])
+
+    def out_of_budget(self) -> bool:
+        return self.num_evaluations >= self.max_evaluations or time.perf_counter() >= self.deadline
+
+    def two_opt(self) -> bool:
+        """Reverse the sections of the tour that shorten the travel distance. Returns True if the tour changed."""
+        improved = False
+        num_paths = len(self)
+        for first in range(num_paths):
+            if self.out_of_budget():
+                break
+            if not self.reversible[self.order[first][0]]:
+                continue
+            before_first = self.exit(first - 1)
+            for last in range(first + 1, num_paths):
+                if not self.reversible[self.order[last][0]]:
+                    break  # Longer sections contain this path too, so they cannot be reversed either
+                self.num_evaluations += 1
+                old = _distance(before_first, self.entry(first))
+                new = _distance(before_first, self.exit(last))
+                if last + 1 < num_paths:
+                    old += _distance(self.exit(last), self.entry(last + 1))
+                    new += _distance(self.entry(first), self.entry(last + 1))
+                if new < old - 1e-9:
+                    section = self.order[first : last + 1]
+                    self.order[first : last + 1] = [(path_idx, not reverse) for path_idx, reverse in reversed(section)]
+                    improved = True
+        return improved
+
+    def or_opt(self, max_section_length: int = 3) -> bool:
+        """Move short sections of the tour (possibly reversed) to where they shorten the travel distance.
+
+        Returns True if the tour changed.
+        """
+        improved = False
+        for section_length in range(1, max_section_length + 1):
+            first = 0
+            while first + section_length <= len(self):
+                if self.out_of_budget():
+                    return improved
+                if self._move_section(first, first + section_length - 1):
+                    improved = True
+                else:
+                    first += 1
+        return improved
+
+    def _move_section(self, first: int, last: int) -> bool:
+        num_paths = len(self)
+        section = self.order[first : last + 1]
+        section_entry, section_exit = self.entry(first), self.exit(last)
+
+        # Travel distance saved by removing the section
+        before, after = self.exit(first - 1), self.entry(last + 1) if last + 1 < num_paths else None
+        removal_gain = _distance(before, section_entry)
+        if after is not None:
+            removal_gain += _distance(section_exit, after) - _distance(before, after)
+
+        reversible = self.can_reverse(first, last)
+        self.num_evaluations += num_paths
+        best = None
+        for position in range(-1, num_paths):
+            # Insert the section after the path at ``position`` (-1 is before the first path)
+            if first - 1 <= position <= last:
+                continue
+            insert_before = self.exit(position)
+            insert_after = self.entry(position + 1) if position + 1 < num_paths else None
+            for reverse in (False, True) if reversible else (False,):
+                entry, exit = (section_exit, section_entry) if reverse else (section_entry, section_exit)
+                cost = _distance(insert_before, entry)
+                if insert_after is not None:
+                    cost += _distance(exit, insert_after) - _distance(insert_before, insert_after)
+                if cost < removal_gain - 1e-9 and (best is None or cost < best[0]):
+                    best = (cost, position, reverse)
+
+        if best is None:
+            return False
+
+        _, position, reverse = best
+        if reverse:
+            section = [(path_idx, not path_reverse) for path_idx, path_reverse in reversed(section)]
+        remaining = self.order[:first] + self.order[last + 1 :]
+        insert_at = position + 1 if position < first else position + 1 - len(section)
+        self.order = remaining[:insert_at] + section + remaining[insert_at:]
+        return True
+
+
+def order_paths(
+    start: Point,
+    starts: Sequence[Point],
+    ends: Sequence[Point],
+    reversible: Optional[Sequence[bool]] = None,
+    time_budget: Optional[float] = 1.0,
+    max_evaluations: Optional[int] = None,
+) -> list[OrientedPath]:
+    """Find an order of paths that makes the total travel distance between them short.
+
+    The order is seeded with the nearest neighbour heuristic and improved with 2-opt (reversing sections of the order)
+    and Or-opt (moving sections of up to three paths) until no move shortens the travel distance or the time budget is
+    used up. Paths can be travelled backwards if they are reversible. Without a time budget, the order only depends on
+    the input, not on the speed of the computer, so use ``max_evaluations`` to bound the work instead.
+
+    Parameters
+    ----------
+    start : tuple[float, float]
+        The needle position before the first path.
+    starts : Sequence[tuple[float, float]]
+        The start position of each path.
+    ends : Sequence[tuple[float, float]]
+        The end position of each path.
+    reversible : Sequence[bool] (optional)
+        Whether each path can be travelled from its end to its start. If not given, no path is reversed.
+    time_budget : float or None (optional, default=1.0)
+        Maximum number of seconds to spend improving the order. The nearest neighbour order is always computed. If
+        None, the order is improved until no move shortens the travel distance or ``max_evaluations`` is reached.
+    max_evaluations : int (optional)
+        Maximum number of moves to evaluate while improving the order, roughly proportional to the time spent. If not
+        given, the number of moves is not limited.
+
+    Returns
+    -------
+    list[tuple[int, bool]]
+        List of ``(path_index, reversed)`` pairs.
+    """
+    deadline = math.inf if time_budget is None else time.perf_counter() + time_budget
+    if max_evaluations is None:
+        max_evaluations = math.inf
+    if reversible is None:
+        reversible = [False] * len(starts)
+
+    order = _nearest_neighbour_order(start, starts, ends, reversible)
+    tour = _Tour(start, order, starts, ends, reversible, deadline, max_evaluations)
+    while not tour.out_of_budget():
+        improved = tour.two_opt()
+        improved = tour.or_opt() or improved
+        if not improved:
+            break
+    return tour.order
+
+
+def _boxes_overlap(box_1: Optional[BoundingBox], box_2: Optional[BoundingBox]) -> bool:
+    if box_1 is None or box_2 is None:
+        return False
+    return box_1[0] <= box_2[2] and box_2[0] <= box_1[2] and box_1[1] <= box_2[3] and box_2[1] <= box_1[3]
+
+
+def order_color_blocks(
+    colors: Sequence[str],
+    bounding_boxes: Sequence[Optional[BoundingBox]],
+    color_order: Optional[Sequence[str]] = None,
+) -> list[int]:
+    """Find an order of colour blocks with few colour changes that keeps overlapping blocks in their original order.
+
+    Without ``color_order``, a block of one colour is never moved past an earlier block of another colour whose
+    bounding box overlaps its own, so the layering of the design is kept. Within these constraints, the blocks are
+    ordered greedily: all blocks of the current colour that can be stitched are stitched before changing to the colour
+    of the earliest block that can be stitched. With ``color_order``, the blocks are sorted by the position of their
+    colour in ``color_order`` (colours that are not listed come last), and the bounding boxes are ignored.
+
+    Parameters
+    ----------
+    colors : Sequence[str]
+        The colour of each block. Blocks with the same colour string use the same thread.
+    bounding_boxes : Sequence[tuple[float, float, float, float] or None]
+        The ``(x_min, y_min, x_max, y_max)`` bounding box of each block, or None if the block has no stitches.
+    color_order : Sequence[str] (optional)
+        User-declared layering order of the colours, from bottom to top.
+
+    Returns
+    -------
+    list[int]
+        The indices of the blocks in the new order. Without ``color_order``, blocks with the same colour may be
+        reordered, e.g. a later block that can be stitched is moved before an earlier block that must wait for a block
+        of another colour. With ``color_order``, the relative order of blocks with the same colour is kept.
+    """
+    num_blocks = len(colors)
+    if color_order is not None:
+        rank = {color: i for i, color in enumerate(color_order)}
+        return sorted(range(num_blocks), key=lambda block_idx: rank.get(colors[block_idx], len(rank)))
+
+    # predecessors[j] is the number of earlier blocks that must be stitched before block j
+    successors = [[] for _ in range(num_blocks)]
+    predecessors = [0] * num_blocks
+    for j in range(num_blocks):
+        for i in range(j):
+            if colors[i] != colors[j] and _boxes_overlap(bounding_boxes[i], bounding_boxes[j]):
+                successors[i].append(j)
+                predecessors[j] += 1
+
+    order = []
+    available = [block_idx for block_idx in range(num_blocks) if predecessors[block_idx] == 0]
+    current_color = colors[0] if num_blocks else None
+    while available:
+        same_color = [block_idx for block_idx in available if colors[block_idx] == current_color]
+        block_idx = min(same_color) if same_color else min(available)
+        current_color = colors[block_idx]
+        available.remove(block_idx)
+        order.append(block_idx)
+        for successor in successors[block_idx]:
+            predecessors[successor] -= 1
+            if predecessors[successor] == 0:
+                available.append(successor)
+    return order
+
+
+class TrimPolicy:
+    """Policy that decides how the needle moves between stitches that are not connected.
+
+    Trims are the slowest operation of an embroidery machine, so short jumps should not trim the thread. For each jump,
+    the policy picks one of three actions:
+
+    * ``"travel"``: Sew the jump as a running stitch. Only used for jumps shorter than ``travel_distance`` that are
+      hidden under stitches that are sewn later, so the travel stitches don't show.
+    * ``"trim"``: Trim the thread and jump. Used for jumps that are at least ``trim_distance`` long.
+    * ``"jump"``: Jump without trimming the thread. Used for all other jumps.
+
+    The default policy trims before every jump, like :py:class:`turtlethread.stitches.JumpStitch` does.
+
+    Parameters
+    ----------
+    trim_distance : float (optional, default=0)
+        Jumps that are at least this long are trimmed.
+    travel_distance : float (optional, default=0)
+        Hidden jumps that are shorter than this are sewn as running stitches. If 0, jumps are never sewn.
+    travel_stitch_length : float (optional, default=20)
+        The stitch length of the running stitches for travel.
+    cover_distance : float (optional, default=10)
+        A jump is hidden if every point on it is at most about this far from a stitch that is sewn later.
+    """
+
+    def __init__(
+        self,
+        trim_distance: float = 0,
+        travel_distance: float = 0,
+        travel_stitch_length: float = 20,
+        cover_distance: float = 10,
+    ) -> None:
+        self.trim_distance = trim_distance
+        self.travel_distance = travel_distance
+        self.travel_stitch_length = travel_stitch_length
+        self.cover_distance = cover_distance
+
+    def action(self, points: Sequence[Point], coverage: Optional[CoverageGrid] = None) -> str:
+        """Decide what to do with a jump through the given points: ``"travel"``, ``"trim"`` or ``"jump"``.
+
+        Parameters
+        ----------
+        points : Sequence[tuple[float, float]]
+            The start position of the jump followed by the positions the needle jumps to.
+        coverage : CoverageGrid (optional)
+            The stitches that are sewn after the jump. If not given, the jump is never sewn as a running stitch.
+        """
+        length = sum(_distance(point_1, point_2) for point_1, point_2 in zip(points[:-1], points[1:]))
+        if length < self.travel_distance and coverage is not None and coverage.covers(points):
+            return "travel"
+        if length >= self.trim_distance:
+            return "trim"
+        return "jump"
+
+
+class CoverageGrid:
+    """Grid of the cells that contain stitches, used to check if a jump is hidden under stitches.
+
+    Parameters
+    ----------
+    cell_size : float
+        The size of the grid cells. A point is covered if there is a stitch in its cell or a neighbouring cell.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self._cells = set()
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _sample(self, points: Sequence[Point]) -> Iterator[Point]:
+        """Points along the polyline through ``points``, at most half a cell apart."""
+        if points:
+            yield points[0]
+        for (x1, y1), (x2, y2) in zip(points[:-1], points[1:]):
+            num_steps = max(1, math.ceil(2 * math.hypot(x2 - x1, y2 - y1) / self.cell_size))
+            for step in range(1, num_steps + 1):
+                t = step / num_steps
+                yield x1 + t * (x2 - x1), y1 + t * (y2 - y1)
+
+    def add_stitches(self, points: Sequence[Point]) -> None:
+        """Mark the cells along the stitches between subsequent points as covered."""
+        self._cells.update(self._cell(x, y) for x, y in self._sample(points))
+
+    def covers(self, points: Sequence[Point]) -> bool:
+        """Check if every point on the polyline through ``points`` is close to a stitch."""
+        for x, y in self._sample(points):
+            i, j = self._cell(x, y)
+            if not any((i + di, j + dj) in self._cells for di in (-1, 0, 1) for dj in (-1, 0, 1)):
+                return False
+        return True
@@ -8,7 +8,9 @@ def get_pattern_info(pattern):
 
     Parameters
     ----------
-    pattern : pyembroidery.EmbPattern
+    pattern : pyembroidery.EmbPattern or turtlethread.stitch_array.StitchArray or Iterable[tuple[float, float, int]]
+        The pattern, or an iterable of ``(x, y, command)`` stitches, e.g. from
+        :py:meth:`turtlethread.stitches.EmbroideryPattern.iter_stitches`.
 
     Returns
     -------
@@ -27,7 +29,8 @@ def get_pattern_info(pattern):
     }
     min_squared_distance = float("inf")
     prev_x, prev_y, prev_command = None, None, None
-    for x, y, command in pattern.stitches:
+    stitches = pattern.stitches if hasattr(pattern, "stitches") else pattern
+    for x, y, command in stitches:
         if command == JUMP:
             info["num_jumps"] += 1
         if command == STITCH:
@@ -61,7 +64,7 @@ def show_info(pattern, scale=1):
 
     Parameters
     ----------
-    pattern : pyembroidery.EmbPattern
+    pattern : pyembroidery.EmbPattern or turtlethread.stitch_array.StitchArray
     """
     pattern_info = get_pattern_info(pattern)
     width = abs(pattern_info["x_max"] - pattern_info["x_min"])
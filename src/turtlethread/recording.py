@@ -0,0 +1,150 @@
+"""Compact log of turtle operations, used by turtles in recording mode (``Turtle(record=True)``).
+
+A recording turtle doesn't add locations to stitch groups while the pattern is drawn. Instead, the operations that
+change the pattern are appended to a :py:class:`Recording`, and the stitch groups are only created when the recording
+is replayed. Subsequent moves are stored as runs of coordinates in flat arrays, so they can be added to the stitch
+groups with one call per run when the recording is replayed.
+
+Recordings can be pickled, so a pattern can be drawn in one process and the stitch groups created in another.
+"""
+from __future__ import annotations
+
+import itertools
+from array import array
+from typing import Optional, Sequence
+
+from .base_turtle import Vec2D
+from .stitches import EmbroideryPattern, StitchGroup
+
+# Opcodes
+GOTO = 0  # Move to the next ``arg`` positions in ``coordinates``
+PUSH = 1  # Start using the stitch group ``objects[arg]``
+POP = 2  # Stop using the current stitch group and continue with a copy of the one below it
+COLOR = 3  # Change the thread colour to ``objects[arg]``
+
+
+class Recording:
+    """Compact log of the operations that change an embroidery pattern.
+
+    Each operation is stored as an opcode and an integer argument. For runs of moves, the argument is the number of
+    moves and the coordinates are stored in the ``coordinates`` array. For the other operations, the argument is the
+    index of the stitch group or colour in ``objects``.
+    """
+
+    def __init__(self) -> None:
+        self.ops = array("B")
+        self.args = array("q")
+        self.coordinates = array("d")
+        self.objects = []
+
+    def __len__(self) -> int:
+        """The number of operations, where a run of subsequent moves counts as one operation."""
+        return len(self.ops)
+
+    @property
+    def num_moves(self) -> int:
+        """The number of recorded moves."""
+        return len(self.coordinates) // 2
+
+    def clear(self) -> None:
+        """Remove all operations."""
+        self.ops = array("B")
+        self.args = array("q")
+        self.coordinates = array("d")
+        self.objects = []
+
+    def goto(self, x: float, y: float) -> None:
+        """Record a move to ``(x, y)``."""
+        if self.ops and self.ops[-1] == GOTO:
+            self.args[-1] += 1
+        else:
+            self.ops.append(GOTO)
+            self.args.append(1)
+        self.coordinates.append(x)
+        self.coordinates.append(y)
+
+    def goto_many(self, positions: Sequence[tuple[float, float]]) -> None:
+        """Record moves to all positions in ``positions``."""
+        if not positions:
+            return
+        if self.ops and self.ops[-1] == GOTO:
+            self.args[-1] += len(positions)
+        else:
+            self.ops.append(GOTO)
+            self.args.append(len(positions))
+        self.coordinates.extend(itertools.chain.from_iterable(positions))
+
+    def push(self, stitch_group: StitchGroup) -> None:
+        """Record that the turtle starts using ``stitch_group``."""
+        self._append_object(PUSH, stitch_group)
+
+    def pop(self) -> None:
+        """Record that the turtle stops using the current stitch group."""
+        self.ops.append(POP)
+        self.args.append(0)
+
+    def color(self, color: str) -> None:
+        """Record a change of thread colour."""
+        self._append_object(COLOR, color)
+
+    def _append_object(self, op: int, obj) -> None:
+        self.ops.append(op)
+        self.args.append(len(self.objects))
+        self.objects.append(obj)
+
+    def replay(
+        self,
+        pattern: EmbroideryPattern,
+        stitch_group_stack: Optional[list[StitchGroup]] = None,
+        position: Vec2D = Vec2D(0, 0),
+    ) -> Vec2D:
+        """Create the stitch groups of the recorded operations and add them to a pattern.
+
+        The stitch groups of the recording are used, not copied, so a recording should only be replayed once. Pickle
+        the recording to replay it in another process.
+
+        Parameters
+        ----------
+        pattern : turtlethread.stitches.EmbroideryPattern
+            The pattern to add the stitch groups to.
+        stitch_group_stack : list[turtlethread.stitches.StitchGroup] (optional)
+            The stitch groups that are in use when the replay starts, the last one is the current stitch group. The list
+            is updated in place.
+        position : Vec2D (optional, default=(0, 0))
+            The position of the turtle when the replay starts.
+
+        Returns
+        -------
+        Vec2D
+            The position of the turtle after the last operation.
+        """
+        stack = [] if stitch_group_stack is None else stitch_group_stack
+        coordinates_idx = 0
+        for op, arg in zip(self.ops, self.args):
+            if op == GOTO:
+                stop = coordinates_idx + 2 * arg
+                xs = self.coordinates[coordinates_idx:stop:2]
+                ys = self.coordinates[coordinates_idx + 1 : stop : 2]
+                coordinates_idx = stop
+                if stack:
+                    stack[-1].add_locations(list(zip(xs, ys)))
+                position = Vec2D(xs[-1], ys[-1])
+            elif op == PUSH:
+                stitch_group = self.objects[arg]
+                stack.append(stitch_group)
+                pattern.stitch_groups.append(stitch_group)
+            elif op == POP:
+                stack.pop()
+                if stack:
+                    stitch_group = stack.pop().empty_copy(position)
+                    stack.append(stitch_group)
+                    pattern.stitch_groups.append(stitch_group)
+            elif op == COLOR:
+                if stack:
+                    stitch_group = stack.pop().empty_copy(position)
+                    stitch_group.color = self.objects[arg]
+                    stack.append(stitch_group)
+                    pattern.stitch_groups.append(stitch_group)
+            else:
+                raise ValueError(f"Invalid opcode {op}")
+        return position
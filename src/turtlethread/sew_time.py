@@ -0,0 +1,303 @@
+"""Simulation of the time an embroidery machine needs to sew a pattern.
+
+The simulator walks the compiled stitch array of a pattern and computes the time of every stitch, jump, trim and colour
+change with a :py:class:`MachineProfile`. Embroidery machines sew short stitches faster than long stitches, and they
+slow down before and speed up after every stop, so the time of a stitch depends on its length and its position in the
+run of stitches it belongs to.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from typing import Optional, Sequence
+
+from pyembroidery import COLOR_CHANGE, JUMP, STITCH, TRIM
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
+from .stitch_array import StitchArray
+
+# Use the vectorised NumPy code path
+USE_NUMPY = np is not None
+# The coordinates of the stitch array are in PyEmbroidery steps, which are 1/10 mm
+STEPS_PER_MM = 10
+
+
+class MachineProfile:
+    """Timing parameters of an embroidery machine.
+
+    Parameters
+    ----------
+    speed_curve : Sequence[tuple[float, float]] (optional)
+        Pairs of ``(stitch length in mm, stitches per minute)``, sorted by stitch length. The speed is linearly
+        interpolated between the points and constant before the first and after the last point. By default, the
+        machine sews 800 stitches per minute for stitches up to 3 mm and slows down to 400 stitches per minute for
+        12 mm stitches.
+    start_speed : float (optional, default=200)
+        The speed (in stitches per minute) of the first and last stitch of a run of stitches, i.e. right after and
+        before the machine stops for a jump, trim or colour change.
+    acceleration : float (optional, default=150)
+        How much the speed (in stitches per minute) can change from one stitch to the next when the machine speeds up
+        after a stop or slows down before a stop.
+    jump_time : float (optional, default=0.05)
+        The time (in seconds) of each jump command, in addition to the time it takes to move the frame.
+    jump_speed : float (optional, default=200)
+        The speed (in mm per second) of the frame during jumps.
+    trim_time : float (optional, default=3)
+        The time (in seconds) of each trim.
+    color_change_time : float (optional, default=30)
+        The time (in seconds) of each colour change.
+    """
+
+    def __init__(
+        self,
+        speed_curve: Optional[Sequence[tuple[float, float]]] = None,
+        start_speed: float = 200,
+        acceleration: float = 150,
+        jump_time: float = 0.05,
+        jump_speed: float = 200,
+        trim_time: float = 3,
+        color_change_time: float = 30,
+    ) -> None:
+        if speed_curve is None:
+            speed_curve = ((3, 800), (7, 600), (12, 400))
+        self.speed_curve = tuple((float(length), float(speed)) for length, speed in speed_curve)
+        if not self.speed_curve:
+            raise ValueError("The speed curve must contain at least one point")
+        if any(length_1 > length_2 for (length_1, _), (length_2, _) in zip(self.speed_curve, self.speed_curve[1:])):
+            raise ValueError("The points of the speed curve must be sorted by stitch length")
+        if start_speed <= 0 or any(speed <= 0 for _, speed in self.speed_curve):
+            raise ValueError("The speeds must be positive")
+
+        self.start_speed = start_speed
+        self.acceleration = acceleration
+        self.jump_time = jump_time
+        self.jump_speed = jump_speed
+        self.trim_time = trim_time
+        self.color_change_time = color_change_time
+
+    def speed(self, stitch_length: float) -> float:
+        """The speed (in stitches per minute) of a stitch with the given length (in mm) when the machine is at speed."""
+        lengths = [length for length, _ in self.speed_curve]
+        idx = bisect.bisect_right(lengths, stitch_length)
+        if idx == 0:
+            return self.speed_curve[0][1]
+        if idx == len(self.speed_curve):
+            return self.speed_curve[-1][1]
+        (length_1, speed_1), (length_2, speed_2) = self.speed_curve[idx - 1], self.speed_curve[idx]
+        return speed_1 + (speed_2 - speed_1) * (stitch_length - length_1) / (length_2 - length_1)
+
+
+# Single-needle home machine where the thread is changed by hand
+HOME_MACHINE = MachineProfile()
+# Multi-needle machine with automatic trims and colour changes
+INDUSTRIAL_MACHINE = MachineProfile(
+    speed_curve=((3, 1200), (6, 1000), (12, 600)),
+    start_speed=300,
+    acceleration=300,
+    jump_time=0.02,
+    jump_speed=400,
+    trim_time=1.5,
+    color_change_time=4,
+)
+
+
+class SewTime:
+    """The simulated sewing time of a pattern, see :py:func:`simulate_sew_time`. All times are in seconds.
+
+    Attributes
+    ----------
+    total : float
+        The total sewing time.
+    stitch_time : float
+        The time spent sewing stitches.
+    jump_time : float
+        The time spent on jumps.
+    trim_time : float
+        The time spent trimming the thread.
+    color_change_time : float
+        The time spent changing the thread.
+    group_times : list[float]
+        The time of each stitch group of the stitch array, including the colour change before the group.
+    color_times : list[float]
+        The time of each colour block, i.e. each thread in ``colors``, including the colour change that starts it.
+    colors : list[str or None]
+        The thread colour of each colour block. The first colour is None if the pattern has stitches before its first
+        thread colour, since they are sewn with the thread that is already in the machine.
+    """
+
+    def __init__(
+        self,
+        stitch_time: float,
+        jump_time: float,
+        trim_time: float,
+        color_change_time: float,
+        group_times: list[float],
+        color_times: list[float],
+        colors: list[Optional[str]],
+    ) -> None:
+        self.stitch_time = stitch_time
+        self.jump_time = jump_time
+        self.trim_time = trim_time
+        self.color_change_time = color_change_time
+        self.total = stitch_time + jump_time + trim_time + color_change_time
+        self.group_times = group_times
+        self.color_times = color_times
+        self.colors = colors
+
+    def __repr__(self) -> str:
+        minutes, seconds = divmod(self.total, 60)
+        return f"SewTime({int(minutes)} min {seconds:.1f} s, {len(self.group_times)} groups, {len(self.color_times)} colors)"
+
+
+def _command_times(
+    x: Sequence[float], y: Sequence[float], commands: Sequence[int], profile: MachineProfile
+) -> list[float]:
+    """Compute the time of each command one at a time."""
+    num_commands = len(commands)
+    times = [0.0] * num_commands
+    # The index of the last stitch in the run of stitches that each stitch belongs to
+    run_ends = [0] * num_commands
+    for i in reversed(range(num_commands)):
+        if commands[i] == STITCH:
+            run_ends[i] = run_ends[i + 1] if i + 1 < num_commands and commands[i + 1] == STITCH else i
+
+    needle = None
+    run_start = 0
+    for i, command in enumerate(commands):
+        length = 0.0
+        if command in (STITCH, JUMP):
+            if needle is not None:
+                length = math.hypot(x[i] - x[needle], y[i] - y[needle]) / STEPS_PER_MM
+            needle = i
+
+        if command == STITCH:
+            if i == 0 or commands[i - 1] != STITCH:
+                run_start = i
+            ramp_speed = profile.start_speed + profile.acceleration * min(i - run_start, run_ends[i] - i)
+            times[i] = 60 / min(profile.speed(length), ramp_speed)
+        elif command == JUMP:
+            times[i] = profile.jump_time + length / profile.jump_speed
+        elif command == TRIM:
+            times[i] = profile.trim_time
+        elif command == COLOR_CHANGE:
+            times[i] = profile.color_change_time
+    return times
+
+
+def _command_times_numpy(x: np.ndarray, y: np.ndarray, commands: np.ndarray, profile: MachineProfile) -> np.ndarray:
+    """Vectorised version of :py:func:`_command_times`."""
+    num_commands = len(commands)
+    idx = np.arange(num_commands)
+    is_stitch = commands == STITCH
+    is_jump = commands == JUMP
+
+    # Each stitch or jump is measured from the previous stitch or jump
+    previous = np.empty(num_commands, dtype=np.int64)
+    previous[0] = -1
+    previous[1:] = np.maximum.accumulate(np.where(is_stitch | is_jump, idx, -1))[:-1]
+    lengths = np.hypot(x - x[previous], y - y[previous]) / STEPS_PER_MM
+    lengths[previous < 0] = 0
+
+    # The machine speeds up from the start of each run of stitches and slows down towards the end of it
+    starts_run = is_stitch.copy()
+    starts_run[1:] &= ~is_stitch[:-1]
+    ends_run = is_stitch.copy()
+    ends_run[:-1] &= ~is_stitch[1:]
+    run_idx = np.cumsum(starts_run) - 1
+    run_starts = np.flatnonzero(starts_run)
+    run_ends = np.flatnonzero(ends_run)
+    stitch_idx = idx[is_stitch]
+    stitch_run_idx = run_idx[is_stitch]
+    distance_to_stop = np.minimum(stitch_idx - run_starts[stitch_run_idx], run_ends[stitch_run_idx] - stitch_idx)
+
+    curve_lengths, curve_speeds = zip(*profile.speed_curve)
+    speeds = np.minimum(
+        np.interp(lengths[is_stitch], curve_lengths, curve_speeds),
+        profile.start_speed + profile.acceleration * distance_to_stop,
+    )
+
+    times = np.zeros(num_commands)
+    times[is_stitch] = 60 / speeds
+    times[is_jump] = profile.jump_time + lengths[is_jump] / profile.jump_speed
+    times[commands == TRIM] = profile.trim_time
+    times[commands == COLOR_CHANGE] = profile.color_change_time
+    return times
+
+
+def simulate_sew_time(pattern, profile: Optional[MachineProfile] = None) -> SewTime:
+    """Simulate the time an embroidery machine needs to sew a pattern.
+
+    The time of each stitch is ``60 / speed`` seconds, where the speed (in stitches per minute) is given by the speed
+    curve of the machine profile, but limited by how fast the machine can speed up after and slow down before each
+    stop. Jumps take a fixed time plus the time it takes to move the frame, and trims and colour changes take a fixed
+    time. If NumPy is installed, all commands are simulated at once.
+
+    Parameters
+    ----------
+    pattern : turtlethread.stitches.EmbroideryPattern or turtlethread.stitch_array.StitchArray
+        The pattern to simulate. Embroidery patterns are compiled with ``to_stitch_array``, so the stitches are scaled
+        and normalised like they are when the pattern is saved.
+    profile : MachineProfile (optional)
+        The machine to simulate. If not given, :py:data:`HOME_MACHINE` is used.
+
+    Returns
+    -------
+    SewTime
+        The total time, the time of each type of command and the time of each stitch group and colour block.
+    """
+    if profile is None:
+        profile = HOME_MACHINE
+    stitch_array: StitchArray = pattern.to_stitch_array() if hasattr(pattern, "to_stitch_array") else pattern
+
+    commands = stitch_array.commands
+    num_commands = len(commands)
+    # Stitches after the last group offset belong to a group that hasn't ended yet
+    group_offsets = list(stitch_array.group_offsets)
+    group_sizes = [stop - start for start, stop in zip(group_offsets[:-1], group_offsets[1:])]
+    group_sizes.append(num_commands - group_offsets[-1])
+    num_color_blocks = max(len(stitch_array.colors), 1)
+
+    if USE_NUMPY and np is not None and num_commands:
+        x, y, command_array = stitch_array.as_numpy()
+        times = _command_times_numpy(x, y, command_array, profile)
+        command_times = {
+            command: float(times[command_array == command].sum()) for command in (STITCH, JUMP, TRIM, COLOR_CHANGE)
+        }
+        group_idx = np.repeat(np.arange(len(group_sizes)), group_sizes)
+        group_times = np.bincount(group_idx, weights=times, minlength=len(group_sizes))[:-1].tolist()
+        color_idx = np.cumsum(command_array == COLOR_CHANGE)
+        color_times = np.bincount(color_idx, weights=times, minlength=num_color_blocks).tolist()
+    else:
+        times = _command_times(stitch_array.x, stitch_array.y, commands, profile)
+        command_times = {command: 0.0 for command in (STITCH, JUMP, TRIM, COLOR_CHANGE)}
+        group_times = [0.0] * len(group_sizes)
+        color_times = [0.0] * num_color_blocks
+        group_idx = color_idx = 0
+        for i, (command, time) in enumerate(zip(commands, times)):
+            while group_idx < len(group_offsets) - 1 and i >= group_offsets[group_idx + 1]:
+                group_idx += 1
+            if command == COLOR_CHANGE:
+                color_idx += 1
+                color_times.extend([0.0] * (color_idx + 1 - len(color_times)))
+            if command in command_times:
+                command_times[command] += time
+            group_times[group_idx] += time
+            color_times[color_idx] += time
+        group_times = group_times[:-1]
+
+    # Stitches before the first thread colour form a colour block with the thread that is already in the machine
+    colors = list(stitch_array.colors)
+    colors = [None] * (len(color_times) - len(colors)) + colors
+    return SewTime(
+        stitch_time=command_times[STITCH],
+        jump_time=command_times[JUMP],
+        trim_time=command_times[TRIM],
+        color_change_time=command_times[COLOR_CHANGE],
+        group_times=group_times,
+        color_times=color_times,
+        colors=colors,
+    )
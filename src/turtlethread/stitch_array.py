@@ -0,0 +1,444 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Iterable, Iterator, Optional, Sequence, overload
+
+import pyembroidery
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, it is only needed for the array interface
+    np = None
+
+# Use the vectorised NumPy code path in StitchArray.normalised
+USE_NUMPY = np is not None
+
+# Maps the index of a stitch group to the number of stitches that were added by splitting long stitches and the number
+# of stitches that were removed, for the stitch groups that were changed by the normalisation
+NormalisationSummary = dict[int, tuple[int, int]]
+
+
+class StitchView(Sequence):
+    """Read-only view of a range of stitches in a :py:class:`StitchArray`.
+
+    The view behaves like a sequence of ``(x, y, command)`` tuples (i.e. like ``pyembroidery.EmbPattern.stitches``), but
+    the tuples are created on demand from the underlying arrays. Slicing a view gives a new view without copying any
+    data.
+
+    Parameters
+    ----------
+    x : memoryview
+        The x coordinates of the stitches
+    y : memoryview
+        The y coordinates of the stitches
+    commands : memoryview
+        The PyEmbroidery commands of the stitches
+    """
+
+    def __init__(self, x: memoryview, y: memoryview, commands: memoryview) -> None:
+        self.x = x
+        self.y = y
+        self.commands = commands
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    @overload
+    def __getitem__(self, index: int) -> tuple[float, float, int]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> StitchView: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StitchView(self.x[index], self.y[index], self.commands[index])
+        return self.x[index], self.y[index], self.commands[index]
+
+    def __iter__(self) -> Iterator[tuple[float, float, int]]:
+        return zip(self.x, self.y, self.commands)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or len(self) != len(other):
+            return False
+        return all(tuple(stitch) == tuple(other_stitch) for stitch, other_stitch in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"StitchView({list(self)!r})"
+
+
+class StitchNormaliser:
+    """Split long stitches and remove duplicate and very short stitches, one stitch group at a time.
+
+    Each stitch is measured from the previous needle position, i.e. the previous stitch or jump. Stitches that are
+    longer than ``max_stitch_length`` are split into equally long stitches. Within a run of subsequent stitches, a
+    stitch is removed if it is at the same position as the previous stitch that is kept, or closer to it than
+    ``min_stitch_length``. The first stitch of a run is never removed, so the needle still goes down where a jump ends,
+    and the last stitch of a run is only removed if it is a duplicate, so the run ends at the same position.
+
+    The normaliser keeps track of the needle position between calls, so the stitch groups must be normalised in order.
+
+    Parameters
+    ----------
+    max_stitch_length : float (optional)
+        Stitches longer than this are split. If not given, no stitches are split.
+    min_stitch_length : float (optional, default=0)
+        Stitches shorter than this are removed. Duplicate stitches are always removed.
+    """
+
+    def __init__(self, max_stitch_length: Optional[float] = None, min_stitch_length: float = 0) -> None:
+        self.max_stitch_length = max_stitch_length
+        self.min_stitch_length = min_stitch_length
+        self.needle = None  # The position of the previous stitch or jump
+        self.anchor = None  # The position of the previous stitch, if it is in the same run of stitches
+
+    def _num_splits(self, x: float, y: float) -> int:
+        """The number of stitches that the stitch from the needle position to ``(x, y)`` is split into."""
+        if self.max_stitch_length is None or self.needle is None:
+            return 1
+        distance = math.hypot(x - self.needle[0], y - self.needle[1])
+        if distance <= self.max_stitch_length:
+            return 1
+        return math.ceil(distance / self.max_stitch_length)
+
+    def normalise(
+        self, stitches: Sequence[tuple[float, float, int]], next_command: Optional[int] = None
+    ) -> tuple[list[tuple[float, float, int]], int, int]:
+        """Normalise the stitches of one stitch group.
+
+        Parameters
+        ----------
+        stitches : Sequence[tuple[float, float, int]]
+            The ``(x, y, command)`` tuples of the stitch group.
+        next_command : int (optional)
+            The first command after the stitch group, which decides if the last stitch of the group ends a run. None
+            if the stitch group is the last one.
+
+        Returns
+        -------
+        tuple[list[tuple[float, float, int]], int, int]
+            The normalised stitches, the number of stitches that were added by splitting long stitches and the number
+            of stitches that were removed.
+        """
+        normalised = []
+        num_added = num_removed = 0
+        for i, (x, y, command) in enumerate(stitches):
+            if command != pyembroidery.STITCH:
+                normalised.append((x, y, command))
+                self.anchor = None
+                if command == pyembroidery.JUMP:
+                    self.needle = (x, y)
+                continue
+
+            if self.anchor is not None:
+                distance = math.hypot(x - self.anchor[0], y - self.anchor[1])
+                following_command = stitches[i + 1][2] if i + 1 < len(stitches) else next_command
+                ends_run = following_command != pyembroidery.STITCH
+                if distance == 0 or (distance < self.min_stitch_length and not ends_run):
+                    num_removed += 1
+                    continue
+
+            num_splits = self._num_splits(x, y)
+            for step in range(1, num_splits):
+                t = step / num_splits
+                needle_x, needle_y = self.needle
+                normalised.append((needle_x + t * (x - needle_x), needle_y + t * (y - needle_y), command))
+            num_added += num_splits - 1
+
+            normalised.append((x, y, command))
+            self.needle = self.anchor = (x, y)
+        return normalised, num_added, num_removed
+
+
+def _normalise_arrays(
+    x: np.ndarray,
+    y: np.ndarray,
+    commands: np.ndarray,
+    max_stitch_length: Optional[float],
+    min_stitch_length: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorised version of :py:meth:`StitchNormaliser.normalise` for all stitches at once.
+
+    The stitch lengths are computed with NumPy to find the stitches that may be too short or too long, and only those
+    stitches are checked one at a time with :py:func:`math.hypot`, so the output is identical to the pure Python
+    implementation.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        The number of output stitches for each input stitch (0 if it was removed and more than 1 if it was split)
+        and the x coordinates, y coordinates and commands of the normalised stitches.
+    """
+    num_stitches = len(commands)
+    is_stitch = commands == pyembroidery.STITCH
+    ends_run = is_stitch.copy()
+    ends_run[:-1] &= ~is_stitch[1:]
+    follows_stitch = np.zeros(num_stitches, dtype=bool)
+    follows_stitch[1:] = is_stitch[1:] & is_stitch[:-1]
+
+    # Remove short stitches. A stitch can only be removed if it is close to the previous stitch, or if the previous
+    # stitch was removed, so we only follow the chains of removed stitches one stitch at a time.
+    keep = np.ones(num_stitches, dtype=bool)
+    dx = np.diff(x, prepend=x[:1])
+    dy = np.diff(y, prepend=y[:1])
+    is_short = (dx * dx + dy * dy < min_stitch_length**2 * (1 + 1e-9)) | ((dx == 0) & (dy == 0))
+    last_checked = -1
+    for i in np.flatnonzero(follows_stitch & is_short).tolist():
+        if i <= last_checked:
+            continue
+        anchor = i - 1
+        j = i
+        while j < num_stitches and is_stitch[j]:
+            distance = math.hypot(x[j] - x[anchor], y[j] - y[anchor])
+            if distance != 0 and (distance >= min_stitch_length or ends_run[j]):
+                break
+            keep[j] = False
+            j += 1
+        last_checked = j
+
+    kept = np.flatnonzero(keep)
+    x, y, commands = x[kept], y[kept], commands[kept]
+    num_kept = len(kept)
+    num_splits = np.ones(num_kept, dtype=np.int64)
+
+    # Split long stitches, measured from the previous stitch or jump
+    if max_stitch_length is not None and num_kept:
+        is_stitch = commands == pyembroidery.STITCH
+        is_needle = is_stitch | (commands == pyembroidery.JUMP)
+        previous = np.empty(num_kept, dtype=np.int64)
+        previous[0] = -1
+        previous[1:] = np.maximum.accumulate(np.where(is_needle, np.arange(num_kept), -1))[:-1]
+        dx = x - x[previous]
+        dy = y - y[previous]
+        is_long = dx * dx + dy * dy > max_stitch_length**2 * (1 - 1e-9)
+        for i in np.flatnonzero(is_stitch & (previous >= 0) & is_long).tolist():
+            distance = math.hypot(x[i] - x[previous[i]], y[i] - y[previous[i]])
+            if distance > max_stitch_length:
+                num_splits[i] = math.ceil(distance / max_stitch_length)
+
+    source = np.repeat(np.arange(num_kept), num_splits)
+    x_normalised, y_normalised, commands_normalised = x[source], y[source], commands[source]
+    if np.any(num_splits > 1):
+        first_output = np.cumsum(num_splits) - num_splits
+        step = np.arange(len(source)) - first_output[source] + 1
+        is_intermediate = step < num_splits[source]
+        split_source = source[is_intermediate]
+        split_previous = previous[split_source]
+        t = step[is_intermediate] / num_splits[split_source]
+        x_normalised[is_intermediate] = x[split_previous] + t * (x[split_source] - x[split_previous])
+        y_normalised[is_intermediate] = y[split_previous] + t * (y[split_source] - y[split_previous])
+
+    counts = np.zeros(num_stitches, dtype=np.int64)
+    counts[kept] = num_splits
+    return counts, x_normalised, y_normalised, commands_normalised
+
+
+class StitchArray:
+    """Compact columnar storage of all stitches in an embroidery pattern.
+
+    The stitches are stored in three flat arrays: ``float64`` x and y coordinates and ``uint8`` PyEmbroidery commands.
+    This takes 17 bytes per stitch, compared to roughly 200 bytes per stitch for a list of ``(x, y, command)`` tuples.
+    The stitches of each stitch group are stored contiguously and ``group_offsets[i]:group_offsets[i + 1]`` is the range
+    of stitches that belongs to the i-th stitch group (including any colour change that precedes the group).
+
+    The ``stitches`` and ``threadlist`` attributes mirror those of ``pyembroidery.EmbPattern``, so a stitch array can
+    be used directly with :py:func:`turtlethread.pattern_info.get_pattern_info` and the visualisation functions.
+
+    Usually, you don't create stitch arrays yourself, but get them from
+    :py:meth:`turtlethread.stitches.EmbroideryPattern.to_stitch_array`.
+    """
+
+    def __init__(self) -> None:
+        self.x = array("d")
+        self.y = array("d")
+        self.commands = array("B")
+        self.group_offsets = array("q", [0])
+        self.colors = []
+        self._has_stitches = False
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    @property
+    def num_groups(self) -> int:
+        """The number of stitch groups stored in the array."""
+        return len(self.group_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used to store the stitches."""
+        return sum(
+            len(column) * column.itemsize for column in (self.x, self.y, self.commands, self.group_offsets)
+        )
+
+    @property
+    def stitches(self) -> StitchView:
+        """A read-only view of all stitches, behaves like ``pyembroidery.EmbPattern.stitches``."""
+        return StitchView(memoryview(self.x), memoryview(self.y), memoryview(self.commands))
+
+    @property
+    def threadlist(self) -> list[pyembroidery.EmbThread]:
+        """List of threads, one for each colour block, behaves like ``pyembroidery.EmbPattern.threadlist``."""
+        threads = []
+        for color in self.colors:
+            thread = pyembroidery.EmbThread()
+            thread.set(color)
+            threads.append(thread)
+        return threads
+
+    def group(self, group_idx: int) -> StitchView:
+        """A read-only view of the stitches of the ``group_idx``-th stitch group."""
+        start, stop = self.group_offsets[group_idx], self.group_offsets[group_idx + 1]
+        return self.stitches[start:stop]
+
+    def add_color(self, color: str) -> None:
+        """Add a new thread colour. A colour change command is added if the pattern already contains stitches."""
+        self.colors.append(color)
+        if self._has_stitches:
+            # Same as pyembroidery.EmbPattern.color_change, which adds the colour change at (0, 0) when stitches are
+            # added directly to the stitch list
+            self.x.append(0)
+            self.y.append(0)
+            self.commands.append(pyembroidery.COLOR_CHANGE)
+
+    def extend(self, stitches: Iterable[tuple[float, float, int]], scale: float = 1) -> None:
+        """Add stitches to the current stitch group.
+
+        Parameters
+        ----------
+        stitches : Iterable[tuple[float, float, int]]
+            Iterable of ``(x, y, command)`` tuples.
+        scale : float (optional, default=1)
+            All coordinates are multiplied by this factor before they are stored.
+        """
+        if not isinstance(stitches, (list, tuple)):
+            stitches = list(stitches)
+        if not stitches:
+            return
+
+        x, y, commands = zip(*stitches)
+        if scale != 1:
+            x = [x_i * scale for x_i in x]
+            y = [y_i * scale for y_i in y]
+        self.x.extend(x)
+        self.y.extend(y)
+        self.commands.extend(commands)
+        self._has_stitches = self._has_stitches or pyembroidery.STITCH in commands
+
+    def extend_arrays(self, x: np.ndarray, y: np.ndarray, commands: np.ndarray, scale: float = 1) -> None:
+        """Add stitches stored as NumPy arrays to the current stitch group.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The x coordinates of the stitches.
+        y : np.ndarray
+            The y coordinates of the stitches.
+        commands : np.ndarray
+            The PyEmbroidery commands of the stitches.
+        scale : float (optional, default=1)
+            All coordinates are multiplied by this factor before they are stored.
+        """
+        commands = np.asarray(commands, dtype=np.uint8)
+        self.x.frombytes(np.asarray(x * scale if scale != 1 else x, dtype=np.float64).tobytes())
+        self.y.frombytes(np.asarray(y * scale if scale != 1 else y, dtype=np.float64).tobytes())
+        self.commands.frombytes(commands.tobytes())
+        self._has_stitches = self._has_stitches or bool(np.any(commands == pyembroidery.STITCH))
+
+    def extend_from(self, other: StitchArray, start: int = 0, stop: Optional[int] = None) -> None:
+        """Add the stitches ``start:stop`` of another stitch array to the current stitch group (without scaling).
+
+        Parameters
+        ----------
+        other : StitchArray
+            Stitch array to copy the stitches from. The colours of ``other`` are ignored.
+        start : int (optional, default=0)
+            Index of the first stitch to copy.
+        stop : int (optional)
+            Index after the last stitch to copy. If not given, all stitches after ``start`` are copied.
+        """
+        commands = other.commands[start:stop]
+        self.x.extend(other.x[start:stop])
+        self.y.extend(other.y[start:stop])
+        self.commands.extend(commands)
+        self._has_stitches = self._has_stitches or bytes([pyembroidery.STITCH]) in commands.tobytes()
+
+    def end_group(self) -> None:
+        """Mark the end of the current stitch group."""
+        self.group_offsets.append(len(self.commands))
+
+    def normalised(
+        self, max_stitch_length: Optional[float] = None, min_stitch_length: float = 0
+    ) -> tuple[StitchArray, NormalisationSummary]:
+        """Get a copy of the stitch array where long stitches are split and duplicate and short stitches are removed.
+
+        Embroidery machines reject or slow down on long stitches, and very short stitches make the thread break. See
+        :py:class:`StitchNormaliser` for the rules. Jumps, trims and colour changes are not changed. The lengths are
+        in the units of the stitch array, i.e. in PyEmbroidery steps (1/10 mm) after scaling.
+
+        Parameters
+        ----------
+        max_stitch_length : float (optional)
+            Stitches longer than this are split. If not given, no stitches are split.
+        min_stitch_length : float (optional, default=0)
+            Stitches shorter than this are removed. Duplicate stitches are always removed.
+
+        Returns
+        -------
+        tuple[StitchArray, dict[int, tuple[int, int]]]
+            The normalised stitch array, and a summary that maps the index of each stitch group that was changed to
+            the number of stitches that were added by splitting and the number of stitches that were removed.
+        """
+        normalised = StitchArray()
+        normalised.colors = list(self.colors)
+        normalised._has_stitches = self._has_stitches
+        summary = {}
+        num_stitches = len(self)
+        # Stitches after the last group offset belong to a group that hasn't ended yet
+        boundaries = list(self.group_offsets)
+        if boundaries[-1] < num_stitches:
+            boundaries.append(num_stitches)
+
+        if USE_NUMPY and np is not None and num_stitches:
+            counts, x, y, commands = _normalise_arrays(*self.as_numpy(), max_stitch_length, min_stitch_length)
+            normalised.extend_arrays(x, y, commands)
+            output_offsets = np.zeros(num_stitches + 1, dtype=np.int64)
+            np.cumsum(counts, out=output_offsets[1:])
+            normalised.group_offsets = array("q", output_offsets[list(self.group_offsets)].tolist())
+
+            group_idx = np.repeat(np.arange(len(boundaries) - 1), np.diff(boundaries))
+            num_added = np.bincount(group_idx, weights=np.maximum(counts - 1, 0), minlength=self.num_groups)
+            num_removed = np.bincount(group_idx, weights=counts == 0, minlength=self.num_groups)
+            for group in np.flatnonzero((num_added + num_removed)[: self.num_groups]).tolist():
+                summary[group] = (int(num_added[group]), int(num_removed[group]))
+            return normalised, summary
+
+        normaliser = StitchNormaliser(max_stitch_length, min_stitch_length)
+        for group, (start, stop) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+            next_command = self.commands[stop] if stop < num_stitches else None
+            stitches, num_added, num_removed = normaliser.normalise(self.stitches[start:stop], next_command)
+            normalised.extend(stitches)
+            if group < self.num_groups:
+                normalised.end_group()
+                if num_added or num_removed:
+                    summary[group] = (num_added, num_removed)
+        return normalised, summary
+
+    def as_numpy(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get NumPy views of the x, y and command arrays (no data is copied). Requires NumPy."""
+        if np is None:
+            raise ImportError("NumPy is required for StitchArray.as_numpy, install it with `pip install numpy`")
+
+        return (
+            np.frombuffer(self.x, dtype=np.float64),
+            np.frombuffer(self.y, dtype=np.float64),
+            np.frombuffer(self.commands, dtype=np.uint8),
+        )
+
+    def to_pyembroidery(self) -> pyembroidery.EmbPattern:
+        """Convert to a PyEmbroidery pattern."""
+        pattern = pyembroidery.EmbPattern()
+        for color in self.colors:
+            pattern.add_thread(color)
+        pattern.stitches.extend(self.stitches)
+        return pattern
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 import itertools
 import math
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from copy import copy
-from typing import Any, Generator, Iterable, Optional 
+from typing import Any, Generator, Iterable, Iterator, Optional 
 
 try:
     from typing import Literal, Self, TypeAlias
@@ -13,10 +15,204 @@ except ImportError:
 
 import pyembroidery
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
 from .base_turtle import Vec2D
+from .optimise import CoverageGrid, TrimPolicy, order_color_blocks, order_paths, travel_distance
+from .stitch_array import NormalisationSummary, StitchArray, StitchNormaliser
 
 # STITCH=0, JUMP=1, TRIM=2, ZIGZAG=3, SATIN=4, CROSS=5, Z=6
 StitchCommand: TypeAlias = Literal[0, 1, 2, 3, 4, 5, 6]
+# ((a, b, c), (d, e, f)) maps (x, y) to (a*x + b*y + c, d*x + e*y + f)
+AffineTransform: TypeAlias = tuple[tuple[float, float, float], tuple[float, float, float]]
+
+# Use the vectorised NumPy code paths for stitch groups with at least NUMPY_MIN_POSITIONS locations. For smaller groups
+# the overhead of creating the arrays is larger than the time saved.
+USE_NUMPY = np is not None
+NUMPY_MIN_POSITIONS = 8
+# Unit stitches (zigzag, cross, Z and satin) are tiled with NumPy along segments with at least NUMPY_MIN_UNITS units
+NUMPY_MIN_UNITS = 8
+
+
+def _use_numpy(positions: list[Vec2D]) -> bool:
+    return USE_NUMPY and np is not None and len(positions) >= NUMPY_MIN_POSITIONS
+
+
+def _accumulate(starts: np.ndarray, steps: np.ndarray, counts: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Compute ``start, start + step, start + step + step, ...`` for many (start, step, count) triplets at once.
+
+    The additions are done one at a time in the same order as a Python ``while`` loop that does ``x += step``, so the
+    results are bit-identical to the loop. Rows with the same count are stacked and accumulated together.
+
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray]]
+        List of ``(row_indices, values)`` pairs where ``values[i, k]`` is the k-th accumulated value (excluding the
+        start value) for row ``row_indices[i]``.
+    """
+    accumulated = []
+    for count in np.unique(counts):
+        if count == 0:
+            continue
+        rows = np.flatnonzero(counts == count)
+        values = np.empty((len(rows), count + 1))
+        values[:, 0] = starts[rows]
+        values[:, 1:] = steps[rows, np.newaxis]
+        accumulated.append((rows, np.cumsum(values, axis=1)[:, 1:]))
+    return accumulated
+
+
+def _running_stitch_arrays(
+    start_pos: Vec2D, positions: list[Vec2D], stitch_length: int | float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised version of :py:meth:`RunningStitch._get_stitch_commands`.
+
+    All segments of the stitch group are subdivided at once. The per-segment lengths and directions are computed with
+    the :py:mod:`math` module so the output is bit-identical to the pure Python implementation.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The x and y coordinates of the stitches (all stitch commands are ``pyembroidery.STITCH``).
+    """
+    points = [start_pos, *positions]
+    geometry = [
+        (math.sqrt((x - x_end) ** 2 + (y - y_end) ** 2), math.atan2(y_end - y, x_end - x))
+        for (x, y), (x_end, y_end) in zip(points[:-1], points[1:])
+    ]
+    distances = np.array([distance for distance, _ in geometry], dtype=float)
+    dx = np.array([math.cos(angle) for _, angle in geometry], dtype=float)
+    dy = np.array([math.sin(angle) for _, angle in geometry], dtype=float)
+    coordinates = np.array(points, dtype=float)
+
+    # distance_traveled after k stitches, accumulated the same way as in the while loop (0, L, L + L, ...)
+    max_stitches = int(distances.max() // stitch_length) + 3 if len(distances) else 1
+    traveled = np.zeros(max_stitches + 1)
+    traveled[1:] = stitch_length
+    traveled = np.cumsum(traveled)
+
+    # Stitch until the distance to the end is less than two stitch lengths, then add one more stitch if the final
+    # stitch would otherwise be longer than 1.5 stitch lengths.
+    num_stitches = np.searchsorted(traveled + 2 * stitch_length, distances, side="left")
+    num_stitches += distances - traveled[num_stitches] >= 1.5 * stitch_length
+
+    # Each segment gives its intermediate stitches followed by a stitch at the end position
+    offsets = np.empty(len(distances) + 1, dtype=np.int64)
+    offsets[0] = 1
+    np.cumsum(num_stitches + 1, out=offsets[1:])
+    offsets[1:] += 1
+
+    x = np.empty(offsets[-1])
+    y = np.empty(offsets[-1])
+    x[0], y[0] = coordinates[0]
+    end_indices = offsets[1:] - 1
+    x[end_indices] = coordinates[1:, 0]
+    y[end_indices] = coordinates[1:, 1]
+
+    for rows, values in _accumulate(coordinates[:-1, 0], stitch_length * dx, num_stitches):
+        x[offsets[rows, np.newaxis] + np.arange(values.shape[1])] = values
+    for rows, values in _accumulate(coordinates[:-1, 1], stitch_length * dy, num_stitches):
+        y[offsets[rows, np.newaxis] + np.arange(values.shape[1])] = values
+
+    return x, y
+
+
+def _commands_from_arrays(
+    x: np.ndarray, y: np.ndarray, command: StitchCommand
+) -> list[tuple[float, float, StitchCommand]]:
+    """Convert coordinate arrays to a list of ``(x, y, command)`` tuples with Python floats."""
+    return list(zip(x.tolist(), y.tolist(), itertools.repeat(command, len(x))))
+
+
+class SegmentCache:
+    """Least recently used cache for the stitches of a single segment, relative to the segment start.
+
+    Text and repeated motifs give the same segments over and over, only translated. The stitches of a segment only
+    depend on the stitch group class, its parameters and the segment vector, so they are generated once, stored
+    relative to the segment start and offset to the start of every other segment with the same key.
+
+    The segment vectors in the keys are rounded to ``decimals`` decimals so segments that only differ by floating point
+    rounding errors share the same entry. Stitches at the end position of a segment are always placed exactly at the
+    end position. Other stitches are offset from the segment start, so they may differ in the last bit from the
+    stitches that would be generated for that segment, and the result depends on which segment was cached first.
+    Therefore, the shared :py:data:`segment_cache` is disabled by default. Set its ``maxsize`` to enable it.
+
+    Parameters
+    ----------
+    maxsize : int (optional, default=4096)
+        Maximum number of segments to store. If 0, the cache is disabled.
+    decimals : int (optional, default=6)
+        Number of decimals to round the segment vectors to.
+
+    Attributes
+    ----------
+    hits : int
+        Number of segments that were found in the cache.
+    misses : int
+        Number of segments that were generated and added to the cache.
+    """
+
+    def __init__(self, maxsize: int = 4096, decimals: int = 6) -> None:
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._segments = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def clear(self) -> None:
+        """Remove all segments from the cache and reset the hit and miss counters."""
+        self._segments.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stitches(
+        self, stitch_group: StitchGroup, position_1: Vec2D, position_2: Vec2D
+    ) -> list[tuple[float, float, StitchCommand]]:
+        """Get the stitches of ``stitch_group`` between two positions, generating them if they are not cached."""
+        parameters = stitch_group._segment_parameters()
+        if self.maxsize <= 0 or parameters is None:
+            return list(stitch_group._iter_stitches_between_positions(position_1, position_2))
+
+        x, y = position_1
+        x_end, y_end = position_2
+        key = (
+            type(stitch_group),
+            parameters,
+            round(x_end - x, self.decimals),
+            round(y_end - y, self.decimals),
+        )
+        segment = self._segments.get(key)
+        if segment is not None:
+            self.hits += 1
+            self._segments.move_to_end(key)
+            relative_commands, end_indices = segment
+            stitch_commands = [(x + dx, y + dy, command) for dx, dy, command in relative_commands]
+            for i in end_indices:
+                stitch_commands[i] = (x_end, y_end, stitch_commands[i][2])
+            return stitch_commands
+
+        self.misses += 1
+        stitch_commands = list(stitch_group._iter_stitches_between_positions(position_1, position_2))
+        relative_commands = tuple(
+            (stitch_x - x, stitch_y - y, command) for stitch_x, stitch_y, command in stitch_commands
+        )
+        end_indices = tuple(
+            i for i, (stitch_x, stitch_y, _) in enumerate(stitch_commands) if stitch_x == x_end and stitch_y == y_end
+        )
+        self._segments[key] = (relative_commands, end_indices)
+        while len(self._segments) > self.maxsize:
+            self._segments.popitem(last=False)
+        return stitch_commands
+
+
+# Shared by all stitch groups. Disabled by default, set segment_cache.maxsize to a positive number to enable it.
+segment_cache = SegmentCache(maxsize=0)
 
 
 class EmbroideryPattern:
@@ -29,30 +225,468 @@ class EmbroideryPattern:
     scale: int (optional, default=1)
         All coordinates are multiplied by this parameter before converting it to a PyEmbroidery pattern.
         This is useful to control the number of steps per mm (default is 10 steps per mm).
+    auto_compact: bool (optional, default=False)
+        If True, :py:meth:`compact` is called before the pattern is exported.
+    max_stitch_length: float (optional)
+        If given, stitches that are longer than this are split into shorter stitches when the pattern is exported.
+        The length is in PyEmbroidery steps (1/10 mm) after scaling, so 120 is 12 mm.
+    min_stitch_length: float (optional)
+        If given, duplicate stitches and stitches that are shorter than this are removed when the pattern is exported.
+        The length is in PyEmbroidery steps after scaling, so 3 is 0.3 mm.
+
+    Attributes
+    ----------
+    normalisation_summary: dict[int, tuple[int, int]]
+        If ``max_stitch_length`` or ``min_stitch_length`` is given, this maps the index of each stitch group that was
+        changed by the last export to the number of stitches that were added by splitting and the number of stitches
+        that were removed. See :py:class:`turtlethread.stitch_array.StitchNormaliser` for the rules.
     """
 
-    def __init__(self, scale: int = 1) -> None:
+    def __init__(
+        self,
+        scale: int = 1,
+        auto_compact: bool = False,
+        max_stitch_length: Optional[float] = None,
+        min_stitch_length: Optional[float] = None,
+    ) -> None:
         self.stitch_groups: list[StitchGroup] = []
         self.scale = scale
+        self.auto_compact = auto_compact
+        self.max_stitch_length = max_stitch_length
+        self.min_stitch_length = min_stitch_length
+        self.normalisation_summary: NormalisationSummary = {}
+
+        # Cache for to_stitch_array. The compiled stitch array is reused as long as no stitch group has changed, and
+        # _compiled_ranges maps id(stitch_group) -> (stitch_group, revision, scale, start, stop) so unchanged stitch
+        # groups can be copied from the previous compilation instead of being generated again.
+        self._compiled = None
+        self._compiled_key = None
+        self._compiled_ranges = {}
+        # The normalised copy of the compiled stitch array and the (compiled, max length, min length) it was made from
+        self._normalised = None
+        self._normalised_key = None
+        self._hex_colors = {}  # Parsing colours with pyembroidery.EmbThread is slow, so we only do it once per colour
+
+    def _hex_color(self, color: str) -> str:
+        if color not in self._hex_colors:
+            self._hex_colors[color] = pyembroidery.EmbThread(color).hex_color()
+        return self._hex_colors[color]
+
+    def _compile_stitch_group(self, stitch_group: StitchGroup, stitch_array: StitchArray) -> None:
+        """Generate the stitches of a stitch group and add them to the stitch array."""
+        stitch_arrays = stitch_group._get_stitch_arrays() if stitch_group._stitch_commands is None else None
+        if stitch_arrays is not None:
+            stitch_array.extend_arrays(*stitch_arrays, scale=self.scale)
+        elif stitch_group._stitch_commands is not None:
+            stitch_array.extend(stitch_group._stitch_commands, scale=self.scale)
+        else:
+            # Don't cache the commands in the stitch group, the compiled stitch array is the cache
+            stitch_array.extend(stitch_group._get_stitch_commands(), scale=self.scale)
+
+    def _changes_thread(self, stitch_group: StitchGroup, current_color: Optional[str]) -> bool:
+        """Check if a thread is added before ``stitch_group`` when the current thread colour is ``current_color``."""
+        if isinstance(stitch_group, JumpStitch) or stitch_group.color is None:
+            return False
+        return current_color is None or self._hex_color(current_color) != self._hex_color(stitch_group.color)
+
+    def compact(self) -> int:
+        """Remove empty stitch groups and merge adjacent stitch groups without changing the stitches of the pattern.
+
+        Nested stitch group contexts, colour changes and fills create many small or empty stitch groups, which makes
+        every export slower. This pass removes empty stitch groups that don't change the thread and merges adjacent
+        stitch groups of the same type, parameters and colour when the merged group gives the same stitches (see
+        :py:meth:`StitchGroup._merge`).
+
+        The last stitch group is never removed or merged, since it may be the stitch group that a turtle is currently
+        adding locations to. Merged stitch groups are new objects, so the original stitch groups are not modified.
+
+        Returns
+        -------
+        int
+            The number of stitch groups that were removed.
+        """
+        num_stitch_groups = len(self.stitch_groups)
+        compacted = []
+        current_color = None
+        for i, stitch_group in enumerate(self.stitch_groups):
+            is_last = i == num_stitch_groups - 1
+            changes_thread = self._changes_thread(stitch_group, current_color)
+            if not is_last and stitch_group._is_empty():
+                # An empty stitch group only matters if it changes the thread. If the next stitch group has the same
+                # colour, that stitch group changes to the same thread at the same place instead.
+                next_group = self.stitch_groups[i + 1]
+                next_has_same_color = (
+                    not isinstance(next_group, JumpStitch)
+                    and next_group.color is not None
+                    and not self._changes_thread(next_group, stitch_group.color)
+                )
+                if not changes_thread or next_has_same_color:
+                    continue
+
+            if not is_last and not changes_thread and compacted and compacted[-1]._can_merge(stitch_group):
+                compacted[-1] = compacted[-1]._merge(stitch_group)
+                continue
+
+            compacted.append(stitch_group)
+            if changes_thread:
+                current_color = stitch_group.color
+
+        self.stitch_groups = compacted
+        return num_stitch_groups - len(compacted)
+
+    def optimise_order(self, time_budget: float = 1.0) -> tuple[float, float]:
+        """Reorder and reverse stitch groups within each colour block to minimise the total jump distance.
+
+        The stitch groups between two jump stitch groups form a path that is stitched without jumping. Within each
+        colour block, the paths are reordered (and reversed if all their stitch groups can be reversed) with
+        :py:func:`turtlethread.optimise.order_paths`, and new jump stitch groups are added between paths that don't
+        meet. The thread colours are not changed. Colour blocks that mix stitch groups with and without a colour are
+        left as they are.
+
+        Reversed stitch groups are new objects, so this should be called when the pattern is finished, not while a
+        turtle is still adding locations to it.
+
+        Parameters
+        ----------
+        time_budget : float (optional, default=1.0)
+            Maximum number of seconds to spend improving the order, shared between the colour blocks.
+
+        Returns
+        -------
+        tuple[float, float]
+            The total jump distance (in unscaled steps) before and after reordering.
+        """
+        deadline = time.perf_counter() + time_budget
+
+        stitch_groups = []
+        position = Vec2D(0, 0)
+        distance_before = distance_after = 0.0
+        blocks = self._color_blocks()
+        for block_idx, block in enumerate(blocks):
+            # Paths are the runs of stitch groups between jumps, paths without stitches stay at the start of the block
+            paths = [[]]
+            for stitch_group in block:
+                if _is_jump(stitch_group):
+                    paths.append([])
+                else:
+                    paths[-1].append(stitch_group)
+            empty_paths = [path for path in paths if path and all(group._is_empty() for group in path)]
+            paths = [path for path in paths if path and not all(group._is_empty() for group in path)]
+            has_color = {group.color is not None for path in paths for group in path}
+            if len(has_color) > 1:
+                stitch_groups.extend(block)
+                position = _end_position(block[-1])
+                continue
+
+            starts = [path[0]._start_pos for path in paths]
+            ends = [_end_position(path[-1]) for path in paths]
+            reversible = [all(group._can_reverse() for group in path) for path in paths]
+            remaining_time = max(deadline - time.perf_counter(), 0)
+            order = order_paths(position, starts, ends, reversible, remaining_time / (len(blocks) - block_idx))
+            distance_before += travel_distance(position, [(i, False) for i in range(len(paths))], starts, ends)
+            distance_after += travel_distance(position, order, starts, ends)
+
+            for path in empty_paths:
+                stitch_groups.extend(path)
+            for path_idx, reverse in order:
+                path = paths[path_idx]
+                if reverse:
+                    path = [group._reverse() for group in reversed(path)]
+                if tuple(path[0]._start_pos) != tuple(position):
+                    jump_stitch = JumpStitch(position)
+                    jump_stitch.add_location(path[0]._start_pos)
+                    stitch_groups.append(jump_stitch)
+                stitch_groups.extend(path)
+                position = _end_position(path[-1])
+
+        self._set_stitch_groups_keeping_final_jump(stitch_groups, position)
+        return distance_before, distance_after
+
+    def consolidate_colors(self, color_order: Optional[Iterable[str]] = None, margin: float = 0) -> int:
+        """Reorder the colour blocks of the pattern so stitch groups with the same colour are stitched together.
+
+        Every colour block (the stitch groups from one thread change to the next) is moved as a whole, and blocks with
+        the same colour that end up next to each other share one thread. By default, the layering of the design is
+        kept: a block is never moved past an earlier block of another colour that it overlaps. If ``color_order`` is
+        given, the colours are stitched in that order instead, regardless of overlaps. See
+        :py:func:`turtlethread.optimise.order_color_blocks` for details.
+
+        Jump stitch groups between the colour blocks are replaced by new jump stitch groups between the reordered
+        blocks. Stitch groups without a colour at the start of the pattern are not moved.
+
+        Parameters
+        ----------
+        color_order : Iterable[str] (optional)
+            The order to stitch the colours in, from bottom to top. Colours that are not listed are stitched last.
+        margin : float (optional, default=0)
+            Two blocks overlap if their bounding boxes are closer than this distance.
+
+        Returns
+        -------
+        int
+            The number of colour changes that were saved.
+        """
+        num_threads = len(self.thread_colors())
+        blocks = self._color_blocks()
+        fixed_blocks = []
+        if blocks and not self._changes_thread(blocks[0][0], None):
+            fixed_blocks.append(blocks.pop(0))
+
+        # Jumps at the end of a block lead to the next block, so they are replaced
+        for block in blocks:
+            while len(block) > 1 and _is_jump(block[-1]):
+                block.pop()
+
+        colors = [self._hex_color(block[0].color) for block in blocks]
+        bounding_boxes = [_bounding_box(block, margin) for block in blocks]
+        if color_order is not None:
+            color_order = [self._hex_color(color) for color in color_order]
+        order = order_color_blocks(colors, bounding_boxes, color_order)
+
+        stitch_groups = [stitch_group for block in fixed_blocks for stitch_group in block]
+        position = _end_position(stitch_groups[-1]) if stitch_groups else Vec2D(0, 0)
+        for block_idx in order:
+            block = blocks[block_idx]
+            first_position = block[0]._start_pos
+            if tuple(first_position) != tuple(position):
+                jump_stitch = JumpStitch(position)
+                jump_stitch.add_location(first_position)
+                stitch_groups.append(jump_stitch)
+            stitch_groups.extend(block)
+            position = _end_position(block[-1])
+
+        self._set_stitch_groups_keeping_final_jump(stitch_groups, position)
+        return num_threads - len(self.thread_colors())
+
+    def count_trims(self) -> int:
+        """Count the trim commands of the pattern. The stitches are streamed, so nothing is cached."""
+        return sum(1 for _, _, command in self.iter_stitches() if command == pyembroidery.TRIM)
+
+    def apply_trim_policy(self, policy: TrimPolicy) -> tuple[int, int]:
+        """Replace the jump stitch groups with trimmed jumps, jumps without a trim or travel stitches.
+
+        The action for each jump is decided by ``policy`` (see :py:class:`turtlethread.optimise.TrimPolicy`). A jump
+        is hidden if it is covered by the stitches of the stitch groups after it. Travel stitches are running stitch
+        groups without a colour, so they are sewn with the current thread.
+
+        Parameters
+        ----------
+        policy : turtlethread.optimise.TrimPolicy
+            The policy that decides what to do with each jump.
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of trims before and after applying the policy.
+        """
+        num_trims = self.count_trims()
+        coverage = CoverageGrid(policy.cover_distance / 2) if policy.travel_distance > 0 else None
+
+        # Go backwards so the coverage grid contains the stitches that are sewn after each jump
+        stitch_groups = []
+        for stitch_group in reversed(self.stitch_groups):
+            if not isinstance(stitch_group, JumpStitch) or not stitch_group._positions:
+                if coverage is not None and not isinstance(stitch_group, JumpStitch):
+                    # Only sewn stitches cover jumps, e.g. not the jumps of instances of jump stitch groups
+                    runs = itertools.groupby(stitch_group.stitch_commands, key=lambda c: c[2] == pyembroidery.STITCH)
+                    for is_stitch, commands in runs:
+                        if is_stitch:
+                            coverage.add_stitches([(x, y) for x, y, _ in commands])
+                stitch_groups.append(stitch_group)
+                continue
+
+            points = [stitch_group._start_pos, *stitch_group._positions]
+            if stitch_group.skip_intermediate_jumps:
+                points = [points[0], points[-1]]
+            action = policy.action(points, coverage)
+            if action == "travel":
+                new_group = RunningStitch(stitch_group._start_pos, None, policy.travel_stitch_length)
+            else:
+                new_group = JumpStitch(
+                    stitch_group._start_pos,
+                    color=stitch_group.color,
+                    skip_intermediate_jumps=stitch_group.skip_intermediate_jumps,
+                    trim=action == "trim",
+                )
+            for position in points[1:]:
+                new_group.add_location(position)
+            stitch_groups.append(new_group)
+
+        self.stitch_groups = stitch_groups[::-1]
+        return num_trims, self.count_trims()
+
+    def _color_blocks(self) -> list[list[StitchGroup]]:
+        """Split the stitch groups into colour blocks, which start at the stitch groups that change the thread."""
+        blocks = [[]]
+        current_color = None
+        for stitch_group in self.stitch_groups:
+            if self._changes_thread(stitch_group, current_color):
+                current_color = stitch_group.color
+                blocks.append([])
+            blocks[-1].append(stitch_group)
+        return [block for block in blocks if block]
+
+    def _set_stitch_groups_keeping_final_jump(self, stitch_groups: list[StitchGroup], position: Vec2D) -> None:
+        """Replace the stitch groups, keeping the final position of the needle if the pattern ends with a jump."""
+        if self.stitch_groups and _is_jump(self.stitch_groups[-1]):
+            final_position = _end_position(self.stitch_groups[-1])
+            if tuple(final_position) != tuple(position):
+                jump_stitch = JumpStitch(position)
+                jump_stitch.add_location(final_position)
+                stitch_groups.append(jump_stitch)
+
+        self.stitch_groups = stitch_groups
+
+    def _normalises(self) -> bool:
+        return self.max_stitch_length is not None or self.min_stitch_length is not None
+
+    def to_stitch_array(self) -> StitchArray:
+        """Convert to a compact :py:class:`turtlethread.stitch_array.StitchArray` (coordinates are scaled).
+
+        The result is cached, and only stitch groups that have received new locations since the last call are
+        generated again. The returned stitch array is shared between calls and should not be modified. If
+        ``max_stitch_length`` or ``min_stitch_length`` is given, the stitches are normalised with
+        :py:meth:`turtlethread.stitch_array.StitchArray.normalised` and ``normalisation_summary`` is updated.
+        """
+        stitch_array = self._compile_stitch_array()
+        if not self._normalises():
+            return stitch_array
+
+        key = (stitch_array, self.max_stitch_length, self.min_stitch_length)
+        if key != self._normalised_key:
+            self._normalised, self.normalisation_summary = stitch_array.normalised(
+                self.max_stitch_length, self.min_stitch_length or 0
+            )
+            self._normalised_key = key
+        return self._normalised
+
+    def _compile_stitch_array(self) -> StitchArray:
+        """Generate the stitch array, reusing the stitches of the stitch groups that haven't changed."""
+        if self.auto_compact:
+            self.compact()
+
+        key = (self.scale, [(id(group), group._revision, group.color) for group in self.stitch_groups])
+        if self._compiled is not None and key == self._compiled_key:
+            return self._compiled
+
+        previous = self._compiled
+        stitch_array = StitchArray()
+        compiled_ranges = {}
+        for stitch_group in self.stitch_groups:
+            if (not isinstance(stitch_group, JumpStitch)) and stitch_group.color is not None:
+                if (
+                    not stitch_array.colors
+                    or self._hex_color(stitch_array.colors[-1]) != self._hex_color(stitch_group.color)
+                ):
+                    stitch_array.add_color(stitch_group.color)
+
+            start = len(stitch_array)
+            revision = (stitch_group, stitch_group._revision, self.scale)
+            cached = self._compiled_ranges.get(id(stitch_group))
+            if cached is not None and cached[0] is stitch_group and cached[1:3] == revision[1:]:
+                stitch_array.extend_from(previous, *cached[3:])
+            else:
+                self._compile_stitch_group(stitch_group, stitch_array)
+            stitch_array.end_group()
+
+            compiled_ranges[id(stitch_group)] = (*revision, start, len(stitch_array))
+
+        self._compiled = stitch_array
+        self._compiled_key = key
+        self._compiled_ranges = compiled_ranges
+        return stitch_array
 
     def to_pyembroidery(self) -> pyembroidery.EmbPattern:
         """Convert to a PyEmbroidery pattern."""
-        pattern:pyembroidery.EmbPattern = pyembroidery.EmbPattern()
+        return self.to_stitch_array().to_pyembroidery()
+
+    def add_instance(
+        self,
+        pattern: EmbroideryPattern,
+        transform: AffineTransform,
+        stitch_groups: Optional[Iterable[int]] = None,
+    ) -> list[StitchGroupInstance]:
+        """Place a transformed copy of another pattern (or some of its stitch groups) in this pattern.
+
+        No stitches are generated or copied when the instance is added. Instead, one :py:class:`StitchGroupInstance`
+        is added for each stitch group, and the stitches are transformed when the pattern is exported. This makes it
+        cheap to place the same motif many times. The stitch groups are referenced, not copied, so stitches that are
+        added to them later are also included in the instances. The scale of ``pattern`` is not used, since all stitch
+        groups are scaled by the scale of this pattern.
+
+        Parameters
+        ----------
+        pattern : EmbroideryPattern
+            The pattern to place. Can also be this pattern, in which case its current stitch groups are placed.
+        transform : tuple[tuple[float, float, float], tuple[float, float, float]]
+            2x3 affine transform ``((a, b, c), (d, e, f))`` that maps ``(x, y)`` to ``(a*x + b*y + c, d*x + e*y + f)``.
+            For example, ``((1, 0, dx), (0, 1, dy))`` translates the pattern by ``(dx, dy)``.
+        stitch_groups : Iterable[int] (optional)
+            Indices of the stitch groups of ``pattern`` to place. If not given, all stitch groups are placed.
+
+        Returns
+        -------
+        list[StitchGroupInstance]
+            The stitch group instances that were added.
+        """
+        source_groups = list(pattern.stitch_groups)
+        if stitch_groups is not None:
+            source_groups = [source_groups[i] for i in stitch_groups]
+
+        instances = [StitchGroupInstance(stitch_group, transform) for stitch_group in source_groups]
+        self.stitch_groups.extend(instances)
+        return instances
+
+    def _iter_thread_changes(self) -> Iterator[tuple[StitchGroup, Optional[str]]]:
+        """Streaming stage that yields each stitch group with the thread colour that must be added before it (or None).
+
+        Uses the same rules as :py:meth:`to_stitch_array`: jump stitches never change the thread, and a new thread is
+        only added when the colour differs from the previous thread.
+        """
+        previous_color = None
         for stitch_group in self.stitch_groups:
-            if (not isinstance(stitch_group, JumpStitch)) and stitch_group.color is not None: 
-                change_col = True 
-                if len(pattern.threadlist) > 0: 
-                    change_col = (pattern.threadlist[-1].hex_color() != pyembroidery.EmbThread(stitch_group.color).hex_color())
-                
-                if change_col: 
-                    pattern += stitch_group.color 
+            new_color = None
+            if (not isinstance(stitch_group, JumpStitch)) and stitch_group.color is not None:
+                if previous_color is None or self._hex_color(previous_color) != self._hex_color(stitch_group.color):
+                    new_color = previous_color = stitch_group.color
+            yield stitch_group, new_color
 
-            scaled_stitch_commands = (
-                (x * self.scale, y * self.scale, cmd) for x, y, cmd in stitch_group.get_stitch_commands()
-            )
-            pattern.stitches.extend(scaled_stitch_commands)
+    def thread_colors(self) -> list[str]:
+        """Get the thread colours of the pattern, i.e. the colours of ``to_pyembroidery().threadlist``.
 
-        return pattern
+        The colours are found without generating any stitches, so this is cheap also for large patterns.
+        """
+        return [color for _, color in self._iter_thread_changes() if color is not None]
+
+    def iter_stitch_groups(self) -> Iterator[list[tuple[float, float, StitchCommand]]]:
+        """Generate the scaled stitch commands one stitch group at a time.
+
+        The stitches are generated lazily by a pipeline of streaming stages (stitch generation, colour changes and
+        scaling), so only one stitch group is kept in memory at the time. Each yielded list contains the stitches of
+        one stitch group, preceded by a ``pyembroidery.COLOR_CHANGE`` command if the thread changes before the group.
+        Concatenating the lists gives the same stitches as ``to_pyembroidery().stitches``, and the thread colours are
+        given by :py:meth:`thread_colors`.
+
+        Unlike :py:meth:`to_stitch_array`, nothing is cached, so the stitches are generated again on every call. If
+        ``max_stitch_length`` or ``min_stitch_length`` is given, the stitches are normalised while they are generated,
+        and ``normalisation_summary`` is updated as the stitch groups are yielded.
+        """
+        if self.auto_compact:
+            self.compact()
+        stitch_groups = _scale_stitch_groups(_add_color_changes(self._iter_thread_changes()), self.scale)
+        if self._normalises():
+            self.normalisation_summary = {}
+            normaliser = StitchNormaliser(self.max_stitch_length, self.min_stitch_length or 0)
+            stitch_groups = _normalise_stitch_groups(stitch_groups, normaliser, self.normalisation_summary)
+        return stitch_groups
+
+    def iter_stitches(self) -> Iterator[tuple[float, float, StitchCommand]]:
+        """Generate the scaled stitch commands one stitch at a time.
+
+        Same as :py:meth:`iter_stitch_groups`, but flattened, so it can be used where ``to_pyembroidery().stitches``
+        would otherwise be used, e.g. ``get_pattern_info(pattern.iter_stitches())``.
+        """
+        return itertools.chain.from_iterable(self.iter_stitch_groups())
 
     def get_pyembroidery_of(self, stitch_group_idx): 
         """Get the PyEmbroidery pattern with the stitch commands of the i-th stitch group"""
@@ -62,7 +696,7 @@ class EmbroideryPattern:
             pattern += stitch_group.color 
 
         scaled_stitch_commands = (
-            (x * self.scale, y * self.scale, cmd) for x, y, cmd in stitch_group.get_stitch_commands()
+            (x * self.scale, y * self.scale, cmd) for x, y, cmd in stitch_group.stitch_commands
         )
         pattern.stitches.extend(scaled_stitch_commands)
 
@@ -75,7 +709,96 @@ class EmbroideryPattern:
         making patterns within patterns, then you probably want to use the :py:meth:`to_pyembroidery` method instead.
         """
         for stitch_group in self.stitch_groups:
-            yield from stitch_group.get_stitch_commands()
+            yield from stitch_group.stitch_commands
+
+
+def _is_jump(stitch_group: StitchGroup) -> bool:
+    """Check if a stitch group is a jump stitch group or an instance of one."""
+    while isinstance(stitch_group, StitchGroupInstance):
+        stitch_group = stitch_group.stitch_group
+    return isinstance(stitch_group, JumpStitch)
+
+
+def _end_position(stitch_group: StitchGroup) -> Vec2D:
+    """The position of the turtle after the last location of a stitch group."""
+    if isinstance(stitch_group, StitchGroupInstance):
+        return stitch_group._transform_point(_end_position(stitch_group.stitch_group))
+    return stitch_group._positions[-1] if stitch_group._positions else stitch_group._start_pos
+
+
+def _bounding_box(stitch_groups: Iterable[StitchGroup], margin: float) -> Optional[tuple[float, float, float, float]]:
+    """The bounding box of the stitches of non-jump stitch groups, expanded by ``margin``, or None if there are none."""
+    x_min = y_min = math.inf
+    x_max = y_max = -math.inf
+    for stitch_group in stitch_groups:
+        if isinstance(stitch_group, JumpStitch):
+            continue
+        for x, y, _ in stitch_group.stitch_commands:
+            x_min, x_max = min(x_min, x), max(x_max, x)
+            y_min, y_max = min(y_min, y), max(y_max, y)
+    if x_min > x_max:
+        return None
+    return x_min - margin, y_min - margin, x_max + margin, y_max + margin
+
+
+def _add_color_changes(
+    thread_changes: Iterable[tuple[StitchGroup, Optional[str]]]
+) -> Iterator[list[tuple[float, float, StitchCommand]]]:
+    """Streaming stage that generates the stitches of each group and adds colour change commands between threads.
+
+    The colour change is placed at (0, 0), like ``pyembroidery.EmbPattern.color_change`` does when stitches are added
+    directly to the stitch list, and it is only added if a stitch has been made before it.
+    """
+    has_stitches = False
+    for stitch_group, new_color in thread_changes:
+        if stitch_group._stitch_commands is not None:
+            # A list is yielded and the colour change may be inserted, so the cached commands must be copied
+            stitch_commands = list(stitch_group._stitch_commands)
+        else:
+            # Don't cache the commands in the stitch group, that would keep the whole pattern in memory
+            stitch_commands = stitch_group._get_stitch_commands()
+
+        if new_color is not None and has_stitches:
+            stitch_commands.insert(0, (0, 0, pyembroidery.COLOR_CHANGE))
+        has_stitches = has_stitches or any(command == pyembroidery.STITCH for _, _, command in stitch_commands)
+        yield stitch_commands
+
+
+def _scale_stitch_groups(
+    stitch_groups: Iterable[list[tuple[float, float, StitchCommand]]], scale: float
+) -> Iterator[list[tuple[float, float, StitchCommand]]]:
+    """Streaming stage that multiplies the coordinates of all stitches by ``scale``."""
+    for stitch_commands in stitch_groups:
+        if scale != 1:
+            stitch_commands = [(x * scale, y * scale, command) for x, y, command in stitch_commands]
+        yield stitch_commands
+
+
+def _normalise_stitch_groups(
+    stitch_groups: Iterable[list[tuple[float, float, StitchCommand]]],
+    normaliser: StitchNormaliser,
+    summary: NormalisationSummary,
+) -> Iterator[list[tuple[float, float, StitchCommand]]]:
+    """Streaming stage that splits long stitches and removes short stitches, and records the changes in ``summary``.
+
+    Whether the last stitch of a group ends a run of stitches depends on the first command of the next non-empty group,
+    so groups are held back until that group is generated.
+    """
+
+    def normalise_pending(next_command: Optional[StitchCommand]) -> Iterator[list[tuple[float, float, StitchCommand]]]:
+        for group_idx, stitch_commands in pending:
+            normalised, num_added, num_removed = normaliser.normalise(stitch_commands, next_command)
+            if num_added or num_removed:
+                summary[group_idx] = (num_added, num_removed)
+            yield normalised
+
+    pending = []
+    for group_idx, stitch_commands in enumerate(stitch_groups):
+        if stitch_commands:
+            yield from normalise_pending(stitch_commands[0][2])
+            pending = []
+        pending.append((group_idx, stitch_commands))
+    yield from normalise_pending(None)
 
 
 class StitchGroup(ABC):
@@ -97,25 +820,125 @@ class StitchGroup(ABC):
     def __init__(self, start_pos: Vec2D, color: Optional[str]) -> None:
         self._start_pos = start_pos
         self._positions = []
-        self._stitch_commands = None
+        self._stitch_commands = None  # Tuple of stitch commands, cached by the stitch_commands property
+        self._revision = 0  # Incremented every time the stitch group changes, used to invalidate compiled patterns
+        self._stitch_arrays = None  # Cached by the stitch_arrays property
         self._parent_stitch_group = self
         self.color = color 
 
     def add_location(self, location: Vec2D) -> None:
         """Add a new location to this stitch group."""
         self._stitch_commands = None
+        self._stitch_arrays = None
+        self._revision += 1
         self._positions.append(location)
 
+    def add_locations(self, locations: Iterable[Vec2D]) -> None:
+        """Add many locations to this stitch group, same as calling :py:meth:`add_location` for each location.
+
+        The cached stitch commands are only invalidated once, which makes this much faster for long lists.
+        """
+        num_positions = len(self._positions)
+        self._positions.extend(locations)
+        if len(self._positions) > num_positions:
+            self._stitch_commands = None
+            self._stitch_arrays = None
+            self._revision += len(self._positions) - num_positions
+
     @abstractmethod
     def _get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
         raise NotImplementedError
 
-    def get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
-        """Get the list of PyEmbroidery stitch commands for this stitch group"""
+    def _get_stitch_arrays(self) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Get the stitch commands as x, y and command arrays, or None if there is no vectorised implementation.
+
+        Used by :py:meth:`EmbroideryPattern.to_stitch_array` to skip creating one tuple per stitch.
+        """
+        return None
+
+    def _segment_parameters(self) -> Optional[tuple]:
+        """Get the parameters that, together with the class and the segment vector, determine the stitches of a segment.
+
+        Used as part of the key in :py:data:`segment_cache`. None if the stitches of a segment should not be cached.
+        """
+        return None
+
+    @property
+    def stitch_commands(self) -> tuple[tuple[float, float, StitchCommand], ...]:
+        """Read-only view of the PyEmbroidery stitch commands for this stitch group.
+
+        The commands are cached and shared between calls, so no copy is made. Use :py:meth:`get_stitch_commands` if
+        you need a list that you can modify.
+        """
         if self._stitch_commands is None:
-            self._stitch_commands = self._get_stitch_commands()
+            self._stitch_commands = tuple(self._get_stitch_commands())
+
+        return self._stitch_commands
 
-        return self._stitch_commands.copy()
+    @property
+    def stitch_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Read-only NumPy views of the x coordinates, y coordinates and commands of the stitches. Requires NumPy.
+
+        The arrays are cached, so many :py:class:`StitchGroupInstance` objects can share the stitches of one group.
+        """
+        if np is None:
+            raise ImportError("NumPy is required for StitchGroup.stitch_arrays, install it with `pip install numpy`")
+
+        if self._stitch_arrays is None:
+            stitch_arrays = self._get_stitch_arrays() if self._stitch_commands is None else None
+            if stitch_arrays is None:
+                stitch_commands = self.stitch_commands
+                stitch_arrays = (
+                    np.array([x for x, _, _ in stitch_commands], dtype=float),
+                    np.array([y for _, y, _ in stitch_commands], dtype=float),
+                    np.array([command for _, _, command in stitch_commands], dtype=np.uint8),
+                )
+            for array in stitch_arrays:
+                array.flags.writeable = False
+            self._stitch_arrays = stitch_arrays
+        return self._stitch_arrays
+
+    def get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
+        """Get a new list of the PyEmbroidery stitch commands for this stitch group.
+
+        The list is a copy, so it can be modified. Use :py:attr:`stitch_commands` to read the commands without copying.
+        """
+        return list(self.stitch_commands)
+
+    def _is_empty(self) -> bool:
+        """Check if the stitch group has no stitches."""
+        return not self._positions
+
+    def _can_merge(self, other: StitchGroup) -> bool:
+        """Check if ``other`` can be merged into this stitch group with :py:meth:`_merge`. Implemented by children.
+
+        Should only be True if the merged stitch group gives exactly the stitches of this stitch group followed by the
+        stitches of ``other``.
+        """
+        return False
+
+    def _merge(self, other: StitchGroup) -> Self:
+        """Create a new stitch group with the locations of this stitch group followed by those of ``other``.
+
+        The start position of ``other`` is added as a location, so the stitch that ``other`` places at its start
+        position is kept.
+        """
+        merged_group = self.empty_copy(self._start_pos)
+        merged_group._positions = [*self._positions, other._start_pos, *other._positions]
+        merged_group._revision = len(merged_group._positions)
+        return merged_group
+
+    def _can_reverse(self) -> bool:
+        """Check if the stitch group can be stitched backwards with :py:meth:`_reverse`. Implemented by children."""
+        return False
+
+    def _reverse(self) -> Self:
+        """Create a new stitch group that visits the locations of this stitch group in the opposite order."""
+        points = [self._start_pos, *self._positions]
+        reversed_group = self.empty_copy(points[-1])
+        reversed_group._positions = points[-2::-1]
+        reversed_group._revision = len(reversed_group._positions)
+        return reversed_group
 
     def empty_copy(self, start_pos) -> Self:
         """Create a copy of the stitch group but with no stored locations (i.e. no stitches)."""
@@ -123,6 +946,8 @@ class StitchGroup(ABC):
         copied_group._positions = []
         copied_group._start_pos = start_pos
         copied_group._stitch_commands = None
+        copied_group._stitch_arrays = None
+        copied_group._revision = 0
         copied_group._parent_stitch_group = self._parent_stitch_group
         copied_group.color = self.color
 
@@ -158,6 +983,9 @@ class UnitStitch(StitchGroup):
 
     Internal Attributes
     -------------------
+    tile_units : bool (class attribute, default=False)
+        If True, ``_stitch_unit`` only depends on the start position through a translation, so the unit can be
+        computed once per segment and tiled along it with NumPy instead of calling ``_stitch_unit`` for every unit.
     stitch_stop_multiplier : float (default=0)
         When stitching, the unit stitch will be repeated until there is stitch_stop_multiplier * stitch_length left to
         stitch. Useful when implementing an ending stitch pattern.
@@ -168,6 +996,8 @@ class UnitStitch(StitchGroup):
     distance_traveled : int | float
         The distance travelled by the turtle. Used for _start_stitch_unit and _end_stitch_unit.
     """
+    tile_units = False
+
     def __init__(
         self, 
         start_pos: Vec2D, 
@@ -187,6 +1017,22 @@ class UnitStitch(StitchGroup):
         self.x = start_pos[0]
         self.y = start_pos[1]
         self.distance_traveled = 0
+        self._unit_templates = {}
+
+    def _unit_stitch_parameters(self) -> tuple:
+        """Get the parameters of the built-in unit stitches, for :py:meth:`_segment_parameters`.
+
+        Caching is opt-in: children only use these parameters as the cache key if their stitches depend on nothing else.
+        """
+        return (
+            self.stitch_length,
+            self.stitch_width,
+            self.center,
+            self.auto_adjust,
+            self.enforce_end_stitch,
+            self.enforce_start_stitch,
+            self.stitch_stop_multiplier,
+        )
 
     @classmethod
     def round_stitch_length(cls, stitch_length : int | float, distance : int | float):
@@ -264,6 +1110,66 @@ class UnitStitch(StitchGroup):
         """
         return iter(()) # Return an empty iterator as a sane default
     
+    def _unit_template(self, angle: float, stitch_length: float) -> tuple[np.ndarray, np.ndarray, list[StitchCommand]]:
+        """Get the stitches of a single unit starting at (0, 0) as x offsets, y offsets and commands.
+
+        The templates are cached for each (stitch_length, stitch_width, angle), so segments with the same direction and
+        stitch length (e.g. the borders of letters) share the same template.
+        """
+        key = (stitch_length, getattr(self, "stitch_width", None), angle)
+        if key not in self._unit_templates:
+            unit = list(self._stitch_unit(Vec2D(0, 0), angle, stitch_length))
+            self._unit_templates[key] = (
+                np.array([stitch[0] for stitch in unit], dtype=float),
+                np.array([stitch[1] for stitch in unit], dtype=float),
+                [stitch[2] for stitch in unit],
+            )
+        return self._unit_templates[key]
+
+    def _tile_unit_stitches(
+        self, x: float, y: float, angle: float, stitch_length: float, distance_traveled: float, distance: float
+    ) -> Optional[tuple[list[tuple[float, float, StitchCommand]], float, float, float]]:
+        """Vectorised version of the loop that repeats the unit stitch along a segment.
+
+        The unit template is computed once and added to the start position of every unit with array broadcasting. The
+        start positions and the traveled distances are accumulated in the same order as in the loop, so the number of
+        units and the position after the last unit are the same as in the loop (the stitches inside the units can
+        differ by floating point rounding errors).
+
+        Returns
+        -------
+        tuple[list[tuple[float, float, StitchCommand]], float, float, float] or None
+            The unit stitches and the x, y and distance traveled after the last unit. None if there are too few units
+            for tiling to be worthwhile, in which case the units should be stitched one at a time.
+        """
+        # traveled[k] is the distance traveled after k units, accumulated one unit at a time like in the loop
+        max_units = int(max(distance - distance_traveled, 0) // stitch_length) + 2
+        steps = np.full(max_units + 1, stitch_length, dtype=float)
+        steps[0] = distance_traveled
+        traveled = np.cumsum(steps)
+        if self.stitch_stop_multiplier == 0:
+            continues = traveled + stitch_length * self.stitch_stop_multiplier < distance
+        elif self.stitch_stop_multiplier > 0:
+            continues = traveled + stitch_length * self.stitch_stop_multiplier <= distance
+        else:
+            return None
+        num_units = len(continues) if continues.all() else int(np.argmin(continues))
+        if num_units < NUMPY_MIN_UNITS or num_units > max_units:
+            return None
+
+        dx = math.cos(angle)
+        dy = math.sin(angle)
+        start_x = np.full(num_units + 1, stitch_length * dx)
+        start_y = np.full(num_units + 1, stitch_length * dy)
+        start_x[0], start_y[0] = x, y
+        start_x, start_y = np.cumsum(start_x), np.cumsum(start_y)
+
+        template_x, template_y, template_commands = self._unit_template(angle, stitch_length)
+        stitch_x = (start_x[:-1, np.newaxis] + template_x).ravel()
+        stitch_y = (start_y[:-1, np.newaxis] + template_y).ravel()
+        stitches = list(zip(stitch_x.tolist(), stitch_y.tolist(), template_commands * num_units))
+        return stitches, float(start_x[-1]), float(start_y[-1]), float(traveled[num_units])
+
     def _iter_stitches_between_positions(
         self, position_1: Vec2D, position_2: Vec2D
     ) -> Generator[tuple[StitchCommand, float, float], None, None]:
@@ -294,6 +1200,14 @@ class UnitStitch(StitchGroup):
         y = self.y
         distance_traveled = self.distance_traveled
 
+        # Tile the unit along the segment if possible, the loop below then has nothing left to do
+        tiled = None
+        if self.tile_units and USE_NUMPY and np is not None and stitch_length > 0:
+            tiled = self._tile_unit_stitches(x, y, angle, stitch_length, distance_traveled, distance)
+        if tiled is not None:
+            unit_stitches, x, y, distance_traveled = tiled
+            yield from unit_stitches
+
         # Repeat until stitch_stop_multiplier*stitch_length away
         # NOTE: If stitch_stop_multiplier is 0, the stitch length will be a multiple of the distance so we can stop on the end point itself
         while (self.stitch_stop_multiplier == 0 and distance_traveled + stitch_length*self.stitch_stop_multiplier < distance) or (self.stitch_stop_multiplier > 0 and distance_traveled + stitch_length*self.stitch_stop_multiplier <= distance):
@@ -324,9 +1238,9 @@ class UnitStitch(StitchGroup):
         if self.enforce_start_stitch:
             stitch_commands.append((self._start_pos[0], self._start_pos[1], pyembroidery.STITCH))
 
-        stitch_commands.extend(self._iter_stitches_between_positions(self._start_pos, self._positions[0]))
+        stitch_commands.extend(segment_cache.get_stitches(self, self._start_pos, self._positions[0]))
         for pos1, pos2 in itertools.pairwise(self._positions):
-            stitch_commands.extend(self._iter_stitches_between_positions(pos1, pos2))
+            stitch_commands.extend(segment_cache.get_stitches(self, pos1, pos2))
 
         return stitch_commands
 
@@ -351,6 +1265,24 @@ class RunningStitch(StitchGroup):
 
         self.stitch_length = stitch_length
 
+    def _segment_parameters(self) -> Optional[tuple]:
+        return (self.stitch_length,)
+
+    def _can_reverse(self) -> bool:
+        return True
+
+    def _can_merge(self, other: StitchGroup) -> bool:
+        # The segment from our end position to the start of other has length zero, so it only gives one stitch at the
+        # start position of other, which is the first stitch of other
+        return (
+            type(other) is type(self)
+            and other.stitch_length == self.stitch_length
+            and other.color == self.color
+            and bool(self._positions)
+            and bool(other._positions)
+            and tuple(other._start_pos) == tuple(self._positions[-1])
+        )
+
     def _iter_stitches_between_positions(
         self, position_1: Vec2D, position_2: Vec2D
     ) -> Generator[tuple[StitchCommand, float, float], None, None]:
@@ -386,14 +1318,26 @@ class RunningStitch(StitchGroup):
         # 1.5 and at least 0.5 stitch-lengths away from the second to last stitch.
         yield x_end, y_end, pyembroidery.STITCH
 
+    def _get_stitch_arrays(self) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        if not (self._positions and _use_numpy(self._positions) and self.stitch_length > 0):
+            return None
+
+        x, y = _running_stitch_arrays(self._start_pos, self._positions, self.stitch_length)
+        return x, y, np.full(len(x), pyembroidery.STITCH, dtype=np.uint8)
+
     def _get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
         if not self._positions:
             return []
 
+        stitch_arrays = self._get_stitch_arrays()
+        if stitch_arrays is not None:
+            x, y, _ = stitch_arrays
+            return _commands_from_arrays(x, y, pyembroidery.STITCH)
+
         stitch_commands = [(self._start_pos[0], self._start_pos[1], pyembroidery.STITCH)]
-        stitch_commands.extend(self._iter_stitches_between_positions(self._start_pos, self._positions[0]))
+        stitch_commands.extend(segment_cache.get_stitches(self, self._start_pos, self._positions[0]))
         for pos1, pos2 in itertools.pairwise(self._positions):
-            stitch_commands.extend(self._iter_stitches_between_positions(pos1, pos2))
+            stitch_commands.extend(segment_cache.get_stitches(self, pos1, pos2))
 
         return stitch_commands
 
@@ -445,6 +1389,8 @@ class TripleStitch(StitchGroup):
         self.running_stitch = RunningStitch(start_pos=start_pos, stitch_length=stitch_length, color=color)
 
     def _get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
+        # The start position may be changed after creation, e.g. when the turtle has an active transform
+        self.running_stitch._start_pos = self._start_pos
         self.running_stitch._positions = self._positions
         stitch_commands = self.running_stitch._get_stitch_commands()
 
@@ -454,7 +1400,8 @@ class TripleStitch(StitchGroup):
 class JumpStitch(StitchGroup):
     """Stitch group for jump stitches.
 
-    A jump stitch group always starts with a trim command followed by the needle moving without sewing any stitches.
+    A jump stitch group starts with a trim command (unless ``trim`` is False) followed by the needle moving without
+    sewing any stitches.
 
     See :py:class:`StitchGroup` for more information on stitch groups.
 
@@ -464,17 +1411,24 @@ class JumpStitch(StitchGroup):
         If True, then multiple jump commands will be collapsed into one jump command. This is useful in the cases
         where there may be multiple subsequent jumps with no stitches inbetween. Multiple subsequent jumps doesn't
         make sense but it can happen dependent on how you generate your patterns.
+    trim : bool (optional, default=True)
+        If True, the thread is trimmed before the jump. Short jumps can skip the trim, since trims are slow.
     """
 
-    def __init__(self, start_pos: Vec2D, color: Optional[str]=None, skip_intermediate_jumps: bool = True) -> None:
+    def __init__(
+        self, start_pos: Vec2D, color: Optional[str]=None, skip_intermediate_jumps: bool = True, trim: bool = True
+    ) -> None:
         super().__init__(start_pos=start_pos, color=color) 
         self.skip_intermediate_jumps = skip_intermediate_jumps
+        self.trim = trim
 
     def _get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
         if not self._positions:
             return []
 
-        stitch_commands = [(self._start_pos[0], self._start_pos[1], pyembroidery.TRIM)]
+        stitch_commands = []
+        if self.trim:
+            stitch_commands.append((self._start_pos[0], self._start_pos[1], pyembroidery.TRIM))
         if self.skip_intermediate_jumps:
             x, y = self._positions[-1]
             stitch_commands.append((x, y, pyembroidery.JUMP))
@@ -486,6 +1440,8 @@ class JumpStitch(StitchGroup):
 
 
 class ZigzagStitch(UnitStitch):
+    tile_units = True
+
     def __init__(
         self,
         start_pos: Vec2D,
@@ -514,6 +1470,9 @@ class ZigzagStitch(UnitStitch):
         # else:
         #     self.stitch_stop_multiplier = 1
 
+    def _segment_parameters(self) -> Optional[tuple]:
+        return self._unit_stitch_parameters()
+
     def _stitch_unit(self, start_pos: Vec2D, angle: float, stitch_length: float) -> list[tuple[float, float, StitchCommand]]:
         """Stitch a single zigzag. We stitch right, then left.
         The right stitch is one stitch_width to the right of the left stitch.
@@ -606,6 +1565,8 @@ class SatinStitch(ZigzagStitch):
     
 
 class CrossStitch(UnitStitch):
+    tile_units = True
+
     def __init__(
         self,
         start_pos: Vec2D,
@@ -633,6 +1594,10 @@ class CrossStitch(UnitStitch):
             self.stitch_stop_multiplier = 0
         else:
             self.stitch_stop_multiplier = 1
+
+    def _segment_parameters(self) -> Optional[tuple]:
+        return self._unit_stitch_parameters()
+
     def _stitch_unit(self, start_pos: Vec2D, angle: float, stitch_length: float) -> list[tuple[float, float, StitchCommand]]:
         """The cross stitch is implemented by going from the top left corner to the bottom right corner, then moving
         from the bottom right to the bottom left, before finally going to the top right corner. This corner will
@@ -688,6 +1653,8 @@ class CrossStitch(UnitStitch):
 
 
 class ZStitch(UnitStitch):
+    tile_units = True
+
     def __init__(
         self,
         start_pos: Vec2D,
@@ -713,6 +1680,9 @@ class ZStitch(UnitStitch):
 
         self.stitch_stop_multiplier = 1
 
+    def _segment_parameters(self) -> Optional[tuple]:
+        return self._unit_stitch_parameters()
+
     def _stitch_unit(self, start_pos: Vec2D, angle: float, stitch_length: float) -> list[tuple[float, float, StitchCommand]]:
         """In Z-stitch, we stitch forward by stitch_length and right by stitch_width, then back left by stitch_width."""
         x = start_pos[0]
@@ -758,6 +1728,15 @@ class ZStitch(UnitStitch):
 class DirectStitch(StitchGroup):
     """A minimal stitch just to run thread from one point to another."""
 
+    def _can_reverse(self) -> bool:
+        return True
+
+    def _can_merge(self, other: StitchGroup) -> bool:
+        # There is exactly one stitch per location, so the groups can always be concatenated
+        return (
+            type(other) is type(self) and other.color == self.color and bool(self._positions) and bool(other._positions)
+        )
+
     def _iter_stitches_between_positions(
         self, position_1: Vec2D, position_2: Vec2D
     ) -> Generator[tuple[StitchCommand, float, float], None, None]:
@@ -770,10 +1749,9 @@ class DirectStitch(StitchGroup):
         if not self._positions:
             return []
 
+        # A direct stitch has exactly one stitch per location, so we don't need to iterate over the segments
         stitch_commands = [(self._start_pos[0], self._start_pos[1], pyembroidery.STITCH)]
-        stitch_commands.extend(self._iter_stitches_between_positions(self._start_pos, self._positions[0]))
-        for pos1, pos2 in itertools.pairwise(self._positions):
-            stitch_commands.extend(self._iter_stitches_between_positions(pos1, pos2))
+        stitch_commands.extend((x, y, pyembroidery.STITCH) for x, y in self._positions)
 
         return stitch_commands
 
@@ -781,3 +1759,80 @@ class DirectStitch(StitchGroup):
 class FastDirectStitch(DirectStitch):
     """A variation of direct stitch that will be fast when using fast_visualise """
     speedup = 2 
+
+
+class StitchGroupInstance(StitchGroup):
+    """A transformed reference to a stitch group, used to place the same motif many times without copying it.
+
+    The instance has no locations of its own. Its stitches are the stitches of ``stitch_group`` with the affine
+    transform applied, computed lazily when the pattern is exported. The stitches of the referenced stitch group are
+    generated once and shared by all its instances. Usually, you don't create instances yourself, but use
+    :py:meth:`EmbroideryPattern.add_instance`.
+
+    Parameters
+    ----------
+    stitch_group : StitchGroup
+        The stitch group to reference. It can be an instance itself.
+    transform : tuple[tuple[float, float, float], tuple[float, float, float]]
+        2x3 affine transform ``((a, b, c), (d, e, f))`` that maps ``(x, y)`` to ``(a*x + b*y + c, d*x + e*y + f)``.
+    """
+
+    def __init__(self, stitch_group: StitchGroup, transform: AffineTransform) -> None:
+        (a, b, c), (d, e, f) = transform
+        self.stitch_group = stitch_group
+        self.transform = ((a, b, c), (d, e, f))
+        # Jump stitches never change the thread, so neither do their instances
+        color = None if isinstance(stitch_group, JumpStitch) else stitch_group.color
+        super().__init__(start_pos=self._transform_point(stitch_group._start_pos), color=color)
+        self._parent_stitch_group = stitch_group._parent_stitch_group
+
+    @property
+    def _revision(self) -> int:
+        # The instance changes when the referenced stitch group changes
+        return self.stitch_group._revision
+
+    @_revision.setter
+    def _revision(self, value: int) -> None:
+        pass
+
+    def _transform_point(self, point: Vec2D) -> Vec2D:
+        (a, b, c), (d, e, f) = self.transform
+        x, y = point
+        return Vec2D(a * x + b * y + c, d * x + e * y + f)
+
+    def _is_empty(self) -> bool:
+        # The referenced stitch group may get locations later
+        return False
+
+    def add_location(self, location: Vec2D) -> None:
+        raise TypeError("Cannot add locations to a stitch group instance, add them to the referenced stitch group")
+
+    def add_locations(self, locations: Iterable[Vec2D]) -> None:
+        raise TypeError("Cannot add locations to a stitch group instance, add them to the referenced stitch group")
+
+    @property
+    def stitch_commands(self) -> tuple[tuple[float, float, StitchCommand], ...]:
+        # Not cached, the stitches of the referenced stitch group are the cache
+        return tuple(self._get_stitch_commands())
+
+    def get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
+        return self._get_stitch_commands()
+
+    def _get_stitch_commands(self) -> list[tuple[float, float, StitchCommand]]:
+        stitch_arrays = self._get_stitch_arrays()
+        if stitch_arrays is not None:
+            x, y, commands = stitch_arrays
+            return list(zip(x.tolist(), y.tolist(), commands.tolist()))
+
+        (a, b, c), (d, e, f) = self.transform
+        return [
+            (a * x + b * y + c, d * x + e * y + f, command) for x, y, command in self.stitch_group.stitch_commands
+        ]
+
+    def _get_stitch_arrays(self) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        if not (USE_NUMPY and np is not None):
+            return None
+
+        (a, b, c), (d, e, f) = self.transform
+        x, y, commands = self.stitch_group.stitch_arrays
+        return a * x + b * y + c, d * x + e * y + f, commands
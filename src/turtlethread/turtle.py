@@ -6,13 +6,56 @@ from typing import Optional
 
 from pyembroidery import write, STITCH
 
-from . import stitches
-from . import fills
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
+from . import fills, stitches, writers
 from .base_turtle import TNavigator, Vec2D
+from .optimise import order_paths
 from .pattern_info import show_info
-from .visualise import visualise_pattern, fast_visualise
+from .recording import Recording
+from .visualise import fast_visualise, visualise_pattern
 
 USE_SPHINX_GALLERY = False
+# The vertices of circles and arcs with at least NUMPY_MIN_ARC_STEPS sides are computed with NumPy
+NUMPY_MIN_ARC_STEPS = 64
+IDENTITY_TRANSFORM = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+# Maximum number of seconds spent on ordering the copies of a symmetry block
+SYMMETRY_ORDER_TIME_BUDGET = 0.1
+
+
+def _compose_transforms(outer, inner):
+    """Get the affine transform that applies ``inner`` first and then ``outer``."""
+    (a1, b1, c1), (d1, e1, f1) = outer
+    (a2, b2, c2), (d2, e2, f2) = inner
+    return (
+        (a1 * a2 + b1 * d2, a1 * b2 + b1 * e2, a1 * c2 + b1 * f2 + c1),
+        (d1 * a2 + e1 * d2, d1 * b2 + e1 * e2, d1 * c2 + e1 * f2 + f1),
+    )
+
+
+def _invert_transform(transform):
+    (a, b, c), (d, e, f) = transform
+    det = a * e - b * d
+    return ((e / det, -b / det, (b * f - c * e) / det), (-d / det, a / det, (c * d - a * f) / det))
+
+
+def _apply_transform(transform, positions):
+    """Apply an affine transform to a list of positions, returns a list of ``(x, y)`` tuples."""
+    (a, b, c), (d, e, f) = transform
+    if stitches.USE_NUMPY and np is not None and len(positions) >= stitches.NUMPY_MIN_POSITIONS:
+        x, y = np.array(positions, dtype=float).T
+        return list(zip((a * x + b * y + c).tolist(), (d * x + e * y + f).tolist()))
+    return [(a * x + b * y + c, d * x + e * y + f) for x, y in positions]
+
+
+def _about_center(linear_transform, center):
+    """Get the affine transform that applies a linear transform (with zero offset) around ``center``."""
+    (a, b, _), (d, e, _) = linear_transform
+    cx, cy = center
+    return ((a, b, cx - a * cx - b * cy), (d, e, cy - d * cx - e * cy))
 
 
 class ConfigValueMixin:
@@ -57,6 +100,11 @@ class Turtle(TNavigator):
          * `scale=2`  - The scaling TurtleStitch uses
     angle_mode : "degrees" or "radians" (optional, default="degrees")
         How angles are computed.
+    record : bool (optional, default=False)
+        If True, moves, stitch group changes and colour changes are recorded in a compact
+        :py:class:`turtlethread.recording.Recording` instead of being added to the pattern right away. The stitch
+        groups are created when the pattern is saved, visualised or :py:meth:`compile` is called. Fills are created
+        immediately, since they need the stitches of their outline.
     mode : "standard", "world" or "logo" (optional, default="standard")
         Mode "standard" is compatible with turtle.py.
         Mode "logo" is compatible with most Logo-Turtle-Graphics.
@@ -77,7 +125,7 @@ class Turtle(TNavigator):
 
     """
 
-    def __init__(self, pattern=None, scale=1, angle_mode="degrees", mode=TNavigator.DEFAULT_MODE, color:Optional[str]=None):
+    def __init__(self, pattern=None, scale=1, angle_mode="degrees", mode=TNavigator.DEFAULT_MODE, color:Optional[str]=None, record=False):
         # TODO: Flag that can enable/disable changing angle when angle mode is changed
         if pattern is None:
             self.pattern = stitches.EmbroideryPattern(scale=scale)
@@ -89,6 +137,19 @@ class Turtle(TNavigator):
         # Set up stitch parameters prior to super.__init__ since self.reset() depends on stitch type
         self._stitch_group_stack = []
 
+        # In recording mode, the stitch group stack only contains empty stitch groups that describe the stitch types in
+        # use. The stitch groups that are added to the pattern are created by replaying the recording onto the replay
+        # stack, starting at the replay position.
+        self._recording = Recording() if record else None
+        self._replay_stack = []
+        self._replay_position = Vec2D(0, 0)
+        self._paused_recording = None
+
+        # Inside transform blocks, the turtle moves in local coordinates. The moves are collected in local coordinates
+        # and transformed to pattern coordinates with one call once the block or the stitch group ends.
+        self._transform_stack = []
+        self._local_positions = []
+
         super().__init__(mode=mode)
         self.angle_mode = angle_mode
 
@@ -181,7 +242,43 @@ class Turtle(TNavigator):
         elif steps is None:
             steps = 20
 
-        super().circle(radius=radius, extent=extent, steps=steps)
+        self._arc(radius, extent, steps)
+
+    def _arc(self, radius, extent, steps):
+        """Move along the polygon that approximates a circle or arc, with all vertices computed at once.
+
+        Gives the same position and heading as ``TNavigator.circle``, which turns and moves the turtle once per side.
+        Here, the direction of each side is computed in closed form and all vertices are added with one call.
+        """
+        if steps <= 0:
+            # Like TNavigator.circle, which neither moves nor turns (e.g. negative extent with automatic steps)
+            return
+
+        w = 1.0 * extent / steps
+        w2 = 0.5 * w
+        l = 2.0 * radius * math.sin(math.radians(w2) * self._degreesPerAU)
+        if radius < 0:
+            l, w, w2 = -l, -w, -w2
+
+        # The first side is turned half a step from the current heading and each following side one step more
+        first_angle = math.atan2(self._orient[1], self._orient[0]) + math.radians(w2 * self._degreesPerAU)
+        step_angle = math.radians(w * self._degreesPerAU)
+        if np is not None and steps >= NUMPY_MIN_ARC_STEPS:
+            angles = first_angle + step_angle * np.arange(steps)
+            xs = self.x + np.cumsum(l * np.cos(angles))
+            ys = self.y + np.cumsum(l * np.sin(angles))
+            positions = list(zip(xs.tolist(), ys.tolist()))
+        else:
+            x, y = self.x, self.y
+            positions = []
+            for i in range(steps):
+                angle = first_angle + step_angle * i
+                x += l * math.cos(angle)
+                y += l * math.sin(angle)
+                positions.append((x, y))
+
+        self._goto_positions(positions)
+        self._rotate(steps * w)
 
     def start_running_stitch(self, stitch_length=30):
         """Set the stitch mode to running stitch (not recommended, use ``running_stitch``-context instead).
@@ -306,8 +403,16 @@ class Turtle(TNavigator):
                 )
 
         """Cleanup after switching stitch type."""
+        self._flush_local_positions()
+        if self._recording is not None:
+            self._recording.pop()
+            self._stitch_group_stack.pop()
+            if self._stitch_group_stack:
+                self._stitch_group_stack.append(self._stitch_group_stack.pop().empty_copy(self._needle_position()))
+            return
+
         if self.filling: 
-            for command in self._stitch_group_stack[-1].get_stitch_commands():
+            for command in self._stitch_group_stack[-1].stitch_commands:
                 if command[2] == 0: # pyembroidery.STITCH
                     self._fill_stitch_position_stack.append((command[0], command[1]))
                 elif command[2] == 1: # after the jump
@@ -320,15 +425,22 @@ class Turtle(TNavigator):
             # way so the starting position of the copy is where the the turtle is right
             # now.
             previous_stitch_group = self._stitch_group_stack.pop()
-            stitch_group = previous_stitch_group.empty_copy(self.position())
+            stitch_group = previous_stitch_group.empty_copy(self._needle_position())
 
             self._stitch_group_stack.append(stitch_group)
             self.pattern.stitch_groups.append(stitch_group)
             
 
     def set_stitch_type(self, stitch_group):
+        self._flush_local_positions()
+        if self._transform_stack:
+            # The stitch group was created at the position of the turtle in local coordinates
+            stitch_group._start_pos = self._needle_position()
         self._stitch_group_stack.append(stitch_group)
-        self.pattern.stitch_groups.append(stitch_group)
+        if self._recording is not None:
+            self._recording.push(stitch_group)
+        else:
+            self.pattern.stitch_groups.append(stitch_group)
 
     @contextmanager
     def use_stitch_group(self, stitch_group):
@@ -366,7 +478,7 @@ class Turtle(TNavigator):
         """
         return self.use_stitch_group(stitches.TripleStitch(self.pos(), self.curr_color, stitch_length))
 
-    def jump_stitch(self, skip_intermediate_jumps=True):
+    def jump_stitch(self, skip_intermediate_jumps=True, trim=True):
         """Set the stitch mode to jump-stitch and cleanup afterwards.
 
         With a jump-stitch, trim the thread and move the needle without sewing more stitches.
@@ -377,8 +489,12 @@ class Turtle(TNavigator):
             If True, then multiple jump commands will be collapsed into one jump command. This is useful in the cases
             where there may be multiple subsequent jumps with no stitches inbetween. Multiple subsequent jumps doesn't
             make sense but it can happen dependent on how you generate your patterns.
+        trim : bool (optional, default=True)
+            If True, the thread is trimmed before the jump. Trims are slow, so they can be skipped for short jumps.
         """
-        return self.use_stitch_group(stitches.JumpStitch(self.pos(), skip_intermediate_jumps=skip_intermediate_jumps))
+        return self.use_stitch_group(
+            stitches.JumpStitch(self.pos(), skip_intermediate_jumps=skip_intermediate_jumps, trim=trim)
+        )
 
     def zigzag_stitch(
         self,
@@ -461,10 +577,300 @@ class Turtle(TNavigator):
     @_position.setter
     def _position(self, other):
         """Goto a given position, see the :py:meth:`goto` documentation for more info."""
-        if self._stitch_group_stack:
+        if self._transform_stack:
+            self._local_positions.append(other)
+        elif self._recording is not None:
+            self._recording.goto(*other)
+        elif self._stitch_group_stack:
             self._stitch_group_stack[-1].add_location(other)
         self.x, self.y = other
 
+    def _goto_positions(self, positions):
+        """Move through all positions, same as setting ``_position`` for each position, but with one update."""
+        if not positions:
+            return
+        if self._transform_stack:
+            self._local_positions.extend(positions)
+        elif self._recording is not None:
+            self._recording.goto_many(positions)
+        elif self._stitch_group_stack:
+            self._stitch_group_stack[-1].add_locations(positions)
+        self.x, self.y = positions[-1]
+
+    def goto_many(self, xs, ys):
+        """Move the turtle through many positions at once, same as calling ``goto(x, y)`` for each pair of coordinates.
+
+        All positions are added to the current stitch group in one call, and the turtle position is only updated once,
+        which is much faster than calling :py:meth:`goto` in a loop for computed geometry with many points. Like
+        :py:meth:`goto`, the heading of the turtle does not change.
+
+        Parameters
+        ----------
+        xs : Sequence[float] or numpy.ndarray
+            The x coordinates of the positions.
+        ys : Sequence[float] or numpy.ndarray
+            The y coordinates of the positions, must have the same length as ``xs``.
+        """
+        # Convert NumPy arrays to lists so the positions contain Python floats
+        xs = xs.tolist() if hasattr(xs, "tolist") else list(xs)
+        ys = ys.tolist() if hasattr(ys, "tolist") else list(ys)
+        if len(xs) != len(ys):
+            raise ValueError(f"``xs`` and ``ys`` must have the same length, not {len(xs)} and {len(ys)}")
+        # Plain tuples are much faster to create than Vec2D objects, and the stitch groups only unpack the positions
+        self._goto_positions(list(zip(xs, ys)))
+
+    def polyline(self, points):
+        """Move the turtle along a polyline, same as calling ``goto(x, y)`` for each point.
+
+        See :py:meth:`goto_many` for more information.
+
+        Parameters
+        ----------
+        points : Sequence[tuple[float, float]] or numpy.ndarray
+            The points of the polyline, e.g. a list of ``(x, y)`` tuples or an ``N x 2`` NumPy array.
+        """
+        if hasattr(points, "shape"):
+            self.goto_many(points[:, 0], points[:, 1])
+        elif points:
+            xs, ys = zip(*points)
+            self.goto_many(xs, ys)
+
+    def _needle_position(self):
+        """The position of the turtle in pattern coordinates, i.e. with the transforms of the transform blocks."""
+        if not self._transform_stack:
+            return self.position()
+        return Vec2D(*_apply_transform(self._transform_stack[-1], [self.position()])[0])
+
+    def _flush_local_positions(self):
+        """Transform the moves made in the current transform block to pattern coordinates and add them."""
+        if not self._local_positions:
+            return
+        positions = _apply_transform(self._transform_stack[-1], self._local_positions)
+        self._local_positions = []
+        if self._recording is not None:
+            self._recording.goto_many(positions)
+        elif self._stitch_group_stack:
+            self._stitch_group_stack[-1].add_locations(positions)
+
+    @contextmanager
+    def transform(self, matrix):
+        """Draw in local coordinates that are mapped to pattern coordinates by an affine transform.
+
+        Inside the block, the turtle moves as usual, but its position and heading are in local coordinates. The
+        positions are collected and mapped to pattern coordinates with one (vectorised) call when the block or the
+        current stitch group ends, so drawing a motif many times with different transforms is cheap. Transform blocks
+        can be nested, in which case the transforms are combined, and stitch group blocks can be used inside them.
+
+        Only the positions of the turtle are transformed. The stitches are computed in pattern coordinates, so stitch
+        parameters like the stitch length and the zigzag width are not scaled.
+
+        Parameters
+        ----------
+        matrix : tuple[tuple[float, float, float], tuple[float, float, float]]
+            Invertible 2x3 affine transform ``((a, b, c), (d, e, f))`` that maps the local coordinates ``(x, y)`` to
+            ``(a*x + b*y + c, d*x + e*y + f)``.
+
+        Examples
+        --------
+        Draw a square and a copy of it that is moved 200 steps to the right
+
+        >>> turtle = Turtle()
+        >>> def square():
+        ...     with turtle.running_stitch(20):
+        ...         for _ in range(4):
+        ...             turtle.forward(100)
+        ...             turtle.left(90)
+        >>> square()
+        >>> with turtle.transform(((1, 0, 200), (0, 1, 0))):
+        ...     square()
+        """
+        (a, b, c), (d, e, f) = matrix
+        matrix = ((float(a), float(b), float(c)), (float(d), float(e), float(f)))
+        if a * e - b * d == 0:
+            raise ValueError(f"The transform must be invertible, not {matrix}")
+
+        self._flush_local_positions()
+        outer = self._transform_stack[-1] if self._transform_stack else IDENTITY_TRANSFORM
+        self._transform_stack.append(_compose_transforms(outer, matrix))
+        yield
+        self._flush_local_positions()
+        self._transform_stack.pop()
+
+    def translate(self, dx, dy):
+        """Draw with a translation, shorthand for :py:meth:`transform` with the matrix ``((1, 0, dx), (0, 1, dy))``.
+
+        Parameters
+        ----------
+        dx : float
+            Translation in the x direction.
+        dy : float
+            Translation in the y direction.
+        """
+        return self.transform(((1, 0, dx), (0, 1, dy)))
+
+    def rotate(self, angle, center=(0, 0)):
+        """Draw with a rotation, see :py:meth:`transform`.
+
+        Parameters
+        ----------
+        angle : float
+            Rotation angle in the current angle mode. Positive angles rotate in the same direction as :py:meth:`left`.
+        center : tuple[float, float] (optional, default=(0, 0))
+            The point to rotate around.
+        """
+        c, s = Vec2D(1, 0).rotate(-angle * self._degreesPerAU)
+        return self.transform(_about_center(((c, -s, 0), (s, c, 0)), center))
+
+    def scale(self, sx, sy=None, center=(0, 0)):
+        """Draw with scaling, see :py:meth:`transform`.
+
+        Parameters
+        ----------
+        sx : float
+            Scale factor in the x direction.
+        sy : float (optional)
+            Scale factor in the y direction. If not given, ``sx`` is used for both directions.
+        center : tuple[float, float] (optional, default=(0, 0))
+            The point to scale around.
+        """
+        if sy is None:
+            sy = sx
+        return self.transform(_about_center(((sx, 0, 0), (0, sy, 0)), center))
+
+    def mirror(self, angle=0, center=(0, 0)):
+        """Draw mirrored about a line, see :py:meth:`transform`.
+
+        Parameters
+        ----------
+        angle : float (optional, default=0)
+            The heading of the mirror line in the current angle mode. With the default, the drawing is mirrored about
+            the horizontal line through ``center``.
+        center : tuple[float, float] (optional, default=(0, 0))
+            A point on the mirror line.
+        """
+        c, s = Vec2D(1, 0).rotate(-2 * angle * self._degreesPerAU)
+        return self.transform(_about_center(((c, s, 0), (s, -c, 0)), center))
+
+    @contextmanager
+    def symmetry(self, n=6, mirror=False, center=(0, 0)):
+        """Draw once and repeat the drawing with rotational (and mirror) symmetry.
+
+        The stitch groups created inside the block form one sector of the design. When the block ends, the sector is
+        rotated ``n - 1`` times by multiples of ``360 / n`` degrees around ``center`` and, if ``mirror`` is True,
+        also mirrored about the ``n`` lines through ``center`` with headings that are multiples of ``180 / n`` degrees.
+        The copies are :py:class:`turtlethread.stitches.StitchGroupInstance` objects that reference the stitch groups
+        of the sector, so the stitches are only generated once and the time and memory needed grow with the size of
+        one sector, not the whole design.
+
+        The copies are ordered to keep the jumps between them short, and a jump stitch is added before each copy that
+        doesn't start where the previous copy ended. After the block, the turtle is at the end of the last copy, with its
+        heading transformed like the last copy.
+
+        Parameters
+        ----------
+        n : int (optional, default=6)
+            The number of rotated copies, including the drawing itself.
+        mirror : bool (optional, default=False)
+            If True, mirrored copies are added as well, giving ``2 * n`` copies in total.
+        center : tuple[float, float] (optional, default=(0, 0))
+            The centre of the symmetry.
+
+        Examples
+        --------
+        Draw a flower with eight petals
+
+        >>> turtle = Turtle()
+        >>> with turtle.running_stitch(20):
+        ...     with turtle.symmetry(n=8):
+        ...         turtle.circle(50, 180)
+        """
+        if n < 1:
+            raise ValueError(f"The number of copies must be at least 1, not {n}")
+
+        self.compile()
+        first_idx = len(self.pattern.stitch_groups)
+        self._split_stitch_group()
+        yield
+        self.compile()
+        sector = range(first_idx, len(self.pattern.stitch_groups))
+
+        symmetries = []
+        for i in range(n):
+            c, s = Vec2D(1, 0).rotate(360 * i / n)
+            if i > 0:
+                symmetries.append(_about_center(((c, -s, 0), (s, c, 0)), center))
+            if mirror:
+                symmetries.append(_about_center(((c, s, 0), (s, -c, 0)), center))
+        # The symmetries are given in local coordinates, so they are conjugated with the transforms of the turtle
+        if self._transform_stack:
+            outer = self._transform_stack[-1]
+            symmetries = [
+                _compose_transforms(_compose_transforms(outer, symmetry), _invert_transform(outer))
+                for symmetry in symmetries
+            ]
+        if not symmetries or not sector:
+            return
+
+        sector_start = tuple(self.pattern.stitch_groups[first_idx]._start_pos)
+        sector_end = tuple(self._needle_position())
+        starts = [_apply_transform(symmetry, [sector_start])[0] for symmetry in symmetries]
+        ends = [_apply_transform(symmetry, [sector_end])[0] for symmetry in symmetries]
+        order = order_paths(sector_end, starts, ends, time_budget=SYMMETRY_ORDER_TIME_BUDGET)
+
+        position = sector_end
+        for copy_idx, _ in order:
+            if not math.isclose(math.dist(position, starts[copy_idx]), 0, abs_tol=1e-9):
+                jump_stitch = stitches.JumpStitch(Vec2D(*position))
+                jump_stitch.add_location(Vec2D(*starts[copy_idx]))
+                self.pattern.stitch_groups.append(jump_stitch)
+            self.pattern.add_instance(self.pattern, symmetries[copy_idx], stitch_groups=sector)
+            position = ends[copy_idx]
+
+        # Continue from the end of the last copy, with the heading transformed like the last copy
+        (a, b, _), (d, e, _) = symmetries[order[-1][0]]
+        x, y = self._orient
+        x, y = a * x + b * y, d * x + e * y
+        self._orient = Vec2D(x / math.hypot(x, y), y / math.hypot(x, y))
+        outer = self._transform_stack[-1] if self._transform_stack else IDENTITY_TRANSFORM
+        self.x, self.y = _apply_transform(_invert_transform(outer), [position])[0]
+        if self._recording is not None:
+            self._replay_position = Vec2D(*position)
+        self._split_stitch_group()
+
+    def _split_stitch_group(self):
+        """Continue the current stitch group in a new, empty copy that starts at the current position."""
+        stack = self._stitch_group_stack if self._recording is None else self._replay_stack
+        if stack:
+            stitch_group = stack.pop().empty_copy(self._needle_position())
+            stack.append(stitch_group)
+            self.pattern.stitch_groups.append(stitch_group)
+
+    @property
+    def recording(self):
+        """The operations recorded since the last :py:meth:`compile`, or None if the turtle is not recording.
+
+        The recording can be pickled and replayed in another process with
+        :py:meth:`turtlethread.recording.Recording.replay`.
+        """
+        return self._recording
+
+    def compile(self):
+        """Create the stitch groups of all recorded operations and add them to the pattern.
+
+        Only needed for turtles that record (``Turtle(record=True)``), the pattern of other turtles is always up to
+        date. The recording is cleared afterwards, so it is safe to call this method many times.
+
+        Returns
+        -------
+        turtlethread.stitches.EmbroideryPattern
+            The pattern of the turtle.
+        """
+        self._flush_local_positions()
+        if self._recording is not None and len(self._recording):
+            self._replay_position = self._recording.replay(self.pattern, self._replay_stack, self._replay_position)
+            self._recording.clear()
+        return self.pattern
+
     def save(self, filename, color_inf_filename=None):
         """Save the embroidery pattern as an embroidery or image file.
 
@@ -472,15 +878,22 @@ class Turtle(TNavigator):
         such as ``.dst``, ``.jef`` and ``.pes``, and utility formats such as ``.png``,
         ``.svg`` and ``.txt``. For a full list of supported file formats, see the `pyembroidery documentation <https://github.com/EmbroidePy/pyembroidery#file-io>`_.
 
+        ``.dst`` and ``.exp`` files are written with the native writers in :py:mod:`turtlethread.writers`, which skip
+        creating a PyEmbroidery pattern. All other formats are written with PyEmbroidery.
+
         Parameters
         ----------
         filename : str
         """
+        self.compile()
         if not USE_SPHINX_GALLERY:
-            pyemb = self.pattern.to_pyembroidery() 
-            write(pyemb, filename)
+            native_writer = writers.get_writer(filename)
+            if native_writer is not None:
+                native_writer(self.pattern.to_stitch_array(), filename)
+            else:
+                write(self.pattern.to_pyembroidery(), filename)
             if color_inf_filename: 
-                write(pyemb, color_inf_filename)
+                write(self.pattern.to_pyembroidery(), color_inf_filename)
         else:
             self._gallery_patterns.append((filename, self.pattern.to_pyembroidery()))
             if color_inf_filename: 
@@ -522,8 +935,9 @@ class Turtle(TNavigator):
         bye : bool
             If True, then ``turtle.bye()`` will be called after drawing.
         """
+        self.compile()
         visualise_pattern(
-            self.pattern.to_pyembroidery(),
+            self.pattern.to_stitch_array(),
             turtle=turtle, width=width, height=height, scale=scale, speed=speed, trace_jump=trace_jump, skip=skip, 
             check_density=check_density, done=done, bye=bye
         )
@@ -564,6 +978,7 @@ class Turtle(TNavigator):
             If True, will set up the turtle display screen 
         """
         
+        self.compile()
         fast_visualise(
             self,
             turtle=turtle, width=width, height=height, scale=scale, speed=speed, extra_speed=extra_speed, trace_jump=trace_jump, skip=skip, 
@@ -572,7 +987,8 @@ class Turtle(TNavigator):
 
     def show_info(self):
         """Display information about this turtle's embroidery pattern."""
-        show_info(self.pattern.to_pyembroidery(), scale=self.pattern.scale)
+        self.compile()
+        show_info(self.pattern.to_stitch_array(), scale=self.pattern.scale)
 
     def begin_fill(self, mode = fills.ScanlineFill(), closed=True):
         """After begin_fill is called, the turtle will track the stitches made until end_fill is called, afterwhich the polygon formed by the stitches will be filled.
@@ -587,21 +1003,29 @@ class Turtle(TNavigator):
             Whether or not to automatically close the shape in the event it is not closed.
             This must be set to False if jump stitches are used to create a fill with a hollowed part.
         """
+        if self._recording is not None:
+            # The fill needs the stitches of its outline, so recording is paused until the fill is done
+            self.compile()
+            self._paused_recording, self._recording = self._recording, None
+            self._stitch_group_stack = self._replay_stack
+
+        self._flush_local_positions()
         self.filling = True
         self.fill_mode = mode
         self.fill_closed = closed
-        fill_start_pos = self.pos()
+        fill_start_pos = self._needle_position()
         self._fill_stitch_position_stack = [fill_start_pos]
 
     def end_fill(self):
         """End the current fill, and draw the filled polygon."""
+        self._flush_local_positions()
         if self.filling:
             self.filling = False
             temp_fill_stack = self._fill_stitch_position_stack.copy()
 
             if len(self._stitch_group_stack) > 0:
                 # Add everything from current stack
-                for command in self._stitch_group_stack[-1].get_stitch_commands():
+                for command in self._stitch_group_stack[-1].stitch_commands:
                     if command[2] == 0: # pyembroidery.STITCH
                         temp_fill_stack.append((command[0], command[1]))
                     elif command[2] == 1: # after the jump
@@ -611,19 +1035,35 @@ class Turtle(TNavigator):
             if self.fill_closed and abs(temp_fill_stack[0] - temp_fill_stack[-1]) > 1:
                 temp_fill_stack.append(temp_fill_stack[0])
             
+            # The outline is in pattern coordinates, so the fill is drawn without the transforms
+            transform_stack, self._transform_stack = self._transform_stack, []
+            if transform_stack:
+                self.x, self.y = _apply_transform(transform_stack[-1], [self.position()])[0]
             self.fill_mode.fill(self, temp_fill_stack)
+            if transform_stack:
+                self.x, self.y = _apply_transform(_invert_transform(transform_stack[-1]), [self.position()])[0]
+            self._transform_stack = transform_stack
+
+        if self._paused_recording is not None:
+            self._recording, self._paused_recording = self._paused_recording, None
+            self._stitch_group_stack = list(self._replay_stack)
+            self._replay_position = self._needle_position()
 
 
     def color(self, newcol: str): 
         if newcol == self.curr_color: 
             return  # make no change, to avoid asking the user to repeatedly change thread 
         # We need to change the stitch group so that the color change is reflected!
+        self._flush_local_positions()
+        if self._recording is not None:
+            self._recording.color(newcol)
         if self._stitch_group_stack:
             previous_stitch_group = self._stitch_group_stack.pop()
-            stitch_group = previous_stitch_group.empty_copy(self.position())
+            stitch_group = previous_stitch_group.empty_copy(self._needle_position())
             stitch_group.color = newcol
             self._stitch_group_stack.append(stitch_group)
-            self.pattern.stitch_groups.append(stitch_group)
+            if self._recording is None:
+                self.pattern.stitch_groups.append(stitch_group)
         self.curr_color = newcol 
 
 
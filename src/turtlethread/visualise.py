@@ -131,7 +131,7 @@ def visualise_pattern(pattern, turtle=None, width=800, height=800, scale=1, spee
 
     Parameters
     ----------
-    pattern : pyembroidery.EmbPattern
+    pattern : pyembroidery.EmbPattern or turtlethread.stitch_array.StitchArray
         Embroidery pattern to visualise
     turtle : turtle.Turtle (optional)
         Python turtle object to use for drawing. If not specified, then the default turtle
@@ -419,7 +419,7 @@ def fast_visualise(te, turtle=None, width=800, height=800, scale=1, speed=0, ext
     setup_screen: bool (default True) 
         If True, will set up the turtle display screen 
     """
-    pattern = te.pattern.to_pyembroidery() 
+    pattern = te.pattern.to_stitch_array() 
     if USE_SPHINX_GALLERY:
         return
 
@@ -543,7 +543,7 @@ def fast_visualise(te, turtle=None, width=800, height=800, scale=1, speed=0, ext
     thread_idx = 0
     
 
-    if not skip: # look at speedup counts (but loses colour info )
+    if not skip: # look at speedup counts 
 
         for i in range(len(te.pattern.stitch_groups)): 
             #print(te.pattern.stitch_groups[i]._parent_stitch_group)
@@ -556,7 +556,7 @@ def fast_visualise(te, turtle=None, width=800, height=800, scale=1, speed=0, ext
                 turtle._tracer(extra_speed)
             
             #for x, y, command in progressbar(pattern.stitches):
-            for x, y, command in te.pattern.get_pyembroidery_of(i).stitches: 
+            for x, y, command in pattern.group(i): 
                 x = scale * x
                 y = scale * y
                 if command == JUMP:
@@ -619,7 +619,7 @@ def fast_visualise(te, turtle=None, width=800, height=800, scale=1, speed=0, ext
                     break
                 
     else: # can ignore speedup count and consider all (have colour)
-        for x, y, command in te.pattern.to_pyembroidery().stitches: 
+        for x, y, command in pattern.stitches: 
             x = scale * x
             y = scale * y
             if command == JUMP:
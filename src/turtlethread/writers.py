@@ -0,0 +1,415 @@
+"""Native writers for the ``.dst`` (Tajima) and ``.exp`` (Melco) embroidery formats.
+
+The writers encode the stitches directly to bytes, one stitch group at a time, without building an intermediate
+``pyembroidery.EmbPattern`` and without running the generic PyEmbroidery normaliser. They follow the same rules as the
+PyEmbroidery encoder and writers (rounding to whole steps, splitting long stitches and jumps into jumps, removing
+redundant trims and encoding trims in DST files as three small jumps), so the files are byte-for-byte identical to
+the files written by ``pyembroidery.write``.
+
+If NumPy is installed, the delta encoding is vectorised. Only stitches that must be split into several jumps are
+handled one at a time.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import BinaryIO, Iterable, Iterator, Union
+
+from pyembroidery import COLOR_CHANGE, END, JUMP, STITCH, TRIM
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python code paths are used without it
+    np = None
+
+from .stitch_array import StitchArray
+from .stitches import EmbroideryPattern
+
+# Use the vectorised NumPy code path for stitch groups with at least NUMPY_MIN_STITCHES stitches
+USE_NUMPY = np is not None
+NUMPY_MIN_STITCHES = 16
+
+DST_HEADER_SIZE = 512
+DST_MAX_DISTANCE = 121
+EXP_MAX_DISTANCE = 127
+
+_SUPPORTED_COMMANDS = (STITCH, JUMP, TRIM, COLOR_CHANGE)
+_SUPPORTED_COMMANDS_MESSAGE = "only stitches, jumps, trims and colour changes can be written"
+
+# Balanced ternary digits of DST records: (weight, byte, bit for +x, bit for -x, bit for +y, bit for -y)
+_DST_DIGITS = (
+    (81, 2, 2, 3, 5, 4),
+    (27, 1, 2, 3, 5, 4),
+    (9, 0, 2, 3, 5, 4),
+    (3, 1, 0, 1, 7, 6),
+    (1, 0, 0, 1, 7, 6),
+)
+_DST_FLAGS = {STITCH: 0b00000011, JUMP: 0b10000011, COLOR_CHANGE: 0b11000011, END: 0b11110011}
+# Trims are encoded as three small jumps that end where they started, like PyEmbroidery does with trim_at=3
+_DST_TRIM_JUMPS = ((2, 2), (-4, -4), (2, 2))
+
+_EXP_RECORDS = {TRIM: b"\x80\x80\x07\x00", COLOR_CHANGE: b"\x80\x01\x00\x00", END: b""}
+
+
+class _Normaliser:
+    """Convert stitch commands into the low-level records that can be written to a DST or EXP file.
+
+    The normaliser keeps track of the needle position between calls, so the stitches can be normalised one stitch
+    group at a time. The returned records have integer coordinates, and all moves are at most ``max_distance`` steps
+    long along each axis.
+
+    Parameters
+    ----------
+    max_distance : int
+        The longest move (along each axis) that can be stored in a single record.
+    full_jump : bool
+        If True, the needle always jumps all the way to the first stitch after a trim or colour change.
+    """
+
+    def __init__(self, max_distance: int, full_jump: bool) -> None:
+        self.max_distance = max_distance
+        self.full_jump = full_jump
+        self.x = 0
+        self.y = 0
+        self.trimmed = True
+        self.started = False
+        self.bounds = [float("inf"), float("inf"), -float("inf"), -float("inf")]  # x_min, y_min, x_max, y_max
+        self.num_records = 0
+        self.num_color_changes = 0
+
+    def _update_bounds(self, x_min: float, y_min: float, x_max: float, y_max: float) -> None:
+        self.bounds = [
+            min(self.bounds[0], x_min),
+            min(self.bounds[1], y_min),
+            max(self.bounds[2], x_max),
+            max(self.bounds[3], y_max),
+        ]
+
+    def _interpolate(self, x0: int, y0: int, dx: int, dy: int) -> list[tuple[int, int]]:
+        """Get the intermediate needle positions used to split a move that is longer than ``max_distance``.
+
+        The intermediate positions are computed and rounded in the same way as in the PyEmbroidery encoder and writer.
+        Like in PyEmbroidery, the bounds of the pattern are computed from the unrounded positions.
+        """
+        steps = max(math.ceil(abs(dx / (self.max_distance * 1.0))), math.ceil(abs(dy / (self.max_distance * 1.0))))
+        step_x, step_y = dx / steps, dy / steps
+        qx, qy = x0, y0
+        x, y = x0, y0
+        positions = []
+        for _ in range(1, steps):
+            qx += step_x
+            qy += step_y
+            self._update_bounds(qx, qy, qx, qy)
+            x += int(round(qx - x))
+            y += int(round(qy - y))
+            positions.append((x, y))
+        return positions
+
+    def normalise(self, stitches: Iterable[tuple[float, float, int]]) -> list[tuple[int, int, int]]:
+        """Normalise an iterable of ``(x, y, command)`` stitches."""
+        records = []
+        for x, y, command in stitches:
+            x, y = round(x), round(y)
+            if command == STITCH or command == JUMP:
+                dx, dy = x - self.x, y - self.y
+                split = abs(dx) > self.max_distance or abs(dy) > self.max_distance
+                if split:
+                    records.extend((x_i, y_i, JUMP) for x_i, y_i in self._interpolate(self.x, self.y, dx, dy))
+                if command == STITCH and self.trimmed:
+                    if self.full_jump and (split or dx != 0 or dy != 0):
+                        records.append((x, y, JUMP))
+                    self.trimmed = False
+                    self.started = True
+                self.x, self.y = x, y
+                records.append((x, y, command))
+            elif command == TRIM:
+                if not self.trimmed:
+                    records.append((self.x, self.y, TRIM))
+                    self.trimmed = True
+            elif command == COLOR_CHANGE:
+                # Colour changes before the first stitch only select the first thread
+                if self.started:
+                    records.append((self.x, self.y, COLOR_CHANGE))
+                    self.num_color_changes += 1
+                self.trimmed = True
+                self.started = True
+            else:
+                raise ValueError(f"Cannot write stitch command {command}, {_SUPPORTED_COMMANDS_MESSAGE}")
+
+            if records:
+                self._update_bounds(self.x, self.y, self.x, self.y)
+        return records
+
+    def normalise_arrays(
+        self, x: np.ndarray, y: np.ndarray, commands: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorised version of :py:meth:`normalise`, returns the x, y and command arrays of the records."""
+        x = np.rint(x).astype(np.int64)
+        y = np.rint(y).astype(np.int64)
+        commands = np.asarray(commands, dtype=np.uint8)
+        if not np.isin(commands, _SUPPORTED_COMMANDS).all():
+            unsupported = commands[~np.isin(commands, _SUPPORTED_COMMANDS)][0]
+            raise ValueError(f"Cannot write stitch command {unsupported}, {_SUPPORTED_COMMANDS_MESSAGE}")
+
+        is_stitch = commands == STITCH
+        is_trim = commands == TRIM
+        is_color_change = commands == COLOR_CHANGE
+        moves = is_stitch | (commands == JUMP)
+        indices = np.arange(len(commands))
+
+        # Trims and colour changes happen wherever the needle is, i.e. at the previous stitch or jump
+        last_move = np.maximum.accumulate(np.where(moves, indices, -1))
+        needle_x = np.where(last_move >= 0, x[last_move], self.x)
+        needle_y = np.where(last_move >= 0, y[last_move], self.y)
+        dx = needle_x - np.concatenate(([self.x], needle_x[:-1]))
+        dy = needle_y - np.concatenate(([self.y], needle_y[:-1]))
+
+        # Stitches untrim the thread and trims or colour changes trim it, jumps don't change the state
+        last_state_change = np.maximum.accumulate(np.where(is_stitch | is_trim | is_color_change, indices, -1))
+        state_change_before = np.concatenate(([-1], last_state_change[:-1]))
+        trimmed_before = np.where(state_change_before >= 0, ~is_stitch[state_change_before], self.trimmed)
+        started_before = self.started | (np.cumsum(is_stitch | is_color_change) - (is_stitch | is_color_change) > 0)
+
+        keep = moves | (is_trim & ~trimmed_before) | (is_color_change & started_before)
+        split = moves & ((np.abs(dx) > self.max_distance) | (np.abs(dy) > self.max_distance))
+        full_jump = self.full_jump & is_stitch & trimmed_before & (split | (dx != 0) | (dy != 0))
+        steps = np.ones(len(commands), dtype=np.int64)
+        steps[split] = np.maximum(
+            np.ceil(np.abs(dx[split] / (self.max_distance * 1.0))),
+            np.ceil(np.abs(dy[split] / (self.max_distance * 1.0))),
+        )
+
+        # Each kept stitch gives steps - 1 intermediate jumps, an optional full jump and the record itself
+        counts = keep * (steps + full_jump)
+        ends = np.cumsum(counts)
+        num_records = int(ends[-1]) if len(ends) else 0
+        record_x = np.empty(num_records, dtype=np.int64)
+        record_y = np.empty(num_records, dtype=np.int64)
+        record_commands = np.full(num_records, JUMP, dtype=np.uint8)
+
+        record_x[ends[keep] - 1] = needle_x[keep]
+        record_y[ends[keep] - 1] = needle_y[keep]
+        record_commands[ends[keep] - 1] = commands[keep]
+        record_x[ends[full_jump] - 2] = needle_x[full_jump]
+        record_y[ends[full_jump] - 2] = needle_y[full_jump]
+        for idx in np.flatnonzero(split):
+            start = ends[idx] - counts[idx]
+            x0, y0 = int(needle_x[idx] - dx[idx]), int(needle_y[idx] - dy[idx])
+            for offset, (x_i, y_i) in enumerate(self._interpolate(x0, y0, int(dx[idx]), int(dy[idx]))):
+                record_x[start + offset] = x_i
+                record_y[start + offset] = y_i
+
+        if keep.any():
+            self._update_bounds(needle_x[keep].min(), needle_y[keep].min(), needle_x[keep].max(), needle_y[keep].max())
+        if len(commands):
+            self.x, self.y = int(needle_x[-1]), int(needle_y[-1])
+            if last_state_change[-1] >= 0:
+                self.trimmed = not is_stitch[last_state_change[-1]]
+            self.started = self.started or bool((is_stitch | is_color_change).any())
+            self.num_color_changes += int(np.count_nonzero(is_color_change & keep))
+        return record_x, record_y, record_commands
+
+
+def _iter_chunks(pattern: Union[EmbroideryPattern, StitchArray, Iterable]) -> Iterator:
+    """Iterate over the stitches of a pattern, one stitch group at a time."""
+    if isinstance(pattern, StitchArray):
+        for group_idx in range(pattern.num_groups):
+            yield pattern.group(group_idx)
+    elif isinstance(pattern, EmbroideryPattern):
+        yield from pattern.iter_stitch_groups()
+    else:
+        yield getattr(pattern, "stitches", pattern)
+
+
+def _as_arrays(stitches) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if hasattr(stitches, "commands"):  # StitchView
+        return (
+            np.frombuffer(stitches.x, dtype=np.float64),
+            np.frombuffer(stitches.y, dtype=np.float64),
+            np.frombuffer(stitches.commands, dtype=np.uint8),
+        )
+    stitches = np.array(stitches, dtype=np.float64).reshape(-1, 3)
+    return stitches[:, 0], stitches[:, 1], stitches[:, 2].astype(np.uint8)
+
+
+def _iter_records(
+    pattern: Union[EmbroideryPattern, StitchArray, Iterable], normaliser: _Normaliser
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray] | list[tuple[int, int, int]]]:
+    """Normalise the stitches one stitch group at a time. The last chunk contains the end record."""
+    for stitches in _iter_chunks(pattern):
+        if USE_NUMPY and np is not None and len(stitches) >= NUMPY_MIN_STITCHES:
+            records = normaliser.normalise_arrays(*_as_arrays(stitches))
+        elif len(stitches):
+            records = normaliser.normalise(stitches)
+        else:
+            continue
+        normaliser.num_records += len(records[-1]) if isinstance(records, tuple) else len(records)
+        yield records
+
+    normaliser.num_records += 1
+    normaliser._update_bounds(normaliser.x, normaliser.y, normaliser.x, normaliser.y)
+    yield [(normaliser.x, normaliser.y, END)]
+
+
+def _dst_delta_bytes(dx, dy):
+    """Encode x and y steps as balanced ternary DST digits, works with both integers and NumPy arrays."""
+    dy = -dy  # DST files have the y axis pointing up
+    data = [0, 0, 0]
+    for weight, byte, bit_pos_x, bit_neg_x, bit_pos_y, bit_neg_y in _DST_DIGITS:
+        threshold = weight // 2
+        pos_x, neg_x = dx > threshold, dx < -threshold
+        pos_y, neg_y = dy > threshold, dy < -threshold
+        data[byte] = data[byte] + pos_x * (1 << bit_pos_x) + neg_x * (1 << bit_neg_x)
+        data[byte] = data[byte] + pos_y * (1 << bit_pos_y) + neg_y * (1 << bit_neg_y)
+        dx = dx - weight * pos_x + weight * neg_x
+        dy = dy - weight * pos_y + weight * neg_y
+    return data
+
+
+def _encode_dst(records, previous: tuple[int, int]) -> bytes:
+    """Encode normalised records as 3-byte DST records."""
+    if isinstance(records, list):
+        data = bytearray()
+        x_prev, y_prev = previous
+        for x, y, command in records:
+            if command == TRIM:
+                for dx, dy in _DST_TRIM_JUMPS:
+                    b0, b1, b2 = _dst_delta_bytes(dx, dy)
+                    data += bytes((b0, b1, b2 | _DST_FLAGS[JUMP]))
+                continue
+            if command in (STITCH, JUMP):
+                b0, b1, b2 = _dst_delta_bytes(x - x_prev, y - y_prev)
+            else:
+                b0, b1, b2 = 0, 0, 0
+            data += bytes((b0, b1, b2 | _DST_FLAGS[command]))
+            x_prev, y_prev = x, y
+        return bytes(data)
+
+    x, y, commands = records
+    dx = np.diff(x, prepend=previous[0])
+    dy = np.diff(y, prepend=previous[1])
+    rows = np.stack(_dst_delta_bytes(dx, dy), axis=1).astype(np.uint8)
+    rows[commands == COLOR_CHANGE] = 0
+    flags = np.zeros(len(commands), dtype=np.uint8)
+    for command, flag in _DST_FLAGS.items():
+        flags[commands == command] = flag
+    rows[:, 2] |= flags
+
+    # Replace each trim with three jumps
+    is_trim = commands == TRIM
+    rows = np.repeat(rows, np.where(is_trim, len(_DST_TRIM_JUMPS), 1), axis=0)
+    trim_starts = np.flatnonzero(is_trim) + (len(_DST_TRIM_JUMPS) - 1) * np.arange(is_trim.sum())
+    for offset, (trim_dx, trim_dy) in enumerate(_DST_TRIM_JUMPS):
+        b0, b1, b2 = _dst_delta_bytes(trim_dx, trim_dy)
+        rows[trim_starts + offset] = (b0, b1, b2 | _DST_FLAGS[JUMP])
+    return rows.tobytes()
+
+
+def _encode_exp(records, previous: tuple[int, int]) -> bytes:
+    """Encode normalised records as EXP records (2 bytes for stitches and 4 bytes for everything else)."""
+    if isinstance(records, list):
+        data = bytearray()
+        x_prev, y_prev = previous
+        for x, y, command in records:
+            if command == STITCH:
+                data += bytes(((x - x_prev) & 0xFF, -(y - y_prev) & 0xFF))
+            elif command == JUMP:
+                data += b"\x80\x04" + bytes(((x - x_prev) & 0xFF, -(y - y_prev) & 0xFF))
+            else:
+                data += _EXP_RECORDS[command]
+            x_prev, y_prev = x, y
+        return bytes(data)
+
+    x, y, commands = records
+    rows = np.zeros((len(commands), 4), dtype=np.uint8)
+    lengths = np.full(len(commands), 4)
+    deltas = np.stack([np.diff(x, prepend=previous[0]), -np.diff(y, prepend=previous[1])], axis=1) & 0xFF
+    is_stitch = commands == STITCH
+    is_jump = commands == JUMP
+    rows[is_stitch, :2] = deltas[is_stitch]
+    lengths[is_stitch] = 2
+    rows[is_jump] = np.concatenate([np.broadcast_to([0x80, 0x04], (is_jump.sum(), 2)), deltas[is_jump]], axis=1)
+    for command, record in _EXP_RECORDS.items():
+        rows[commands == command, : len(record)] = list(record)
+        lengths[commands == command] = len(record)
+    return rows[np.arange(4) < lengths[:, np.newaxis]].tobytes()
+
+
+def _dst_header(normaliser: _Normaliser, name: str) -> bytes:
+    x_min, y_min, x_max, y_max = normaliser.bounds
+    ax, ay = normaliser.x, -normaliser.y
+    # Use %-formatting like PyEmbroidery, which truncates the unrounded bounds
+    header = (
+        "LA:%-16s\r" % name
+        + "ST:%7d\r" % normaliser.num_records
+        + "CO:%3d\r" % normaliser.num_color_changes
+        + "+X:%5d\r" % abs(x_max)
+        + "-X:%5d\r" % abs(x_min)
+        + "+Y:%5d\r" % abs(y_max)
+        + "-Y:%5d\r" % abs(y_min)
+        + "AX:%s%5d\r" % ("+" if ax >= 0 else "-", abs(ax))
+        + "AY:%s%5d\r" % ("+" if ay >= 0 else "-", abs(ay))
+        + "MX:+%5d\r" % 0
+        + "MY:+%5d\r" % 0
+        + "PD:%6s\r" % "******"
+    )
+    return (header.encode("utf8") + b"\x1a").ljust(DST_HEADER_SIZE, b" ")
+
+
+def _write_records(
+    f: BinaryIO, pattern: Union[EmbroideryPattern, StitchArray], normaliser: _Normaliser, encode
+) -> None:
+    previous = (normaliser.x, normaliser.y)
+    for records in _iter_records(pattern, normaliser):
+        f.write(encode(records, previous))
+        previous = (normaliser.x, normaliser.y)
+
+
+def write_dst(
+    pattern: Union[EmbroideryPattern, StitchArray], filename: Union[str, os.PathLike], name: str = "Untitled"
+) -> None:
+    """Write a pattern to a Tajima ``.dst`` file.
+
+    The stitches are encoded one stitch group at a time, and long stitches and jumps are split into jumps of at most
+    12.1 mm. The file is identical to the file written by ``pyembroidery.write``.
+
+    Parameters
+    ----------
+    pattern : turtlethread.stitches.EmbroideryPattern or turtlethread.stitch_array.StitchArray
+        The pattern to write. Embroidery patterns are streamed without storing all stitches in memory.
+    filename : str or os.PathLike
+        Path of the file
+    name : str (optional, default="Untitled")
+        Name of the design, stored in the file header
+    """
+    normaliser = _Normaliser(DST_MAX_DISTANCE, full_jump=False)
+    with open(filename, "wb") as f:
+        f.write(b" " * DST_HEADER_SIZE)  # The header needs the stitch count and bounds, so we write it last
+        _write_records(f, pattern, normaliser, _encode_dst)
+        f.seek(0)
+        f.write(_dst_header(normaliser, name))
+
+
+def write_exp(pattern: Union[EmbroideryPattern, StitchArray], filename: Union[str, os.PathLike]) -> None:
+    """Write a pattern to a Melco ``.exp`` file.
+
+    The stitches are encoded one stitch group at a time, and long stitches and jumps are split into jumps of at most
+    12.7 mm. The file is identical to the file written by ``pyembroidery.write``.
+
+    Parameters
+    ----------
+    pattern : turtlethread.stitches.EmbroideryPattern or turtlethread.stitch_array.StitchArray
+        The pattern to write. Embroidery patterns are streamed without storing all stitches in memory.
+    filename : str or os.PathLike
+        Path of the file
+    """
+    with open(filename, "wb") as f:
+        _write_records(f, pattern, _Normaliser(EXP_MAX_DISTANCE, full_jump=True), _encode_exp)
+
+
+WRITERS = {".dst": write_dst, ".exp": write_exp}
+
+
+def get_writer(filename: Union[str, os.PathLike]):
+    """Get the native writer for a file, or None if the file format must be written with PyEmbroidery."""
+    return WRITERS.get(os.path.splitext(os.fspath(filename))[1].lower())
@@ -1,11 +1,13 @@
 import math
+import random
 from math import copysign, cos, degrees, pi, radians, sin, sqrt
 
 import pytest
 from pytest import approx
 
 from turtlethread import Turtle
-from turtlethread import fills
+from turtlethread import fills, optimise
+from turtlethread.stitches import FastDirectStitch, JumpStitch, RunningStitch
 
 
 @pytest.fixture
@@ -66,4 +68,333 @@ def test_scanlinefill_intersecting_polygons(turtle):
             turtle.left(90)
     turtle.end_fill() # Fill
     turtle.visualise(skip=True, done=False, bye=False)
-    
\ No newline at end of file
+    
+
+def brute_force_scanline_intersections(edges, min_y, max_y):
+    # Test every edge against every scanline
+    scanned_lines = []
+    scanline_y = min_y
+    while scanline_y <= max_y:
+        intersections = []
+        for (x0, y0), (x1, y1) in edges:
+            if min(y0, y1) <= scanline_y <= max(y0, y1):
+                if abs(x1 - x0) > 1 and abs(y1 - y0) > 1:
+                    gradient = (x1 - x0) / (y1 - y0)
+                    intersections.append((x0 + (scanline_y - y0) * gradient, scanline_y))
+                elif abs(x1 - x0) < 1:
+                    intersections.append((x0, scanline_y))
+        intersections.sort()
+        scanned_lines.append(
+            [point for point, next_point in zip(intersections, intersections[1:]) if abs(next_point[0] - point[0]) >= 1]
+            + intersections[-1:]
+        )
+        scanline_y += 3
+        if scanline_y > max_y and scanline_y - max_y < 3 - 0.3:
+            scanline_y = max_y
+    return scanned_lines
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scanline_intersections_same_as_brute_force(seed):
+    rng = random.Random(seed)
+    points = [(rng.uniform(-200, 200), rng.uniform(-200, 200)) for _ in range(40)]
+    # Add vertical and horizontal edges
+    points += [(points[-1][0], 250), (-250, 250), (-250.5, -250), points[0]]
+    edges = list(zip(points[:-1], points[1:]))
+    min_y = min(y for _, y in points)
+    max_y = max(y for _, y in points)
+
+    assert fills._scanline_intersections(edges, min_y, max_y) == brute_force_scanline_intersections(edges, min_y, max_y)
+
+
+def test_scanlinefill_stitches_each_line_once():
+    turtle = Turtle()
+    with turtle.running_stitch(20):
+        turtle.begin_fill(fills.ScanlineFill(0))
+        for _ in range(4):
+            turtle.forward(90)
+            turtle.left(90)
+        turtle.end_fill()
+
+    fill_lines = [
+        [tuple(position) for position in stitch_group._positions]
+        for stitch_group in turtle.pattern.stitch_groups
+        if isinstance(stitch_group, FastDirectStitch) and stitch_group._positions
+    ]
+    assert fill_lines == [[approx((0, y)), approx((90, y))] for y in range(-87, 0, 3)]
+
+
+def random_outline(seed, num_points=30):
+    rng = random.Random(seed)
+    points = [(rng.uniform(-200, 200), rng.uniform(-200, 200)) for _ in range(num_points)]
+    return points + [points[0]]
+
+
+@pytest.mark.parametrize("jump_at_edges", [False, True])
+@pytest.mark.parametrize("angle", [0, 0.3, math.pi / 2, 2])
+@pytest.mark.parametrize("seed", range(3))
+def test_counted_jumps_same_as_drawn_jumps(seed, angle, jump_at_edges):
+    points = random_outline(seed)
+    turtle = Turtle()
+    turtle.goto(10, 10)
+    fill = fills.ScanlineFill(angle, jump_at_edges=jump_at_edges)
+
+    counted_jumps = fills._count_fill_jumps(points, angle, jump_at_edges, turtle.pos())
+    assert counted_jumps == fill._fill_at_angle(turtle, points, angle)
+
+
+def test_auto_angle_has_fewest_jumps(monkeypatch):
+    fill = fills.ScanlineFill("auto", auto_angles=12)
+    assert fill.auto_angles == approx([i * math.pi / 12 for i in range(12)])
+
+    calls = []
+    monkeypatch.setattr(fill, "_fill_at_angle", lambda *args: calls.append((args, args[0].pos())))
+    turtle = Turtle()
+    with turtle.direct_stitch():
+        turtle.begin_fill(fill)
+        turtle.polyline(random_outline(0))
+        turtle.end_fill()
+
+    [((_, points, angle), position)] = calls
+    jumps = [fills._count_fill_jumps(points, angle, False, position) for angle in fill.auto_angles]
+    assert angle == fill.auto_angles[jumps.index(min(jumps))]
+
+
+def test_auto_angles_sequence_and_processes():
+    points = random_outline(1)
+    fill = fills.ScanlineFill("auto", auto_angles=[0.1, 0.7, 1.3], processes=2)
+    assert fill._best_angle(points, points[0]) == fills.ScanlineFill("auto", auto_angles=[0.1, 0.7, 1.3])._best_angle(
+        points, points[0]
+    )
+    with pytest.raises(ValueError):
+        fills.ScanlineFill("auto", auto_angles=0)
+    with pytest.raises(ValueError):
+        fills.ScanlineFill("auto", auto_angles=[])
+
+
+@pytest.mark.parametrize("even_odd", [False, True])
+@pytest.mark.parametrize("angle", [0, 0.3, math.pi / 2, 2])
+@pytest.mark.parametrize("seed", range(4))
+def test_numpy_backend_same_intersections(seed, angle, even_odd):
+    pytest.importorskip("numpy")
+    points = random_outline(seed)
+    # Add a hole and edges that are vertical or horizontal after rounding
+    points += [(None, None), (-50, -50), (50, -50), (50.5, 50), (-50, 50), (-50, -50)]
+    points = [(x, y) if x is None or seed % 2 else (round(x), round(y)) for x, y in points]
+
+    numpy_lines = fills._scan_polygon(points, angle, "numpy", even_odd)
+    assert numpy_lines == fills._scan_polygon(points, angle, "python", even_odd)
+
+
+@pytest.mark.parametrize("angle", ["auto", 1])
+def test_numpy_backend_same_stitches(angle):
+    pytest.importorskip("numpy")
+    stitches = []
+    for backend in ["python", "numpy"]:
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            turtle.begin_fill(fills.ScanlineFill(angle, jump_at_edges=True, backend=backend))
+            turtle.polyline(random_outline(2))
+            turtle.end_fill()
+        stitches.append(list(turtle.pattern.to_stitch_array().stitches))
+    assert stitches[0] == stitches[1]
+
+
+def test_numpy_backend_falls_back_to_python(monkeypatch):
+    points = random_outline(3)
+    expected = fills._scan_polygon(points, 0.5, "python")
+    monkeypatch.setattr(fills, "np", None)
+    assert fills._scan_polygon(points, 0.5, "numpy") == expected
+    with pytest.raises(ValueError):
+        fills.ScanlineFill(backend="cython")
+
+
+@pytest.mark.parametrize("angle", [0, 0.3, math.pi / 2, 2])
+@pytest.mark.parametrize("seed", range(4))
+def test_even_odd_scanlines_cross_outline_even_number_of_times(seed, angle):
+    points = random_outline(seed) + [(None, None), (-50, -50), (50, -50), (50, 50), (-50, 50), (-50, -50)]
+    points = [(x, y) if x is None or seed % 2 else (round(x), round(y)) for x, y in points]
+    for line in fills._scan_polygon(points, angle, even_odd=True):
+        assert len(line) % 2 == 0
+
+
+def test_decompose_cells():
+    # A U shape: one interval on the first lines, then two intervals (the arms of the U)
+    intervals = [[(0, 100)], [(0, 100)], [(0, 30), (70, 100)], [(0, 30), (70, 100)], [(75, 100)]]
+    cells, neighbours = fills._decompose_cells(intervals)
+
+    assert cells == [[(0, 0), (1, 0)], [(2, 0), (3, 0)], [(2, 1), (3, 1), (4, 0)]]
+    assert neighbours[(1, 0)] == [(0, 0), (2, 0), (2, 1)]
+    assert neighbours[(4, 0)] == [(3, 1)]
+
+
+def test_overlapping_intervals_skips_slanted_gaps():
+    # The gap between the intervals moves to the left faster than it widens
+    assert fills._overlapping_intervals([(0, 50), (52, 100)], [(0, 45), (48, 100)]) == [(0, 0), (1, 1)]
+    assert fills._overlapping_intervals([(0, 50)], [(0, 20), (30, 50)]) == [(0, 0), (0, 1)]
+
+
+def comb(num_teeth=4):
+    """Outline of a comb whose teeth point up, the teeth are 50 wide and 300 long."""
+    points = [(0, 0), (100 * num_teeth, 0)]
+    for tooth in range(num_teeth):
+        x = 100 * (num_teeth - tooth)
+        points += [(x, -300), (x - 50, -300), (x - 50, -100)]
+    return points + [(0, -100), (0, 0)]
+
+
+def fill_stitch_groups(fill, points):
+    turtle = Turtle()
+    turtle.goto(points[0])
+    with turtle.running_stitch(20):
+        fill.fill(turtle, points)
+    return turtle.pattern.stitch_groups
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_boustrophedonfill_convex_polygon_is_one_cell(backend):
+    square = [(0, 0), (90, 0), (90, -90), (0, -90), (0, 0)]
+    stitch_groups = fill_stitch_groups(fills.BoustrophedonFill(0, backend=backend), square)
+
+    # A short travel from the corner to the first line, and one serpentine run over all lines of the square
+    stitch_groups = [stitch_group for stitch_group in stitch_groups if stitch_group._positions]
+    assert [type(stitch_group) for stitch_group in stitch_groups] == [RunningStitch, FastDirectStitch]
+    assert stitch_groups[0]._positions == [approx((0, -3))]
+    positions = stitch_groups[1]._positions
+    assert len(positions) == 2 * len(range(-90, 0, 3))
+    assert all(abs(x - 45) == approx(45) for x, _ in positions)
+
+
+@pytest.mark.parametrize("angle", [0, 0.2, 1, 2.5, "auto"])
+def test_boustrophedonfill_connected_polygon_needs_no_jumps(angle):
+    fill = fills.BoustrophedonFill(angle, travel_stitch_length=15)
+    stitch_groups = fill_stitch_groups(fill, comb())
+
+    assert not any(isinstance(stitch_group, JumpStitch) for stitch_group in stitch_groups)
+    if angle != "auto":
+        assert len(fill._plan(comb(), angle)[2]) > 1
+        travel = [group for group in stitch_groups if isinstance(group, RunningStitch) and group._positions]
+        assert travel and all(group.stitch_length == 15 for group in travel[1:])
+
+
+def test_boustrophedonfill_fewer_jumps_than_scanlinefill():
+    scanline_groups = fill_stitch_groups(fills.ScanlineFill(1, jump_at_edges=True), comb())
+    assert any(isinstance(stitch_group, JumpStitch) for stitch_group in scanline_groups)
+    boustrophedon_groups = fill_stitch_groups(fills.BoustrophedonFill(1), comb())
+    assert not any(isinstance(stitch_group, JumpStitch) for stitch_group in boustrophedon_groups)
+
+
+def test_boustrophedonfill_jumps_between_disjoint_polygons():
+    square = [(0, 0), (90, 0), (90, -90), (0, -90), (0, 0)]
+    points = square + [(None, None)] + [(x + 200, y) for x, y in square]
+    stitch_groups = fill_stitch_groups(fills.BoustrophedonFill(0), points)
+
+    jumps = [stitch_group for stitch_group in stitch_groups if isinstance(stitch_group, JumpStitch)]
+    assert len(jumps) == 1
+    assert sum(isinstance(stitch_group, FastDirectStitch) for stitch_group in stitch_groups) == 2
+
+
+def test_boustrophedonfill_does_not_depend_on_time(monkeypatch):
+    points = random_outline(173)
+    stitch_groups = fill_stitch_groups(fills.BoustrophedonFill(1.3), points)
+
+    class SlowClock:
+        # Every call takes a second, so any time budget runs out immediately
+        now = 0.0
+
+        @classmethod
+        def perf_counter(cls):
+            cls.now += 1
+            return cls.now
+
+    monkeypatch.setattr(optimise, "time", SlowClock)
+    slow_stitch_groups = fill_stitch_groups(fills.BoustrophedonFill(1.3), points)
+    assert [group.stitch_commands for group in slow_stitch_groups] == [group.stitch_commands for group in stitch_groups]
+
+
+def test_boustrophedonfill_invalid_parameters():
+    with pytest.raises(ValueError):
+        fills.BoustrophedonFill(backend="cython")
+    with pytest.raises(ValueError):
+        fills.BoustrophedonFill(auto_angles=0)
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_tatami_rows(backend):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    tatami_rows = fills._tatami_rows_numpy if backend == "numpy" else fills._tatami_rows
+    # The penetrations are shifted by 10 on each line, and are not closer than 7.5 to the ends of the rows
+    xs, ys = tatami_rows([0, 0, 0], [100, 100, 100], [0, 3, 6], [0, 1, 2], [True, False, True], 30, 3)
+    assert list(xs) == approx([0, 30, 60, 90, 100, 100, 70, 40, 10, 0, 0, 20, 50, 80, 100])
+    assert list(ys) == [0] * 5 + [3] * 5 + [6] * 5
+
+    # Long turns between rows are split
+    xs, ys = tatami_rows([0, 0], [100, 100], [0, 3], [0, 3], [True, True], 30, 3)
+    assert list(xs) == approx([0, 30, 60, 90, 100, 75, 50, 25, 0, 30, 60, 90, 100])
+    assert list(ys) == approx([0] * 5 + [0.75, 1.5, 2.25] + [3] * 5)
+
+
+@pytest.mark.parametrize("angle", [0, 0.2, 1, math.pi / 2])
+def test_tatamifill_numpy_same_as_python(angle):
+    pytest.importorskip("numpy")
+    stitches = []
+    for backend in ["python", "numpy"]:
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            turtle.begin_fill(fills.TatamiFill(angle=angle, backend=backend))
+            turtle.polyline(comb())
+            turtle.end_fill()
+        stitches.append(list(turtle.pattern.to_stitch_array().stitches))
+    assert stitches[0] == stitches[1]
+
+
+@pytest.mark.parametrize("angle", [0, 0.2, 1, math.pi / 2])
+def test_tatamifill_stitch_lengths(angle):
+    fill = fills.TatamiFill(row_spacing=4, stitch_length=40, angle=angle)
+    stitch_groups = fill_stitch_groups(fill, comb())
+
+    assert not any(isinstance(stitch_group, JumpStitch) for stitch_group in stitch_groups)
+    fill_groups = [stitch_group for stitch_group in stitch_groups if isinstance(stitch_group, FastDirectStitch)]
+    stitch_lengths = [
+        math.dist(position, next_position)
+        for stitch_group in fill_groups
+        for position, next_position in zip(stitch_group._positions[:-1], stitch_group._positions[1:])
+    ]
+    # The stitches at the end of the rows are at most 1.25 times as long, since close penetrations are skipped
+    assert max(stitch_lengths) <= 1.25 * 40 + 1e-6
+    # There are more stitches than with one stitch per row
+    boustrophedon_groups = fill_stitch_groups(fills.BoustrophedonFill(angle, row_spacing=4), comb())
+    num_boustrophedon_stitches = sum(
+        len(stitch_group._positions)
+        for stitch_group in boustrophedon_groups
+        if isinstance(stitch_group, FastDirectStitch)
+    )
+    assert len(stitch_lengths) > num_boustrophedon_stitches
+
+
+def test_tatamifill_penetrations_are_staggered():
+    square = [(0, 0), (600, 0), (600, -600), (0, -600), (0, 0)]
+    stitch_groups = fill_stitch_groups(fills.TatamiFill(stitch_length=30, stagger=3, angle=0), square)
+    (fill_group,) = [stitch_group for stitch_group in stitch_groups if isinstance(stitch_group, FastDirectStitch)]
+
+    offsets = {}
+    for x, y in fill_group._positions:
+        if 1 < x < 599:
+            offsets.setdefault(round(y), set()).add(round(x % 30, 6) % 30)
+    rows = sorted(offsets)
+    assert all(len(offsets[y]) == 1 for y in rows)
+    for y, next_y in zip(rows[:-1], rows[1:]):
+        assert offsets[y] != offsets[next_y]
+    assert {offset for y in rows for (offset,) in [offsets[y]]} == {0, 10, 20}
+
+
+def test_tatamifill_invalid_parameters():
+    with pytest.raises(ValueError):
+        fills.TatamiFill(row_spacing=0.5)
+    with pytest.raises(ValueError):
+        fills.TatamiFill(stitch_length=0)
+    with pytest.raises(ValueError):
+        fills.TatamiFill(stagger=0)
+    with pytest.raises(ValueError):
+        fills.TatamiFill(stagger=1.5)
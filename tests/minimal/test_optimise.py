@@ -0,0 +1,286 @@
+import random
+
+import pytest
+from pytest import approx
+
+import turtlethread.optimise as optimise
+import turtlethread.stitches as stitches
+from turtlethread import Turtle
+from turtlethread.base_turtle import Vec2D
+from turtlethread.optimise import CoverageGrid, TrimPolicy, order_color_blocks, order_paths, travel_distance
+
+
+def random_paths(seed, num_paths):
+    rng = random.Random(seed)
+    starts = [(rng.uniform(-500, 500), rng.uniform(-500, 500)) for _ in range(num_paths)]
+    ends = [(x + rng.uniform(-50, 50), y + rng.uniform(-50, 50)) for x, y in starts]
+    return starts, ends
+
+
+def jump_distance(pattern):
+    distance = 0
+    stitch_array = pattern.to_stitch_array()
+    for (x1, y1, _), (x2, y2, command) in zip(stitch_array.stitches, stitch_array.stitches[1:]):
+        if command == stitches.pyembroidery.JUMP:
+            distance += ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+    return distance
+
+
+class TestOrderPaths:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    @pytest.mark.parametrize("reversible", [True, False])
+    def test_order_is_permutation_and_shorter(self, seed, reversible):
+        starts, ends = random_paths(seed, 60)
+        reversible = [reversible] * len(starts)
+        order = order_paths((0, 0), starts, ends, reversible)
+
+        assert sorted(path_idx for path_idx, _ in order) == list(range(len(starts)))
+        assert all(reversible[path_idx] or not reverse for path_idx, reverse in order)
+        identity = [(path_idx, False) for path_idx in range(len(starts))]
+        assert travel_distance((0, 0), order, starts, ends) < travel_distance((0, 0), identity, starts, ends) / 3
+
+    def test_improvement_beats_nearest_neighbour(self):
+        starts, ends = random_paths(3, 80)
+        reversible = [True] * len(starts)
+        nearest_neighbour = optimise._nearest_neighbour_order((0, 0), starts, ends, reversible)
+        order = order_paths((0, 0), starts, ends, reversible, time_budget=5)
+        assert travel_distance((0, 0), order, starts, ends) <= travel_distance((0, 0), nearest_neighbour, starts, ends)
+
+    def test_nearest_neighbour_without_numpy(self, monkeypatch):
+        starts, ends = random_paths(4, 30)
+        reversible = [i % 2 == 0 for i in range(len(starts))]
+        numpy_order = optimise._nearest_neighbour_order((0, 0), starts, ends, reversible)
+        monkeypatch.setattr(optimise, "np", None)
+        assert optimise._nearest_neighbour_order((0, 0), starts, ends, reversible) == numpy_order
+
+    def test_collinear_paths_are_chained(self):
+        starts = [(20, 0), (0, 0), (30, 0), (10, 0)]
+        ends = [(30, 0), (10, 0), (40, 0), (20, 0)]
+        order = order_paths((0, 0), starts, ends, [True] * 4)
+        assert order == [(1, False), (3, False), (0, False), (2, False)]
+        assert travel_distance((0, 0), order, starts, ends) == 0
+
+    def test_zero_time_budget_gives_nearest_neighbour(self):
+        starts, ends = random_paths(5, 20)
+        reversible = [True] * len(starts)
+        assert order_paths((0, 0), starts, ends, reversible, time_budget=0) == optimise._nearest_neighbour_order(
+            (0, 0), starts, ends, reversible
+        )
+
+
+    def test_max_evaluations(self):
+        starts, ends = random_paths(6, 40)
+        reversible = [True] * len(starts)
+        assert order_paths((0, 0), starts, ends, reversible, max_evaluations=0) == optimise._nearest_neighbour_order(
+            (0, 0), starts, ends, reversible
+        )
+        order = order_paths((0, 0), starts, ends, reversible, time_budget=None, max_evaluations=2000)
+        assert order == order_paths((0, 0), starts, ends, reversible, time_budget=None, max_evaluations=2000)
+        converged_order = order_paths((0, 0), starts, ends, reversible, time_budget=None)
+        assert travel_distance((0, 0), converged_order, starts, ends) <= travel_distance((0, 0), order, starts, ends)
+
+class TestOptimiseOrder:
+    @pytest.fixture
+    def scattered_turtle(self):
+        rng = random.Random(0)
+        turtle = Turtle(color="red")
+        for stroke_idx in range(40):
+            if stroke_idx == 20:
+                turtle.color("blue")
+            with turtle.jump_stitch():
+                turtle.goto(rng.uniform(-500, 500), rng.uniform(-500, 500))
+            with turtle.running_stitch(20):
+                turtle.setheading(rng.uniform(0, 360))
+                turtle.forward(rng.uniform(10, 60))
+                turtle.left(90)
+                turtle.forward(rng.uniform(10, 60))
+        return turtle
+
+    def test_jump_distance_is_reduced(self, scattered_turtle):
+        distance_before, distance_after = scattered_turtle.pattern.optimise_order()
+        assert distance_after < distance_before / 2
+        assert jump_distance(scattered_turtle.pattern) == approx(distance_after)
+
+    def test_colours_and_strokes_are_kept(self, scattered_turtle):
+        pattern = scattered_turtle.pattern
+        colors = pattern.thread_colors()
+        strokes_before = {
+            frozenset([tuple(group._start_pos), *map(tuple, group._positions)])
+            for group in pattern.stitch_groups
+            if isinstance(group, stitches.RunningStitch) and group._positions
+        }
+        pattern.optimise_order()
+
+        strokes_after = {
+            frozenset([tuple(group._start_pos), *map(tuple, group._positions)])
+            for group in pattern.stitch_groups
+            if isinstance(group, stitches.RunningStitch) and group._positions
+        }
+        assert strokes_after == strokes_before
+        assert pattern.thread_colors() == colors
+        red_groups = [group for group in pattern.stitch_groups if group.color == "red"]
+        blue_groups = [group for group in pattern.stitch_groups if group.color == "blue"]
+        assert pattern.stitch_groups.index(red_groups[-1]) < pattern.stitch_groups.index(blue_groups[0])
+
+    def test_unit_stitches_are_not_reversed(self):
+        turtle = Turtle()
+        for x in [100, 0]:
+            with turtle.jump_stitch():
+                turtle.goto(x, 0)
+            with turtle.zigzag_stitch(5, 5):
+                turtle.forward(50)
+        zigzag_stitches = [group for group in turtle.pattern.stitch_groups if isinstance(group, stitches.ZigzagStitch)]
+
+        turtle.pattern.optimise_order()
+        # The zigzag that starts at the origin is stitched first, and no zigzag is replaced by a reversed copy
+        optimised_zigzag_stitches = [
+            group for group in turtle.pattern.stitch_groups if isinstance(group, stitches.ZigzagStitch)
+        ]
+        assert optimised_zigzag_stitches == zigzag_stitches[::-1]
+
+    def test_instances(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            with turtle.symmetry(n=5):
+                with turtle.jump_stitch():
+                    turtle.goto(100, 0)
+                turtle.forward(100)
+                turtle.left(90)
+                turtle.forward(50)
+        pattern = turtle.pattern
+        assert any(isinstance(group, stitches.StitchGroupInstance) for group in pattern.stitch_groups)
+
+        distance_before, distance_after = pattern.optimise_order()
+        assert distance_after < distance_before
+        assert jump_distance(pattern) == approx(distance_after)
+        # The jumps start where the previous stitches end
+        stitch_array = pattern.to_stitch_array().stitches
+        for (x1, y1, _), (x2, y2, command) in zip(stitch_array, stitch_array[1:]):
+            if command == stitches.pyembroidery.TRIM:
+                assert (x2, y2) == approx((x1, y1))
+
+
+class TestOrderColorBlocks:
+    def test_non_overlapping_blocks_are_grouped(self):
+        colors = ["red", "blue", "red", "blue", "green", "red"]
+        bounding_boxes = [(i * 100, 0, i * 100 + 50, 10) for i in range(len(colors))]
+        order = order_color_blocks(colors, bounding_boxes)
+        assert [colors[block_idx] for block_idx in order] == ["red", "red", "red", "blue", "blue", "green"]
+        assert order == [0, 2, 5, 1, 3, 4]
+
+    def test_overlapping_blocks_keep_their_order(self):
+        colors = ["red", "blue", "red", "blue"]
+        # The second red block overlaps the first blue block, the rest are separate
+        bounding_boxes = [(0, 0, 10, 10), (100, 0, 110, 10), (105, 5, 120, 10), (300, 0, 310, 10)]
+        order = order_color_blocks(colors, bounding_boxes)
+        assert order.index(1) < order.index(2)
+        assert [colors[block_idx] for block_idx in order] == ["red", "blue", "blue", "red"]
+
+    def test_color_order(self):
+        colors = ["red", "blue", "red", "green"]
+        bounding_boxes = [(0, 0, 10, 10)] * 4
+        order = order_color_blocks(colors, bounding_boxes, color_order=["green", "red"])
+        assert order == [3, 0, 2, 1]
+
+
+class TestConsolidateColors:
+    @pytest.fixture
+    def striped_turtle(self):
+        turtle = Turtle(color="red")
+        for i, color in enumerate(["red", "blue", "red", "blue", "green", "red"]):
+            turtle.color(color)
+            with turtle.jump_stitch():
+                turtle.goto(i * 100, 0)
+            with turtle.running_stitch(20):
+                turtle.forward(50)
+        return turtle
+
+    def test_thread_changes_are_saved(self, striped_turtle):
+        pattern = striped_turtle.pattern
+        stitches_before = {
+            (x, y) for x, y, command in pattern.to_stitch_array().stitches if command == stitches.pyembroidery.STITCH
+        }
+
+        assert pattern.consolidate_colors() == 3
+        assert pattern.thread_colors() == ["red", "blue", "green"]
+        stitch_array = pattern.to_stitch_array()
+        stitches_after = {(x, y) for x, y, command in stitch_array.stitches if command == stitches.pyembroidery.STITCH}
+        assert stitches_after == stitches_before
+
+        # Every block is reached with a jump, so there are no long stitches between the blocks
+        for (x1, y1, command1), (x2, y2, command2) in zip(stitch_array.stitches, stitch_array.stitches[1:]):
+            if command1 == command2 == stitches.pyembroidery.STITCH:
+                assert ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5 <= 30
+
+    def test_overlapping_blocks_are_not_moved(self, striped_turtle):
+        assert striped_turtle.pattern.consolidate_colors(margin=60) == 0
+        assert striped_turtle.pattern.thread_colors() == ["red", "blue", "red", "blue", "green", "red"]
+
+    def test_color_order(self, striped_turtle):
+        assert striped_turtle.pattern.consolidate_colors(color_order=["green", "blue", "red"]) == 3
+        assert striped_turtle.pattern.thread_colors() == ["green", "blue", "red"]
+
+
+class TestTrimPolicy:
+    @pytest.fixture
+    def letters_turtle(self):
+        # Three short strokes with short jumps between them, then a long jump, and a satin bar that covers the first
+        # jump
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.goto(70, 0)
+        with turtle.running_stitch(20):
+            turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.goto(140, 30)
+        with turtle.running_stitch(20):
+            turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.goto(-100, 0)
+        with turtle.satin_stitch(20):
+            turtle.goto(200, 0)
+        return turtle
+
+    def test_default_policy_trims_every_jump(self, letters_turtle):
+        assert letters_turtle.pattern.apply_trim_policy(TrimPolicy()) == (3, 3)
+
+    def test_trim_threshold(self, letters_turtle):
+        assert letters_turtle.pattern.apply_trim_policy(TrimPolicy(trim_distance=100)) == (3, 1)
+        stitch_groups = letters_turtle.pattern.stitch_groups
+        jump_stitches = [group for group in stitch_groups if isinstance(group, stitches.JumpStitch)]
+        assert [jump_stitch.trim for jump_stitch in jump_stitches] == [False, False, True]
+        assert [command for *_, command in jump_stitches[0].stitch_commands] == [stitches.pyembroidery.JUMP]
+
+    def test_hidden_short_jumps_become_travel_stitches(self, letters_turtle):
+        policy = TrimPolicy(trim_distance=100, travel_distance=100, cover_distance=10)
+        assert letters_turtle.pattern.apply_trim_policy(policy) == (3, 1)
+
+        # Only the first jump is covered by the satin stitch, the second jump leaves the satin stitch
+        stitch_groups = letters_turtle.pattern.stitch_groups
+        assert type(stitch_groups[1]) is stitches.RunningStitch and stitch_groups[1].color is None
+        assert isinstance(stitch_groups[3], stitches.JumpStitch) and not stitch_groups[3].trim
+        assert isinstance(stitch_groups[5], stitches.JumpStitch) and stitch_groups[5].trim
+
+    def test_jumps_of_instances_do_not_cover(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.goto(70, 0)
+        with turtle.running_stitch(20):
+            turtle.forward(50)
+        jump_stitch = stitches.JumpStitch(Vec2D(40, 0))
+        jump_stitch.add_location(Vec2D(80, 0))
+        turtle.pattern.stitch_groups.append(stitches.StitchGroupInstance(jump_stitch, ((1, 0, 0), (0, 1, 0))))
+
+        policy = TrimPolicy(trim_distance=100, travel_distance=100, cover_distance=10)
+        turtle.pattern.apply_trim_policy(policy)
+        assert isinstance(turtle.pattern.stitch_groups[1], stitches.JumpStitch)
+
+    def test_coverage_grid(self):
+        coverage = CoverageGrid(5)
+        coverage.add_stitches([(0, 0), (100, 0)])
+        assert coverage.covers([(10, 2), (90, -2)])
+        assert not coverage.covers([(10, 2), (90, 40)])
@@ -0,0 +1,119 @@
+import pickle
+
+import pytest
+from pytest import approx
+
+from turtlethread import Turtle, fills
+from turtlethread.recording import Recording
+from turtlethread.stitches import EmbroideryPattern
+
+
+def draw(turtle, compile_halfway=False):
+    with turtle.running_stitch(20):
+        turtle.forward(100)
+        turtle.color("blue")
+        turtle.circle(40)
+        with turtle.jump_stitch():
+            turtle.forward(50)
+        if compile_halfway:
+            turtle.compile()
+        with turtle.zigzag_stitch(5, 10):
+            turtle.left(45)
+            turtle.forward(100)
+        turtle.goto_many([10, 20, 30], [40, 50, 60])
+        turtle.begin_fill(fills.ScanlineFill())
+        for _ in range(4):
+            turtle.forward(100)
+            turtle.left(90)
+        turtle.end_fill()
+        turtle.color("red")
+        turtle.forward(30)
+    return turtle
+
+
+def stitch_list(pattern):
+    return list(pattern.to_stitch_array().stitches)
+
+
+@pytest.fixture
+def reference_pattern():
+    return draw(Turtle(color="red")).pattern
+
+
+class TestRecordingTurtle:
+    def test_same_pattern_as_turtle(self, reference_pattern):
+        turtle = draw(Turtle(color="red", record=True))
+        turtle.compile()
+
+        assert stitch_list(turtle.pattern) == stitch_list(reference_pattern)
+        assert len(turtle.pattern.stitch_groups) == len(reference_pattern.stitch_groups)
+        assert turtle.pattern.thread_colors() == reference_pattern.thread_colors()
+
+    def test_stitch_groups_are_created_on_compile(self):
+        turtle = Turtle(record=True)
+        with turtle.running_stitch(20):
+            turtle.forward(100)
+            turtle.left(90)
+            turtle.forward(100)
+
+        assert turtle.pattern.stitch_groups == []
+        assert turtle.recording.num_moves == 3  # Including the move to the start position
+        assert len(turtle.recording) == 4  # Move, push, move, pop
+
+        turtle.compile()
+        assert len(turtle.recording) == 0
+        assert len(turtle.pattern.stitch_groups) == 1
+        assert turtle.pattern.stitch_groups[0]._positions == [approx((100, 0)), approx((100, -100))]
+        num_stitches = len(stitch_list(turtle.pattern))
+        turtle.compile()
+        assert len(stitch_list(turtle.pattern)) == num_stitches
+
+    def test_compile_halfway(self, reference_pattern):
+        turtle = draw(Turtle(color="red", record=True), compile_halfway=True)
+        turtle.compile()
+        assert stitch_list(turtle.pattern) == stitch_list(reference_pattern)
+
+    def test_save_compiles(self, reference_pattern, tmp_path):
+        turtle = draw(Turtle(color="red", record=True))
+        turtle.save(tmp_path / "pattern.dst")
+        assert stitch_list(turtle.pattern) == stitch_list(reference_pattern)
+
+    def test_replay_pickled_recording(self):
+        turtle = Turtle(color="red", record=True)
+        with turtle.running_stitch(20):
+            for _ in range(5):
+                turtle.forward(100)
+                turtle.left(72)
+            turtle.color("blue")
+            with turtle.jump_stitch():
+                turtle.goto(300, 300)
+            turtle.polyline([(310, 300), (310, 310)])
+        recording = pickle.loads(pickle.dumps(turtle.recording))
+
+        pattern = EmbroideryPattern()
+        position = recording.replay(pattern)
+        turtle.compile()
+        assert stitch_list(pattern) == stitch_list(turtle.pattern)
+        assert position == turtle.position()
+
+    def test_not_recording_by_default(self):
+        turtle = Turtle()
+        assert turtle.recording is None
+        with turtle.running_stitch(20):
+            turtle.forward(100)
+        assert turtle.compile() is turtle.pattern
+        assert len(turtle.pattern.stitch_groups) == 1
+
+
+class TestRecording:
+    def test_moves_are_stored_as_runs(self):
+        recording = Recording()
+        recording.goto(1, 2)
+        recording.goto_many([(3, 4), (5, 6)])
+        recording.color("red")
+        recording.goto(7, 8)
+
+        assert list(recording.ops) == [0, 3, 0]
+        assert list(recording.args) == [3, 0, 1]
+        assert list(recording.coordinates) == [1, 2, 3, 4, 5, 6, 7, 8]
+        assert recording.objects == ["red"]
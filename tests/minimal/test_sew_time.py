@@ -0,0 +1,129 @@
+import pytest
+from pyembroidery import JUMP, STITCH, TRIM
+from pytest import approx
+
+import turtlethread.sew_time as sew_time
+from turtlethread import Turtle
+from turtlethread.sew_time import HOME_MACHINE, INDUSTRIAL_MACHINE, MachineProfile, simulate_sew_time
+from turtlethread.stitch_array import StitchArray
+
+
+@pytest.fixture
+def turtle():
+    turtle = Turtle(angle_mode="degrees", color="red")
+    with turtle.running_stitch(30):
+        for _ in range(4):
+            turtle.forward(300)
+            turtle.left(90)
+        turtle.color("blue")
+        with turtle.jump_stitch():
+            turtle.forward(200)
+        for _ in range(4):
+            turtle.forward(300)
+            turtle.right(90)
+    return turtle
+
+
+def make_stitch_array(stitches):
+    stitch_array = StitchArray()
+    stitch_array.extend(stitches)
+    stitch_array.end_group()
+    return stitch_array
+
+
+class TestMachineProfile:
+    def test_speed_is_interpolated(self):
+        profile = MachineProfile(speed_curve=((2, 1000), (6, 600)))
+        assert profile.speed(1) == 1000
+        assert profile.speed(4) == approx(800)
+        assert profile.speed(10) == 600
+
+    def test_invalid_speed_curve(self):
+        with pytest.raises(ValueError):
+            MachineProfile(speed_curve=())
+        with pytest.raises(ValueError):
+            MachineProfile(speed_curve=((6, 600), (2, 1000)))
+        with pytest.raises(ValueError):
+            MachineProfile(speed_curve=((2, 0),))
+
+
+class TestSimulateSewTime:
+    def test_single_command_times(self):
+        profile = MachineProfile(speed_curve=((0, 600),), start_speed=600, jump_time=0.5, jump_speed=10)
+        stitch_array = make_stitch_array([(0, 0, STITCH), (30, 40, STITCH), (30, 40, TRIM), (130, 40, JUMP)])
+        stitch_array.add_color("blue")
+        stitch_array.extend([(130, 40, STITCH)])
+        stitch_array.end_group()
+
+        result = simulate_sew_time(stitch_array, profile)
+        assert result.stitch_time == approx(0.3)
+        assert result.jump_time == approx(0.5 + 1)  # 10 mm at 10 mm per second
+        assert result.trim_time == profile.trim_time
+        assert result.color_change_time == profile.color_change_time
+        assert result.total == approx(1.8 + profile.trim_time + profile.color_change_time)
+        assert result.group_times == approx([1.7 + profile.trim_time, 0.1 + profile.color_change_time])
+
+    def test_long_stitches_are_slower(self):
+        profile = MachineProfile(speed_curve=((2, 1200), (10, 400)), start_speed=1200)
+        short_stitches = make_stitch_array([(20 * i, 0, STITCH) for i in range(3)])
+        long_stitches = make_stitch_array([(100 * i, 0, STITCH) for i in range(3)])
+        # The first stitch has length 0, the other stitches are sewn at 1200 and 400 stitches per minute
+        assert simulate_sew_time(short_stitches, profile).total == approx(3 * 0.05)
+        assert simulate_sew_time(long_stitches, profile).total == approx(0.05 + 2 * 0.15)
+
+    def test_acceleration(self):
+        profile = MachineProfile(speed_curve=((0, 1000),), start_speed=200, acceleration=200)
+        stitch_array = make_stitch_array([(i, 0, STITCH) for i in range(11)])
+        speeds = [200, 400, 600, 800, 1000, 1000, 1000, 800, 600, 400, 200]
+        assert simulate_sew_time(stitch_array, profile).total == approx(sum(60 / speed for speed in speeds))
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_group_and_color_times_add_up(self, monkeypatch, turtle, use_numpy):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        monkeypatch.setattr(sew_time, "USE_NUMPY", use_numpy)
+        result = simulate_sew_time(turtle.pattern, INDUSTRIAL_MACHINE)
+
+        assert result.colors == ["red", "blue"]
+        assert len(result.group_times) == len(turtle.pattern.stitch_groups)
+        assert sum(result.group_times) == approx(result.total)
+        assert sum(result.color_times) == approx(result.total)
+        assert result.color_times[1] > INDUSTRIAL_MACHINE.color_change_time
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_stitches_before_first_color(self, monkeypatch, use_numpy):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        monkeypatch.setattr(sew_time, "USE_NUMPY", use_numpy)
+        turtle = Turtle()
+        with turtle.running_stitch(30):
+            turtle.forward(300)
+            turtle.color("red")
+            turtle.forward(300)
+        result = simulate_sew_time(turtle.pattern)
+
+        assert result.colors == [None, "red"]
+        assert len(result.color_times) == 2
+        assert result.color_times[1] > HOME_MACHINE.color_change_time
+
+    def test_numpy_and_python_give_same_result(self, monkeypatch, turtle):
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(sew_time, "USE_NUMPY", True)
+        numpy_result = simulate_sew_time(turtle.pattern)
+        monkeypatch.setattr(sew_time, "USE_NUMPY", False)
+        python_result = simulate_sew_time(turtle.pattern)
+
+        assert numpy_result.total == approx(python_result.total)
+        assert numpy_result.group_times == approx(python_result.group_times)
+        assert numpy_result.color_times == approx(python_result.color_times)
+
+    def test_default_profile_is_home_machine(self, turtle):
+        assert simulate_sew_time(turtle.pattern).total == approx(simulate_sew_time(turtle.pattern, HOME_MACHINE).total)
+        assert simulate_sew_time(turtle.pattern, INDUSTRIAL_MACHINE).total < simulate_sew_time(turtle.pattern).total
+
+    def test_empty_pattern(self):
+        result = simulate_sew_time(StitchArray())
+        assert result.total == 0
+        assert result.group_times == []
+        assert result.color_times == [0]
+        assert result.colors == [None]
@@ -0,0 +1,372 @@
+import math
+
+import pytest
+from pyembroidery import COLOR_CHANGE, JUMP, STITCH, TRIM
+from pytest import approx
+
+import turtlethread.stitch_array as stitch_array
+import turtlethread.stitches as stitches
+from turtlethread import Turtle
+from turtlethread.base_turtle import Vec2D
+from turtlethread.pattern_info import get_pattern_info
+from turtlethread.stitch_array import StitchArray
+from turtlethread.stitches import EmbroideryPattern
+
+
+@pytest.fixture
+def turtle():
+    turtle = Turtle(angle_mode="degrees", color="red")
+    with turtle.running_stitch(20):
+        turtle.forward(100)
+        turtle.color("blue")
+        turtle.left(90)
+        turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.forward(100)
+        turtle.color("blue")
+        turtle.circle(30)
+    return turtle
+
+
+class TestStitchArray:
+    def test_stitches_match_pyembroidery(self, turtle):
+        stitch_array = turtle.pattern.to_stitch_array()
+        pyemb_pattern = turtle.pattern.to_pyembroidery()
+
+        assert list(stitch_array.stitches) == [tuple(stitch) for stitch in pyemb_pattern.stitches]
+        assert len(stitch_array) == len(pyemb_pattern.stitches)
+        assert [thread.hex_color() for thread in stitch_array.threadlist] == ["#ff0000", "#0000ff"]
+
+    def test_color_change_added_between_colors(self, turtle):
+        commands = [command for *_, command in turtle.pattern.to_stitch_array().stitches]
+        assert commands.count(COLOR_CHANGE) == 1
+        assert commands.count(TRIM) == 1
+        assert commands.count(JUMP) == 1
+
+    def test_groups_cover_all_stitches(self, turtle):
+        stitch_array = turtle.pattern.to_stitch_array()
+        assert stitch_array.num_groups == len(turtle.pattern.stitch_groups)
+
+        stitches_from_groups = []
+        for group_idx in range(stitch_array.num_groups):
+            stitches_from_groups.extend(stitch_array.group(group_idx))
+        assert stitches_from_groups == list(stitch_array.stitches)
+
+    def test_slicing_gives_view(self, turtle):
+        stitch_array = turtle.pattern.to_stitch_array()
+        view = stitch_array.stitches[1:4]
+        assert len(view) == 3
+        assert view[0] == stitch_array.stitches[1]
+        assert view.x.obj is stitch_array.x
+
+    def test_scale(self):
+        turtle = Turtle(scale=2)
+        with turtle.running_stitch(10):
+            turtle.forward(20)
+        assert list(turtle.pattern.to_stitch_array().stitches) == [(0, 0, STITCH), (20, 0, STITCH), (40, 0, STITCH)]
+
+    def test_pattern_info_same_as_pyembroidery(self, turtle):
+        assert get_pattern_info(turtle.pattern.to_stitch_array()) == get_pattern_info(turtle.pattern.to_pyembroidery())
+
+    def test_as_numpy_does_not_copy(self, turtle):
+        np = pytest.importorskip("numpy")
+        stitch_array = turtle.pattern.to_stitch_array()
+        x, y, commands = stitch_array.as_numpy()
+        assert not x.flags.owndata
+        assert np.array_equal(commands, list(stitch_array.commands))
+
+    def test_empty_pattern(self):
+        stitch_array = Turtle().pattern.to_stitch_array()
+        assert isinstance(stitch_array, StitchArray)
+        assert len(stitch_array) == 0
+        assert not stitch_array.to_pyembroidery().stitches
+
+
+class TestCompilationCache:
+    @pytest.fixture
+    def compiled_groups(self, turtle, monkeypatch):
+        compiled_groups = []
+        compile_stitch_group = turtle.pattern._compile_stitch_group
+
+        def spy(stitch_group, stitch_array):
+            compiled_groups.append(stitch_group)
+            compile_stitch_group(stitch_group, stitch_array)
+
+        monkeypatch.setattr(turtle.pattern, "_compile_stitch_group", spy)
+        return compiled_groups
+
+    def test_save_to_many_formats_compiles_once(self, turtle, compiled_groups, tmp_path):
+        for suffix in ["dst", "exp", "jef", "pes", "vp3"]:
+            turtle.save(str(tmp_path / f"pattern.{suffix}"))
+        assert len(compiled_groups) == len(turtle.pattern.stitch_groups)
+
+    def test_only_changed_groups_are_compiled_again(self, turtle, compiled_groups):
+        stitch_array = turtle.pattern.to_stitch_array()
+        compiled_groups.clear()
+
+        turtle.pattern.stitch_groups[0].add_location((200, 200))
+        new_stitch_array = turtle.pattern.to_stitch_array()
+
+        assert compiled_groups == [turtle.pattern.stitch_groups[0]]
+        assert new_stitch_array is not stitch_array
+        assert list(new_stitch_array.stitches) == [tuple(s) for s in turtle.pattern.to_pyembroidery().stitches]
+
+    def test_cache_is_invalidated_by_scale(self, turtle, compiled_groups):
+        stitch_array = turtle.pattern.to_stitch_array()
+        turtle.pattern.scale = 2
+        scaled_stitch_array = turtle.pattern.to_stitch_array()
+
+        assert len(compiled_groups) == 2 * len(turtle.pattern.stitch_groups)
+        assert list(scaled_stitch_array.x) == [2 * x for x in stitch_array.x]
+
+    def test_new_groups_are_included(self, turtle):
+        num_stitches = len(turtle.pattern.to_stitch_array())
+        with turtle.running_stitch(10):
+            turtle.forward(20)
+        assert len(turtle.pattern.to_stitch_array()) == num_stitches + 3
+
+
+class TestStreamingStitches:
+    def test_iter_stitches_same_as_pyembroidery(self, turtle):
+        pyemb_pattern = turtle.pattern.to_pyembroidery()
+        assert list(turtle.pattern.iter_stitches()) == [tuple(stitch) for stitch in pyemb_pattern.stitches]
+        assert turtle.pattern.thread_colors() == ["red", "blue"]
+
+    def test_iter_stitch_groups_yields_one_list_per_group(self, turtle):
+        stitch_array = turtle.pattern.to_stitch_array()
+        stitch_groups = list(turtle.pattern.iter_stitch_groups())
+        assert len(stitch_groups) == len(turtle.pattern.stitch_groups)
+        for group_idx, stitch_commands in enumerate(stitch_groups):
+            assert stitch_commands == list(stitch_array.group(group_idx))
+
+    def test_iter_stitches_is_lazy_and_does_not_cache(self, turtle):
+        stitches = turtle.pattern.iter_stitches()
+        next(stitches)
+        assert all(group._stitch_commands is None for group in turtle.pattern.stitch_groups[1:])
+        assert turtle.pattern._compiled is None
+
+    def test_scale(self):
+        turtle = Turtle(scale=2)
+        with turtle.running_stitch(10):
+            turtle.forward(20)
+        assert list(turtle.pattern.iter_stitches()) == [(0, 0, STITCH), (20, 0, STITCH), (40, 0, STITCH)]
+
+    def test_pattern_info_from_stream(self, turtle):
+        assert get_pattern_info(turtle.pattern.iter_stitches()) == get_pattern_info(turtle.pattern.to_pyembroidery())
+
+
+class TestPatternInstances:
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_instance_is_transformed_copy(self, monkeypatch, turtle, use_numpy):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        monkeypatch.setattr(stitches, "USE_NUMPY", use_numpy)
+        motif = turtle.pattern
+        pattern = EmbroideryPattern()
+        pattern.add_instance(motif, ((1, 0, 0), (0, 1, 0)))
+        pattern.add_instance(motif, ((0, -2, 10), (2, 0, -5)))
+
+        motif_stitches = list(motif.to_stitch_array().stitches)
+        pattern_stitches = list(pattern.to_stitch_array().stitches)
+        assert len(pattern_stitches) == 2 * len(motif_stitches) + 1  # Colour change from blue to red
+        assert pattern_stitches[: len(motif_stitches)] == approx(motif_stitches)
+        assert pattern_stitches[len(motif_stitches)] == (0, 0, COLOR_CHANGE)
+        for (x, y, command), (x0, y0, command0) in zip(pattern_stitches[len(motif_stitches) + 1 :], motif_stitches):
+            assert command == command0
+            if command != COLOR_CHANGE:
+                assert (x, y) == approx((-2 * y0 + 10, 2 * x0 - 5))
+        assert pattern.thread_colors() == ["red", "blue", "red", "blue"]
+        assert list(pattern.iter_stitches()) == pattern_stitches
+
+    def test_subset_of_stitch_groups(self, turtle):
+        pattern = EmbroideryPattern()
+        instances = pattern.add_instance(turtle.pattern, ((1, 0, 5), (0, 1, 0)), stitch_groups=[3])
+
+        assert [instance.stitch_group for instance in instances] == turtle.pattern.stitch_groups[3:]
+        assert list(pattern.to_stitch_array().stitches) == approx(
+            [(x + 5, y, command) for x, y, command in turtle.pattern.stitch_groups[3].get_stitch_commands()]
+        )
+
+    def test_instance_follows_referenced_stitch_group(self, turtle):
+        pattern = EmbroideryPattern()
+        pattern.add_instance(turtle.pattern, ((1, 0, 0), (0, 1, 100)))
+        num_stitches = len(pattern.to_stitch_array())
+
+        x, y = turtle.position()
+        turtle.pattern.stitch_groups[-1].add_location(Vec2D(x + 60, y))
+        stitch_array = pattern.to_stitch_array()
+        assert len(stitch_array) == num_stitches + 3
+        assert stitch_array.stitches[-1] == approx((x + 60, y + 100, STITCH))
+
+    def test_cannot_add_locations_to_instance(self, turtle):
+        instance = EmbroideryPattern().add_instance(turtle.pattern, ((1, 0, 0), (0, 1, 0)))[0]
+        with pytest.raises(TypeError):
+            instance.add_location((0, 0))
+
+
+class TestCompact:
+    @pytest.fixture
+    def fragmented_turtle(self):
+        turtle = Turtle(angle_mode="degrees", color="red")
+        with turtle.running_stitch(20):
+            turtle.forward(100)
+            turtle.color("blue")
+            turtle.color("red")
+            with turtle.running_stitch(20):
+                turtle.forward(30)
+            for _ in range(5):
+                with turtle.fast_direct_stitch():
+                    turtle.forward(10)
+                    turtle.left(90)
+            turtle.forward(40)
+            turtle.color("green")
+            with turtle.jump_stitch():
+                turtle.forward(30)
+            turtle.forward(30)
+        return turtle
+
+    def test_stitches_are_unchanged(self, fragmented_turtle):
+        pattern = fragmented_turtle.pattern
+        stitches_before = list(pattern.to_stitch_array().stitches)
+        colors_before = pattern.thread_colors()
+
+        num_removed = pattern.compact()
+        assert num_removed > 0
+        assert list(pattern.to_stitch_array().stitches) == approx(stitches_before)
+        assert pattern.thread_colors() == colors_before
+
+    def test_empty_and_adjacent_groups_are_removed(self, fragmented_turtle):
+        pattern = fragmented_turtle.pattern
+        pattern.compact()
+
+        fast_direct_stitches = [
+            group for group in pattern.stitch_groups if isinstance(group, stitches.FastDirectStitch)
+        ]
+        assert len(fast_direct_stitches) == 1
+        assert len(fast_direct_stitches[0]._positions) == 9  # Each row and the start position of all rows but one
+        # Only the empty groups that change the thread are kept
+        assert [group.color for group in pattern.stitch_groups[:-1] if group._is_empty()] == ["blue", "green"]
+
+    def test_compact_twice_is_noop(self, fragmented_turtle):
+        fragmented_turtle.pattern.compact()
+        stitch_groups = list(fragmented_turtle.pattern.stitch_groups)
+        assert fragmented_turtle.pattern.compact() == 0
+        assert fragmented_turtle.pattern.stitch_groups == stitch_groups
+
+    def test_last_group_is_kept(self):
+        turtle = Turtle()
+        turtle.start_running_stitch(10)
+        turtle.pattern.compact()
+        turtle.forward(20)
+        assert len(turtle.pattern.to_stitch_array()) == 3
+
+    def test_auto_compact(self, fragmented_turtle):
+        stitches_before = list(fragmented_turtle.pattern.to_stitch_array().stitches)
+        num_groups = len(fragmented_turtle.pattern.stitch_groups)
+
+        fragmented_turtle.pattern.auto_compact = True
+        assert list(fragmented_turtle.pattern.iter_stitches()) == approx(stitches_before)
+        assert len(fragmented_turtle.pattern.stitch_groups) < num_groups
+
+
+class TestNormalise:
+    @pytest.fixture
+    def messy_turtle(self):
+        turtle = Turtle(angle_mode="degrees", color="red")
+        with turtle.running_stitch(300):
+            turtle.forward(1000)
+        with turtle.direct_stitch():
+            for _ in range(10):
+                turtle.forward(1)
+                turtle.forward(0)
+            turtle.left(90)
+            turtle.forward(50)
+            turtle.forward(1)
+            with turtle.jump_stitch():
+                turtle.forward(200)
+            turtle.forward(2)
+            turtle.forward(500)
+        return turtle
+
+    @staticmethod
+    def stitch_lengths(stitch_list):
+        lengths = []
+        needle = None
+        for x, y, command in stitch_list:
+            if command == STITCH and needle is not None:
+                lengths.append(math.hypot(x - needle[0], y - needle[1]))
+            if command in (STITCH, JUMP):
+                needle = (x, y)
+        return lengths
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_long_stitches_are_split(self, monkeypatch, messy_turtle, use_numpy):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        monkeypatch.setattr(stitch_array, "USE_NUMPY", use_numpy)
+        pattern = messy_turtle.pattern
+        stitches_before = list(pattern.to_stitch_array().stitches)
+        assert max(self.stitch_lengths(stitches_before)) > 120
+
+        pattern.max_stitch_length = 120
+        normalised = list(pattern.to_stitch_array().stitches)
+        assert max(self.stitch_lengths(normalised)) <= 120
+        # The needle still goes through all the original positions, in the same order, but only once
+        deduplicated = [
+            stitch for stitch, previous in zip(stitches_before, [None, *stitches_before]) if stitch != previous
+        ]
+        remaining = iter(normalised)
+        assert all(stitch in remaining for stitch in deduplicated)
+        # 300 + 300 + 400 is split into 3 + 3 + 4 stitches, and the direct stitch contains 11 duplicates
+        assert pattern.normalisation_summary == {0: (7, 0), 1: (0, 11), 3: (4, 0)}
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_short_stitches_are_removed(self, monkeypatch, messy_turtle, use_numpy):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        monkeypatch.setattr(stitch_array, "USE_NUMPY", use_numpy)
+        pattern = messy_turtle.pattern
+        pattern.min_stitch_length = 3
+        normalised = list(pattern.to_stitch_array().stitches)
+
+        # Only the short stitch at the end of the run before the jump and the first stitch after the jump are kept
+        assert [length for length in self.stitch_lengths(normalised) if length < 3] == approx([1, 0])
+        assert normalised[-1] == approx((1010, -753, STITCH))
+        trim_idx = [command for _, _, command in normalised].index(TRIM)
+        assert normalised[trim_idx - 1] == approx((1010, -51, STITCH))
+        assert normalised[trim_idx + 2] == approx((1010, -251, STITCH))
+        assert pattern.normalisation_summary == {1: (0, 18), 3: (0, 1)}
+
+    def test_numpy_and_python_give_same_result(self, monkeypatch, messy_turtle):
+        pytest.importorskip("numpy")
+        stitch_list = messy_turtle.pattern.to_stitch_array()
+
+        monkeypatch.setattr(stitch_array, "USE_NUMPY", True)
+        numpy_array, numpy_summary = stitch_list.normalised(50, 5)
+        monkeypatch.setattr(stitch_array, "USE_NUMPY", False)
+        python_array, python_summary = stitch_list.normalised(50, 5)
+        assert list(numpy_array.stitches) == list(python_array.stitches)
+        assert list(numpy_array.group_offsets) == list(python_array.group_offsets)
+        assert numpy_summary == python_summary
+
+    def test_streaming_gives_same_result(self, messy_turtle):
+        pattern = messy_turtle.pattern
+        pattern.max_stitch_length = 120
+        pattern.min_stitch_length = 3
+        normalised = list(pattern.to_stitch_array().stitches)
+        summary = pattern.normalisation_summary
+
+        assert list(pattern.iter_stitches()) == normalised
+        assert pattern.normalisation_summary == summary
+
+    def test_not_normalised_by_default(self, messy_turtle):
+        pattern = messy_turtle.pattern
+        assert pattern.to_stitch_array() is pattern._compiled
+        assert pattern.normalisation_summary == {}
+
+    def test_normalised_array_is_cached(self, messy_turtle):
+        pattern = messy_turtle.pattern
+        pattern.max_stitch_length = 120
+        assert pattern.to_stitch_array() is pattern.to_stitch_array()
+        pattern.max_stitch_length = 100
+        assert max(self.stitch_lengths(pattern.to_stitch_array().stitches)) <= 100
@@ -1,4 +1,5 @@
 import math
+import random
 from math import copysign, cos, degrees, pi, radians, sin, sqrt
 
 import pytest
@@ -22,6 +23,39 @@ def approx_list(nested_list):
             return approx(nested_list)
 
 
+class TestStitchCommandViews:
+    @pytest.fixture
+    def running_stitch(self):
+        running_stitch = stitches.RunningStitch(Vec2D(0, 0), None, stitch_length=10)
+        running_stitch.add_location(Vec2D(100, 0))
+        return running_stitch
+
+    def test_stitch_commands_is_shared_read_only_view(self, running_stitch):
+        stitch_commands = running_stitch.stitch_commands
+        assert isinstance(stitch_commands, tuple)
+        assert running_stitch.stitch_commands is stitch_commands
+        assert list(stitch_commands) == running_stitch.get_stitch_commands()
+
+    def test_get_stitch_commands_returns_copy(self, running_stitch):
+        stitch_commands = running_stitch.get_stitch_commands()
+        stitch_commands.append((0, 0, JUMP))
+        assert running_stitch.get_stitch_commands() == list(running_stitch.stitch_commands)
+        assert len(running_stitch.stitch_commands) == len(stitch_commands) - 1
+
+    def test_views_are_updated_when_locations_are_added(self, running_stitch):
+        stitch_commands = running_stitch.stitch_commands
+        running_stitch.add_location(Vec2D(100, 100))
+        assert running_stitch.stitch_commands[: len(stitch_commands)] == stitch_commands
+        assert running_stitch.stitch_commands[-1] == (100, 100, STITCH)
+
+    def test_stitch_arrays_are_read_only(self, running_stitch):
+        pytest.importorskip("numpy")
+        x, y, commands = running_stitch.stitch_arrays
+        assert list(zip(x.tolist(), y.tolist(), commands.tolist())) == list(running_stitch.stitch_commands)
+        with pytest.raises(ValueError):
+            x[0] = 1
+
+
 class TestTurtleJumpStitch:
     def test_turtle_jump_stitch_context(self, turtle):
         # Check that we get a trim command in the beginning
@@ -277,6 +311,26 @@ class TestTurtleRunningStitch:
         turtle.start_running_stitch(10)
         assert isinstance(turtle._stitch_group_stack[-1], stitches.RunningStitch)
 
+    @pytest.mark.parametrize("stitch_length", [1, 3, 2.7, 12.345, 30])
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_numpy_backend_is_bit_identical(self, monkeypatch, stitch_length, seed):
+        pytest.importorskip("numpy")
+        rng = random.Random(seed)
+        running_stitch = stitches.RunningStitch(Vec2D(rng.uniform(-100, 100), 0), None, stitch_length)
+        for _ in range(50):
+            if rng.random() < 0.1 and running_stitch._positions:
+                running_stitch.add_location(running_stitch._positions[-1])  # Zero-length segment
+            else:
+                running_stitch.add_location(Vec2D(rng.uniform(-500, 500), rng.randint(-500, 500)))
+
+        monkeypatch.setattr(stitches, "USE_NUMPY", False)
+        python_commands = running_stitch._get_stitch_commands()
+        monkeypatch.setattr(stitches, "USE_NUMPY", True)
+        monkeypatch.setattr(stitches, "NUMPY_MIN_POSITIONS", 1)
+        numpy_commands = running_stitch._get_stitch_commands()
+
+        assert numpy_commands == python_commands
+
 
 class TestTurtleTripleStitch:
     @pytest.mark.parametrize("stitch_length", [2, 5, 10, 20, 50, 100])
@@ -355,6 +409,129 @@ class TestTurtleUnitStitch:
         # Test 4: Test if S is not a multiple of D, so S is the closest multiple of D
         assert approx(stitches.UnitStitch.round_stitch_length(30, 100)) == 33.33333333333333
 
+    @pytest.mark.parametrize(
+        "stitch_group",
+        [
+            stitches.ZigzagStitch(Vec2D(3, -7), None, stitch_length=2.5, stitch_width=4, center=False),
+            stitches.ZigzagStitch(Vec2D(3, -7), None, stitch_length=2.5, stitch_width=4, center=True),
+            stitches.SatinStitch(Vec2D(3, -7), None, stitch_width=5),
+            stitches.CrossStitch(Vec2D(3, -7), None, stitch_length=3, stitch_width=3, auto_adjust=True),
+            stitches.CrossStitch(Vec2D(3, -7), None, stitch_length=3, stitch_width=3, auto_adjust=False),
+            stitches.ZStitch(Vec2D(3, -7), None, stitch_length=2, stitch_width=6, center=True),
+        ],
+    )
+    def test_tiled_units_match_loop(self, monkeypatch, stitch_group):
+        pytest.importorskip("numpy")
+        rng = random.Random(0)
+        for _ in range(20):
+            stitch_group.add_location(Vec2D(rng.uniform(-300, 300), rng.uniform(-300, 300)))
+
+        monkeypatch.setattr(stitches.segment_cache, "maxsize", 0)
+        monkeypatch.setattr(stitches, "USE_NUMPY", False)
+        loop_commands = stitch_group._get_stitch_commands()
+        monkeypatch.setattr(stitches, "USE_NUMPY", True)
+        tiled_commands = stitch_group._get_stitch_commands()
+
+        assert len(tiled_commands) == len(loop_commands)
+        for (x1, y1, command1), (x2, y2, command2) in zip(tiled_commands, loop_commands):
+            assert command1 == command2
+            assert x1 == approx(x2, abs=1e-9)
+            assert y1 == approx(y2, abs=1e-9)
+
+
+class TestSegmentCache:
+    @pytest.mark.parametrize(
+        "make_stitch_group",
+        [
+            lambda start_pos: stitches.RunningStitch(start_pos, None, stitch_length=3),
+            lambda start_pos: stitches.ZigzagStitch(start_pos, None, stitch_length=2, stitch_width=4, center=True),
+            lambda start_pos: stitches.CrossStitch(start_pos, None, stitch_length=3, stitch_width=3),
+            lambda start_pos: stitches.ZStitch(start_pos, None, stitch_length=2, stitch_width=6, center=True),
+        ],
+    )
+    def test_translated_segments_are_cached(self, monkeypatch, make_stitch_group):
+        segment_cache = stitches.SegmentCache()
+        monkeypatch.setattr(stitches, "segment_cache", segment_cache)
+        offsets = [Vec2D(0, 0), Vec2D(10, 20), Vec2D(-35, 0)]
+
+        stitch_commands = []
+        for offset in offsets:
+            stitch_group = make_stitch_group(Vec2D(1.5, 2) + offset)
+            stitch_group.add_location(Vec2D(31.5, 42) + offset)
+            stitch_group.add_location(Vec2D(31.5, -8) + offset)
+            stitch_commands.append(stitch_group._get_stitch_commands())
+
+        assert segment_cache.misses == 2
+        assert segment_cache.hits == 4
+        assert len(segment_cache) == 2
+        for offset, commands in zip(offsets, stitch_commands):
+            assert len(commands) == len(stitch_commands[0])
+            for (x, y, command), (x0, y0, command0) in zip(commands, stitch_commands[0]):
+                assert command == command0
+                assert x == approx(x0 + offset[0])
+                assert y == approx(y0 + offset[1])
+            # Stitches at the end positions are exact
+            for (x, y, _), (x0, y0, _) in zip(commands, stitch_commands[0]):
+                if (x0, y0) == (31.5, -8):
+                    assert (x, y) == Vec2D(31.5, -8) + offset
+
+    def test_different_parameters_are_not_shared(self, monkeypatch):
+        segment_cache = stitches.SegmentCache()
+        monkeypatch.setattr(stitches, "segment_cache", segment_cache)
+        for stitch_length in [2, 3]:
+            stitch_group = stitches.RunningStitch(Vec2D(0, 0), None, stitch_length=stitch_length)
+            stitch_group.add_location(Vec2D(30, 0))
+            stitch_group._get_stitch_commands()
+
+        assert segment_cache.misses == 2
+        assert segment_cache.hits == 0
+
+    def test_unit_stitch_subclasses_are_not_cached(self, monkeypatch):
+        class OffsetStitch(stitches.UnitStitch):
+            def __init__(self, start_pos, color, stitch_length, offset):
+                super().__init__(start_pos, color, stitch_length)
+                self.offset = offset
+
+            def _stitch_unit(self, start_pos, angle, stitch_length):
+                x = start_pos[0] + stitch_length * math.cos(angle)
+                y = start_pos[1] + stitch_length * math.sin(angle)
+                return [(x + self.offset, y, STITCH)]
+
+        segment_cache = stitches.SegmentCache()
+        monkeypatch.setattr(stitches, "segment_cache", segment_cache)
+        stitch_commands = []
+        for offset in [0, 5]:
+            stitch_group = OffsetStitch(Vec2D(0, 0), None, stitch_length=10, offset=offset)
+            stitch_group.add_location(Vec2D(30, 0))
+            stitch_commands.append(stitch_group._get_stitch_commands())
+
+        assert len(segment_cache) == 0
+        assert stitch_commands[0] != stitch_commands[1]
+
+    def test_least_recently_used_segment_is_evicted(self):
+        segment_cache = stitches.SegmentCache(maxsize=2)
+        stitch_group = stitches.RunningStitch(Vec2D(0, 0), None, stitch_length=3)
+        for end_x in [10, 20, 10, 30, 20]:
+            segment_cache.get_stitches(stitch_group, Vec2D(0, 0), Vec2D(end_x, 0))
+
+        # 10 and 20 are added, 10 is a hit, 30 evicts 20, so 20 is a miss again
+        assert segment_cache.hits == 1
+        assert segment_cache.misses == 4
+        assert len(segment_cache) == 2
+
+        segment_cache.clear()
+        assert len(segment_cache) == 0
+        assert segment_cache.hits == segment_cache.misses == 0
+
+    def test_disabled_cache(self):
+        segment_cache = stitches.SegmentCache(maxsize=0)
+        stitch_group = stitches.RunningStitch(Vec2D(0, 0), None, stitch_length=3)
+        for _ in range(2):
+            stitch_commands = segment_cache.get_stitches(stitch_group, Vec2D(0, 0), Vec2D(10, 0))
+
+        assert stitch_commands == list(stitch_group._iter_stitches_between_positions(Vec2D(0, 0), Vec2D(10, 0)))
+        assert segment_cache.hits == segment_cache.misses == len(segment_cache) == 0
+
 
 class TestTurtleZigzagStitch:
     def test_zigzag_unit(self):
@@ -0,0 +1,250 @@
+import math
+
+import pytest
+from pyembroidery import STITCH
+from pytest import approx
+
+from turtlethread import Turtle, fills
+from turtlethread.stitches import JumpStitch, StitchGroupInstance
+
+
+def square(turtle, side=100):
+    for _ in range(4):
+        turtle.forward(side)
+        turtle.left(90)
+
+
+def positions(turtle, stitch_group_idx=-1):
+    return [tuple(position) for position in turtle.pattern.stitch_groups[stitch_group_idx]._positions]
+
+
+def stitch_list(pattern):
+    return list(pattern.to_stitch_array().stitches)
+
+
+def approx_list(expected):
+    return [approx(element) for element in expected]
+
+
+class TestTransform:
+    def test_translate(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            with turtle.translate(200, 50):
+                square(turtle)
+        assert positions(turtle) == approx_list([(300, 50), (300, -50), (200, -50), (200, 50)])
+        # The turtle position is in local coordinates
+        assert turtle.position() == approx((0, 0))
+
+    @pytest.mark.parametrize("angle_mode", ["degrees", "radians"])
+    def test_rotate_in_same_direction_as_left(self, angle_mode):
+        turtle = Turtle(angle_mode=angle_mode)
+        reference = Turtle(angle_mode=angle_mode)
+        angle = 30 if angle_mode == "degrees" else 0.5
+        with turtle.running_stitch(20):
+            with turtle.rotate(angle):
+                square(turtle)
+        with reference.running_stitch(20):
+            reference.left(angle)
+            square(reference)
+        assert positions(turtle) == approx_list(positions(reference))
+
+    def test_mirror_and_scale_around_center(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            with turtle.mirror(center=(0, 10)):
+                turtle.goto(30, 40)
+            with turtle.mirror(angle=90):
+                turtle.goto(30, 40)
+            with turtle.scale(2, 3, center=(10, 10)):
+                turtle.goto(30, 40)
+        assert positions(turtle) == approx_list([(30, -20), (-30, 40), (50, 100)])
+
+    def test_nested_transforms_are_combined(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            with turtle.translate(100, 0):
+                with turtle.scale(2):
+                    turtle.goto(10, 20)
+                turtle.goto(10, 20)
+            turtle.goto(10, 20)
+        assert positions(turtle) == approx_list([(120, 40), (110, 20), (10, 20)])
+
+    def test_moves_are_added_when_block_ends(self):
+        turtle = Turtle()
+        with turtle.running_stitch(20):
+            with turtle.translate(100, 0):
+                turtle.goto_many(list(range(50)), [0] * 50)
+                assert positions(turtle) == []
+            assert positions(turtle) == approx_list([(100 + x, 0) for x in range(50)])
+
+    def test_stitch_groups_start_at_transformed_position(self):
+        turtle = Turtle()
+        with turtle.translate(100, 0):
+            turtle.goto(10, 10)
+            with turtle.running_stitch(20):
+                turtle.forward(100)
+            turtle.color("red")
+            with turtle.jump_stitch():
+                turtle.forward(100)
+        start_positions = [tuple(stitch_group._start_pos) for stitch_group in turtle.pattern.stitch_groups]
+        assert start_positions == approx_list([(110, 10), (210, 10)])
+        assert positions(turtle) == approx_list([(310, 10)])
+
+    @pytest.mark.parametrize(
+        "use_stitch",
+        [
+            lambda turtle: turtle.running_stitch(20),
+            lambda turtle: turtle.triple_stitch(20),
+            lambda turtle: turtle.zigzag_stitch(20, 10),
+            lambda turtle: turtle.satin_stitch(10),
+        ],
+    )
+    def test_stitch_types_inside_transform(self, use_stitch):
+        turtle = Turtle()
+        translated = Turtle()
+        rotated = Turtle()
+        with turtle.translate(1000, 0):
+            with use_stitch(turtle):
+                square(turtle)
+        with turtle.rotate(30):
+            with use_stitch(turtle):
+                square(turtle)
+
+        translated.goto(1000, 0)
+        with use_stitch(translated):
+            square(translated)
+        rotated.left(30)
+        with use_stitch(rotated):
+            square(rotated)
+
+        stitch_groups = [stitch_group for stitch_group in turtle.pattern.stitch_groups if stitch_group._positions]
+        expected = [translated.pattern.stitch_groups[-1], rotated.pattern.stitch_groups[-1]]
+        assert stitch_groups[0].stitch_commands[0][:2] == approx((1000, 0))
+        for stitch_group, reference in zip(stitch_groups, expected):
+            assert list(stitch_group.stitch_commands) == approx_list(list(reference.stitch_commands))
+
+    def test_invalid_transform(self):
+        turtle = Turtle()
+        with pytest.raises(ValueError):
+            with turtle.transform(((1, 2, 0), (2, 4, 0))):
+                pass
+        with pytest.raises(ValueError):
+            with turtle.scale(0):
+                pass
+
+    def test_same_pattern_when_recording(self):
+        def draw(turtle):
+            with turtle.running_stitch(20):
+                for i in range(6):
+                    with turtle.rotate(60 * i, center=(50, 50)):
+                        square(turtle, 40)
+                        turtle.circle(10)
+            return turtle
+
+        reference = draw(Turtle())
+        turtle = draw(Turtle(record=True))
+        turtle.compile()
+        assert stitch_list(turtle.pattern) == approx_list(stitch_list(reference.pattern))
+
+    def test_fill(self):
+        turtle = Turtle()
+        reference = Turtle()
+        with turtle.translate(200, 50):
+            with turtle.running_stitch(20):
+                turtle.begin_fill(fills.ScanlineFill())
+                square(turtle)
+                turtle.end_fill()
+        reference.goto(200, 50)
+        with reference.running_stitch(20):
+            reference.begin_fill(fills.ScanlineFill())
+            square(reference)
+            reference.end_fill()
+
+        assert stitch_list(turtle.pattern) == approx_list(stitch_list(reference.pattern))
+        assert turtle.position() == approx(reference.position() - (200, 50))
+
+
+def stitch_positions(pattern):
+    return {(round(x, 6), round(y, 6)) for x, y, command in stitch_list(pattern) if command == STITCH}
+
+
+class TestSymmetry:
+    def petal(self, turtle):
+        turtle.goto(50, 10)
+        turtle.setheading(0)
+        with turtle.running_stitch(20):
+            turtle.circle(30, 180)
+            turtle.forward(40)
+
+    @pytest.mark.parametrize("mirror", [False, True])
+    def test_same_stitches_as_transformed_copies(self, mirror):
+        n = 5
+        turtle = Turtle()
+        with turtle.symmetry(n=n, mirror=mirror, center=(10, 20)):
+            self.petal(turtle)
+
+        reference = Turtle()
+        self.petal(reference)
+        for i in range(n):
+            with reference.rotate(360 * i / n, center=(10, 20)):
+                self.petal(reference)
+                if mirror:
+                    with reference.mirror(center=(10, 20)):
+                        self.petal(reference)
+
+        assert stitch_positions(turtle.pattern) == stitch_positions(reference.pattern)
+        instances = [group for group in turtle.pattern.stitch_groups if isinstance(group, StitchGroupInstance)]
+        assert len(instances) == (2 * n if mirror else n) - 1
+        # The copies reference the stitch group of the sector, so its stitches are only generated once
+        assert {id(instance.stitch_group) for instance in instances} == {id(turtle.pattern.stitch_groups[0])}
+
+    def test_connected_copies_need_no_jumps(self):
+        turtle = Turtle()
+        turtle.goto(100, 0)
+        with turtle.running_stitch(20):
+            with turtle.symmetry(n=6):
+                turtle.forward(30)
+                turtle.goto(100 * math.cos(math.pi / 3), -100 * math.sin(math.pi / 3))
+            turtle.forward(10)
+
+        assert not any(isinstance(group, JumpStitch) for group in turtle.pattern.stitch_groups)
+        # The last copy ends at the start of the first copy, and is rotated by 60 degrees
+        end_position = (100 + 10 * math.cos(math.pi / 3), 10 * math.sin(math.pi / 3))
+        assert turtle.position() == approx(end_position)
+        stitch_array = turtle.pattern.to_stitch_array()
+        assert (stitch_array.x[-1], stitch_array.y[-1]) == approx(end_position)
+
+    def test_jumps_between_copies(self):
+        turtle = Turtle()
+        turtle.goto(100, 0)
+        with turtle.symmetry(n=4):
+            with turtle.running_stitch(20):
+                turtle.forward(30)
+
+        jumps = [group for group in turtle.pattern.stitch_groups if isinstance(group, JumpStitch)]
+        assert len(jumps) == 3
+        for jump in jumps:
+            assert abs(jump._start_pos) == approx(130)
+            assert abs(jump._positions[-1]) == approx(100)
+
+    def test_same_pattern_when_recording(self):
+        def draw(turtle):
+            with turtle.symmetry(n=7, mirror=True):
+                self.petal(turtle)
+                turtle.color("red")
+                self.petal(turtle)
+            with turtle.running_stitch(20):
+                turtle.forward(30)
+            return turtle
+
+        reference = draw(Turtle())
+        turtle = draw(Turtle(record=True))
+        turtle.compile()
+        assert stitch_list(turtle.pattern) == approx_list(stitch_list(reference.pattern))
+
+    def test_invalid_n(self):
+        turtle = Turtle()
+        with pytest.raises(ValueError):
+            with turtle.symmetry(n=0):
+                pass
@@ -7,7 +7,7 @@ from pytest import approx
 
 import turtlethread.stitches as stitches
 from turtlethread import Turtle
-from turtlethread.base_turtle import Vec2D
+from turtlethread.base_turtle import TNavigator, Vec2D
 
 
 @pytest.fixture
@@ -95,6 +95,48 @@ class TestTurtle:
         assert turtle.x == x
         assert turtle.y == y
 
+    def test_goto_many_same_as_goto(self, turtle):
+        xs = [10 * math.cos(0.1 * i) for i in range(100)]
+        ys = [10 * math.sin(0.1 * i) for i in range(100)]
+        turtle.left(30)
+        with turtle.running_stitch(5):
+            turtle.goto_many(xs, ys)
+        reference = Turtle(angle_mode="degrees")
+        reference.left(30)
+        with reference.running_stitch(5):
+            for x, y in zip(xs, ys):
+                reference.goto(x, y)
+
+        assert turtle.pos() == (xs[-1], ys[-1])
+        assert turtle.heading() == reference.heading()
+        assert turtle.pattern.stitch_groups[0]._positions == reference.pattern.stitch_groups[0]._positions
+        assert list(turtle.pattern.to_stitch_array().stitches) == list(reference.pattern.to_stitch_array().stitches)
+
+    def test_polyline_accepts_numpy_array(self, turtle):
+        np = pytest.importorskip("numpy")
+        points = np.array([[0, 0], [10, 0], [10, 10.5]])
+        with turtle.direct_stitch():
+            turtle.polyline(points)
+            turtle.goto_many(np.array([0.0]), np.array([10.5]))
+
+        positions = turtle.pattern.stitch_groups[0]._positions
+        assert positions == [(0, 0), (10, 0), (10, 10.5), (0, 10.5)]
+        assert all(type(x) is float and type(y) is float for x, y in positions[1:])
+        assert turtle.pos() == (0, 10.5)
+
+    def test_goto_many_invalidates_cached_stitches(self, turtle):
+        with turtle.direct_stitch():
+            turtle.forward(10)
+            num_stitches = len(turtle.pattern.stitch_groups[0].stitch_commands)
+            turtle.polyline([(20, 0), (30, 0)])
+            assert len(turtle.pattern.stitch_groups[0].stitch_commands) == num_stitches + 2
+            turtle.polyline([])
+        assert len(turtle.pattern.to_stitch_array()) == num_stitches + 2
+
+    def test_goto_many_fails_for_different_lengths(self, turtle):
+        with pytest.raises(ValueError):
+            turtle.goto_many([1, 2], [1])
+
     @pytest.mark.parametrize("steps", [1, 2, 5, 10])
     @pytest.mark.parametrize("radius", [0, 1, 5, 10])
     @pytest.mark.parametrize("angle_mode", ["degrees", "radians"])
@@ -131,6 +173,50 @@ class TestTurtle:
         assert turtle.x == pytest.approx(0)
         assert turtle.y == pytest.approx(-200)
 
+    @pytest.mark.parametrize("steps", [1, 7, 100])
+    @pytest.mark.parametrize("extent", [None, 90, -200, 500])
+    @pytest.mark.parametrize("radius", [-30, 50])
+    @pytest.mark.parametrize("angle_mode", ["degrees", "radians"])
+    def test_circle_same_as_navigator_circle(self, monkeypatch, radius, extent, steps, angle_mode):
+        if extent is not None and angle_mode == "radians":
+            extent = radians(extent)
+        turtle = Turtle(angle_mode=angle_mode)
+        reference = Turtle(angle_mode=angle_mode)
+        for t in turtle, reference:
+            t.left(10)
+            t.forward(10)
+
+        with turtle.direct_stitch():
+            turtle.circle(radius, extent=extent, steps=steps)
+        with reference.direct_stitch():
+            TNavigator.circle(reference, radius, extent=extent, steps=steps)
+
+        assert turtle.position() == approx(reference.position())
+        assert turtle.heading() == approx(reference.heading())
+        stitch_group, reference_stitch_group = turtle.pattern.stitch_groups[-1], reference.pattern.stitch_groups[-1]
+        assert len(stitch_group._positions) == steps
+        assert approx_list([list(p) for p in stitch_group._positions]) == [
+            list(p) for p in reference_stitch_group._positions
+        ]
+
+    @pytest.mark.parametrize("extent", [-90, -360])
+    def test_circle_with_negative_extent_same_as_navigator_circle(self, extent):
+        turtle = Turtle()
+        reference = Turtle()
+        for t in turtle, reference:
+            t.left(10)
+            t.forward(10)
+
+        with turtle.running_stitch(20):
+            turtle.circle(50, extent=extent)
+        with reference.running_stitch(20):
+            steps = reference._steps_from_stitch_length(20, 50, extent)
+            TNavigator.circle(reference, 50, extent=extent, steps=steps)
+
+        assert turtle.position() == approx(reference.position())
+        assert turtle.heading() == approx(reference.heading())
+        assert turtle.pattern.stitch_groups[-1]._positions == reference.pattern.stitch_groups[-1]._positions
+
     def test_use_stitch_group_fails_if_inconsistent_state(self, turtle):
         with pytest.raises(RuntimeError):
             with turtle.running_stitch(20):
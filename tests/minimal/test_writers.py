@@ -0,0 +1,75 @@
+import pyembroidery
+import pytest
+
+from turtlethread import Turtle, writers
+
+
+@pytest.fixture
+def turtle():
+    turtle = Turtle(angle_mode="degrees", color="red")
+    with turtle.running_stitch(20):
+        turtle.forward(100)
+        turtle.color("blue")
+        turtle.left(90)
+        turtle.forward(50)
+        with turtle.jump_stitch():
+            turtle.forward(500)  # Long jump that must be split
+        turtle.color("green")
+        turtle.circle(30)
+    with turtle.direct_stitch():
+        turtle.goto(-300, 200)  # Long stitch that must be split
+    return turtle
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def use_numpy(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(writers, "USE_NUMPY", request.param)
+    monkeypatch.setattr(writers, "NUMPY_MIN_STITCHES", 1)
+    return request.param
+
+
+@pytest.mark.parametrize("suffix", ["dst", "exp"])
+class TestNativeWriters:
+    def test_same_as_pyembroidery(self, turtle, suffix, use_numpy, tmp_path):
+        pyembroidery.write(turtle.pattern.to_pyembroidery(), str(tmp_path / f"reference.{suffix}"))
+        writers.WRITERS[f".{suffix}"](turtle.pattern.to_stitch_array(), tmp_path / f"native.{suffix}")
+
+        assert (tmp_path / f"native.{suffix}").read_bytes() == (tmp_path / f"reference.{suffix}").read_bytes()
+
+    def test_streaming_from_pattern(self, turtle, suffix, use_numpy, tmp_path):
+        writer = writers.WRITERS[f".{suffix}"]
+        writer(turtle.pattern, tmp_path / f"streamed.{suffix}")
+        writer(turtle.pattern.to_stitch_array(), tmp_path / f"compiled.{suffix}")
+
+        assert (tmp_path / f"streamed.{suffix}").read_bytes() == (tmp_path / f"compiled.{suffix}").read_bytes()
+
+    def test_empty_pattern(self, suffix, tmp_path):
+        pyembroidery.write(Turtle().pattern.to_pyembroidery(), str(tmp_path / f"reference.{suffix}"))
+        writers.WRITERS[f".{suffix}"](Turtle().pattern, tmp_path / f"native.{suffix}")
+
+        assert (tmp_path / f"native.{suffix}").read_bytes() == (tmp_path / f"reference.{suffix}").read_bytes()
+
+    def test_save_uses_native_writer(self, turtle, suffix, tmp_path, monkeypatch):
+        written = []
+        monkeypatch.setitem(writers.WRITERS, f".{suffix}", lambda pattern, filename: written.append(filename))
+        turtle.save(str(tmp_path / f"pattern.{suffix.upper()}"))
+
+        assert written == [str(tmp_path / f"pattern.{suffix.upper()}")]
+
+
+def test_long_moves_are_split(turtle, use_numpy, tmp_path):
+    writers.write_dst(turtle.pattern, tmp_path / "pattern.dst")
+    pattern = pyembroidery.read(str(tmp_path / "pattern.dst"))
+
+    for (x0, y0, _), (x1, y1, _) in zip(pattern.stitches[:-1], pattern.stitches[1:]):
+        assert abs(x1 - x0) <= writers.DST_MAX_DISTANCE
+        assert abs(y1 - y0) <= writers.DST_MAX_DISTANCE
+    assert pattern.count_stitch_commands(pyembroidery.COLOR_CHANGE) == 2
+
+
+def test_other_formats_use_pyembroidery(turtle, tmp_path):
+    assert writers.get_writer("pattern.pes") is None
+    turtle.save(str(tmp_path / "pattern.pes"))
+    assert pyembroidery.read(str(tmp_path / "pattern.pes")) is not None